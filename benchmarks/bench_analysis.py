@@ -0,0 +1,57 @@
+"""
+bench_analysis.py
+time shadowed/redundant/correlated rule analysis on a large synthetic ACL
+
+run from the repository root:  python -m benchmarks.bench_analysis --aces 100000
+
+--shape picks the ACLs: ``mixed`` (the default) is ConfigGenerator's realistic
+mix of any/any4, hosts, subnets, objects and object-groups over several ACLs,
+and ``single`` the same mix in one ACL;
+``hosts`` is generate_aces (host sources, /24 destinations); ``any-src`` is
+one ACL of ``permit tcp any host ADDR eq PORT``, the shape that makes a naive
+overlap search quadratic.
+"""
+import argparse
+import collections
+import random
+import time
+
+from fwrp.analysis import analyze
+from fwrp.firewallruleparser import Parser
+from fwrp.resolver import Resolver
+from benchmarks.synthetic import ConfigGenerator, generate_aces
+
+
+def any_src_aces(count, seed=0):
+    rnd = random.Random(seed)
+    for _ in range(count):
+        yield 'access-list OUTSIDE_IN extended permit tcp any host 10.{}.{}.{} eq {}'.format(
+            rnd.randrange(256), rnd.randrange(256), rnd.randrange(256), rnd.randrange(1, 65536))
+
+
+SHAPES = {
+    'mixed': lambda count: ConfigGenerator(count).lines(),
+    'single': lambda count: ConfigGenerator(count, acl_names=('OUTSIDE_IN',)).lines(),
+    'hosts': generate_aces,
+    'any-src': any_src_aces,
+}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--aces', type=int, default=100000)
+    arg_parser.add_argument('--shape', choices=sorted(SHAPES), default='mixed')
+    args = arg_parser.parse_args()
+
+    parser = Parser()
+    parsed = list(parser.parse_lines(SHAPES[args.shape](args.aces)))
+    resolver = Resolver.from_parser(parser)
+    start = time.perf_counter()
+    findings = analyze(parsed, resolver)
+    elapsed = time.perf_counter() - start
+    kinds = collections.Counter(finding.kind for acl_findings in findings.values() for finding in acl_findings)
+    print('analyzed {} {} rules in {:.2f}s: {}'.format(args.aces, args.shape, elapsed, dict(kinds)))
+
+
+if __name__ == '__main__':
+    main()
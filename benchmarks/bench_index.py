@@ -0,0 +1,46 @@
+"""
+bench_index.py
+build a RuleIndex over synthetic ACEs and measure point-query latency
+
+run from the repository root:  python -m benchmarks.bench_index --aces 500000
+"""
+import argparse
+import ipaddress
+import random
+import time
+
+from fwrp.firewallruleparser import Parser
+from fwrp.index import RuleIndex
+from fwrp.resolver import Resolver
+from benchmarks.synthetic import generate_aces
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--aces', type=int, default=500000)
+    arg_parser.add_argument('--queries', type=int, default=10000)
+    args = arg_parser.parse_args()
+
+    parser = Parser()
+    parsed = list(parser.parse_lines(generate_aces(args.aces)))
+    start = time.perf_counter()
+    index = RuleIndex.from_parsed(parsed, Resolver.from_parser(parser))
+    print('indexed {} rules in {:.2f}s'.format(len(index.rules), time.perf_counter() - start))
+
+    rnd = random.Random(1)
+    queries = [(ipaddress.ip_address('10.{}.{}.{}'.format(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256))),
+                ipaddress.ip_address('172.{}.{}.{}'.format(rnd.randrange(16, 32), rnd.randrange(256), rnd.randrange(256))))
+               for _ in range(args.queries)]
+    for label, query in (('dst', lambda src, dst: index.query(dst=dst)),
+                         ('src+dst', lambda src, dst: index.query(src=src, dst=dst))):
+        matches = 0
+        start = time.perf_counter()
+        for src, dst in queries:
+            matches += len(query(src, dst))
+        elapsed = time.perf_counter() - start
+        print('{:8s} {:8.1f} us/query  {:.1f} matches/query'.format(
+            label, elapsed / args.queries * 1e6, matches / args.queries))
+
+
+if __name__ == '__main__':
+    main()
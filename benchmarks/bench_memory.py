@@ -0,0 +1,46 @@
+"""
+bench_memory.py
+retained memory of parsed ACEs as records versus the equivalent plain dicts
+
+run from the repository root:  python -m benchmarks.bench_memory --aces 200000
+"""
+import argparse
+import gc
+import tracemalloc
+from collections.abc import Mapping
+
+from fwrp.firewallruleparser import Parser
+from benchmarks.synthetic import generate_ruleset
+
+
+def as_plain_dict(obj):
+    if isinstance(obj, Mapping):
+        return {key: as_plain_dict(value) for key, value in obj.items()}
+    return obj
+
+
+def retained(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--aces', type=int, default=200000)
+    args = arg_parser.parse_args()
+
+    ruleset = generate_ruleset(args.aces)
+    _, record_size = retained(lambda: list(Parser.parse_ruleset(ruleset)))
+    _, dict_size = retained(lambda: [as_plain_dict(record) for record in Parser.parse_ruleset(ruleset)])
+
+    print('records: {:8.1f} MiB  {:6.0f} B/ACE'.format(record_size / 2 ** 20, record_size / args.aces))
+    print('dicts:   {:8.1f} MiB  {:6.0f} B/ACE'.format(dict_size / 2 ** 20, dict_size / args.aces))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+bench_parallel.py
+compare serial and multi-process Parser.parse_ruleset throughput
+
+run from the repository root:  python -m benchmarks.bench_parallel --aces 1000000
+
+``parent cpu`` is the time the calling process itself spends (chunking lines,
+rebuilding or copying results); it does not shrink with more workers, so
+elapsed / parent cpu bounds the speedup any number of cores can give.
+--json times the CLI's path, where workers encode JSON lines themselves.
+"""
+import argparse
+import time
+
+from fwrp.batch import json_lines
+from fwrp.firewallruleparser import Parser
+from benchmarks.synthetic import generate_ruleset
+
+
+def time_parse(ruleset, workers, encode=None):
+    start = time.perf_counter()
+    start_cpu = time.process_time()
+    count = sum(1 for _ in Parser.parse_ruleset(ruleset, workers=workers, encode=encode))
+    return count, time.perf_counter() - start, time.process_time() - start_cpu
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--aces', type=int, default=1000000)
+    arg_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    arg_parser.add_argument('--json', action='store_true', help='encode JSON lines, as the parse command does')
+    args = arg_parser.parse_args()
+
+    ruleset = generate_ruleset(args.aces)
+    baseline = None
+    for workers in args.workers:
+        count, elapsed, parent_cpu = time_parse(ruleset, workers, json_lines if args.json else None)
+        baseline = baseline or elapsed
+        print('workers={:<3d} {}={:<9d} {:8.2f}s  parent cpu {:6.2f}s  speedup {:.2f}x'.format(
+            workers, 'chunks' if args.json else 'aces', count, elapsed, parent_cpu, baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
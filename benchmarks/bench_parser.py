@@ -0,0 +1,167 @@
+"""
+bench_parser.py
+parse throughput by stage over a realistic synthetic ASA config
+
+Stages, each run in a fresh interpreter so its peak RSS is its own:
+
+  read          iterate the file's lines (baseline for the stages below)
+  cli_group     group lines into CLI groups
+  parse_ace     Parser.parse_ace over every access-list line
+  parse_object  Parser.parse_object over every object / object-group
+  end_to_end    Parser.parse_file over the whole config
+
+parse_ace and parse_object time only the parse calls; their input is
+grouped and split beforehand in batches, so memory stays bounded at any size.
+
+run from the repository root:
+  python -m benchmarks.bench_parser --aces 100000
+  python -m benchmarks.bench_parser --aces 1000000 --config big.cfg --json after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import ConfigGenerator
+
+STAGES = ('read', 'cli_group', 'parse_ace', 'parse_object', 'end_to_end')
+BATCH_GROUPS = 50000
+
+
+def batches(groups, wanted):
+    """Collect the groups ``wanted`` accepts into lists of BATCH_GROUPS; returns (batch, line count) pairs."""
+    batch = []
+    lines = 0
+    for grp in groups:
+        if wanted(grp):
+            batch.append(grp)
+            lines += len(grp)
+            if len(batch) >= BATCH_GROUPS:
+                yield batch, lines
+                batch = []
+                lines = 0
+    if batch:
+        yield batch, lines
+
+
+def run_stage(stage, path):
+    """Run one stage over the config at ``path``; returns (items, lines, seconds)."""
+    from fwrp.firewallruleparser import Parser, cli_group
+
+    items = lines = 0
+    elapsed = 0.0
+    with open(path) as fil:
+        if stage == 'read':
+            start = time.perf_counter()
+            for _ in fil:
+                items += 1
+            elapsed = time.perf_counter() - start
+            lines = items
+        elif stage == 'cli_group':
+            start = time.perf_counter()
+            for grp in cli_group(fil):
+                items += 1
+                lines += len(grp)
+            elapsed = time.perf_counter() - start
+        elif stage == 'parse_ace':
+            parser = Parser()
+            is_ace = (lambda grp: grp[0].startswith('access-list'))
+            for batch, batch_lines in batches(cli_group(fil), is_ace):
+                token_lists = [grp[0].split() for grp in batch]
+                start = time.perf_counter()
+                for tokens in token_lists:
+                    parser.parse_ace(tokens)
+                elapsed += time.perf_counter() - start
+                items += len(batch)
+                lines += batch_lines
+        elif stage == 'parse_object':
+            parser = Parser()
+            is_object = (lambda grp: grp[0].startswith('object'))
+            for batch, batch_lines in batches(cli_group(fil), is_object):
+                start = time.perf_counter()
+                for grp in batch:
+                    parser.parse_object(grp)
+                elapsed += time.perf_counter() - start
+                items += len(batch)
+                lines += batch_lines
+        elif stage == 'end_to_end':
+            start = time.perf_counter()
+            for _ in Parser.parse_file(fil):
+                items += 1
+            elapsed = time.perf_counter() - start
+            with open(path) as count_fil:
+                lines = sum(1 for _ in count_fil)
+        else:
+            raise ValueError('unknown stage {}'.format(stage))
+    return items, lines, elapsed
+
+
+def measure(stage, path):
+    """Run ``stage`` in a fresh interpreter; returns its result dict."""
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_parser', '--run-stage', stage, '--config', path],
+        check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(output)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--aces', type=int, default=100000)
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    arg_parser.add_argument('--config', help='config file to use; generated first if it does not exist')
+    arg_parser.add_argument('--json', help='also write the results here as JSON')
+    arg_parser.add_argument('--compare', help='JSON results of an earlier run to compare lines/sec against')
+    arg_parser.add_argument('--run-stage', choices=STAGES, help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.run_stage:
+        items, lines, elapsed = run_stage(args.run_stage, args.config)
+        # ru_maxrss is in KiB on Linux
+        print(json.dumps({'stage': args.run_stage, 'items': items, 'lines': lines, 'seconds': elapsed,
+                          'lines_per_sec': lines / elapsed if elapsed else 0.0,
+                          'peak_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+        return
+
+    tmp_dir = None
+    path = args.config
+    if path is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp_dir.name, 'synthetic.cfg')
+    try:
+        if not os.path.exists(path):
+            start = time.perf_counter()
+            count = ConfigGenerator(args.aces, args.seed).write(path)
+            print('generated {} lines ({} ACEs) in {:.1f}s'.format(count, args.aces, time.perf_counter() - start))
+
+        results = [measure(stage, path) for stage in args.stages]
+    finally:
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as fil:
+            previous = {result['stage']: result for result in json.load(fil)['results']}
+
+    print('{:<13} {:>10} {:>10} {:>9} {:>13} {:>9}{}'.format(
+        'stage', 'items', 'lines', 'seconds', 'lines/sec', 'peak MiB', '   vs before' if previous else ''))
+    for result in results:
+        line = '{stage:<13} {items:>10} {lines:>10} {seconds:>9.2f} {lines_per_sec:>13,.0f} {peak_rss_mib:>9.1f}'.format(
+            **result)
+        if result['stage'] in previous and previous[result['stage']]['lines_per_sec']:
+            line += '   {:>9.2f}x'.format(result['lines_per_sec'] / previous[result['stage']]['lines_per_sec'])
+        print(line)
+
+    if args.json:
+        with open(args.json, 'w') as fil:
+            json.dump({'aces': args.aces, 'seed': args.seed, 'python': sys.version.split()[0], 'results': results},
+                      fil, indent=4)
+
+
+if __name__ == '__main__':
+    main()
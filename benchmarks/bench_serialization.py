@@ -0,0 +1,70 @@
+"""
+bench_serialization.py
+binary export/import of a parsed ruleset versus the JSON dump in run_ruleset
+
+run from the repository root:  python -m benchmarks.bench_serialization --aces 200000
+"""
+import argparse
+import gc
+import json
+import os
+import tempfile
+import time
+
+from fwrp import serialization
+from fwrp.firewallruleparser import Parser
+from fwrp.utils import json_default
+from benchmarks.synthetic import generate_ruleset
+
+
+def timed(func):
+    # collect beforehand, so no run pays for garbage left by the one before
+    gc.collect()
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--aces', type=int, default=200000)
+    args = arg_parser.parse_args()
+
+    ruleset = generate_ruleset(args.aces)
+    parsed, parse_time = timed(lambda: list(Parser.parse_ruleset(ruleset)))
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        text, json_write = timed(lambda: json.dumps(parsed, default=json_default, indent=4))
+        _, json_read = timed(lambda: json.loads(text))
+
+        def write():
+            with open(path, 'wb') as fil:
+                serialization.dump(parsed, fil)
+        _, bin_write = timed(write)
+        loaded, bin_read = timed(lambda: list(serialization.load(path)))
+        assert loaded == parsed
+
+        def read_bytes():
+            with open(path, 'rb') as fil:
+                return serialization.loads(fil.read())
+        _, bin_loads = timed(read_bytes)
+
+        def read_one():
+            with serialization.mapped(path) as reader:
+                return reader[len(reader) // 2]
+        item, bin_seek = timed(read_one)
+        assert item == parsed[len(parsed) // 2]
+        bin_size = os.path.getsize(path)
+    finally:
+        os.remove(path)
+
+    print('parse from text: {:6.2f}s'.format(parse_time))
+    print('json:   write {:6.2f}s  read {:6.2f}s  {:8.1f} MiB'.format(json_write, json_read, len(text) / 2 ** 20))
+    print('binary: write {:6.2f}s  read {:6.2f}s  {:8.1f} MiB  (loads: {:.2f}s, one item: {:.3f}s)'.format(
+        bin_write, bin_read, bin_size / 2 ** 20, bin_loads, bin_seek))
+    print('(json read yields plain dicts and strings; binary read rebuilds records and networks)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+bench_startup.py
+cold-start cost of the CLI for a single small config
+
+Reports the wall time of whole `fwrp_cli.py parse` runs against a bare
+interpreter, and the slowest imports from `python -X importtime`.
+
+run from the repository root:  python -m benchmarks.bench_startup --runs 20
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+CONFIG = (
+    'object network WEB\n'
+    ' host 10.0.0.10\n'
+    'access-list OUTSIDE_IN extended permit tcp any object WEB eq https\n'
+)
+
+
+def best_of(command, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def import_times(command):
+    """Parse `-X importtime` output into (cumulative us, module) pairs, slowest first."""
+    stderr = subprocess.run(command[:1] + ['-X', 'importtime'] + command[1:], check=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True).stderr
+    r_val = []
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, module = line.split('|')
+            if cumulative.strip().isdigit():
+                r_val.append((int(cumulative), module.strip()))
+    return sorted(r_val, reverse=True)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--runs', type=int, default=20)
+    arg_parser.add_argument('--top', type=int, default=10)
+    args = arg_parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.cfg')
+    with os.fdopen(fd, 'w') as fil:
+        fil.write(CONFIG)
+    try:
+        command = [sys.executable, 'fwrp_cli.py', 'parse', path]
+        bare = best_of([sys.executable, '-c', 'pass'], args.runs)
+        cli = best_of(command, args.runs)
+        print('bare interpreter: {:6.1f} ms'.format(bare * 1000))
+        print('fwrp_cli parse:   {:6.1f} ms  (+{:.1f} ms)'.format(cli * 1000, (cli - bare) * 1000))
+        print('slowest imports (cumulative):')
+        for cumulative, module in import_times(command)[:args.top]:
+            print('  {:8.1f} ms  {}'.format(cumulative / 1000, module))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
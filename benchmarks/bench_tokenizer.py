@@ -0,0 +1,40 @@
+"""
+bench_tokenizer.py
+tokens/sec through Parser.parse_ace on long ACEs
+
+run from the repository root:  python -m benchmarks.bench_tokenizer
+"""
+import argparse
+import time
+
+from fwrp.firewallruleparser import Parser
+
+LONG_ACES = [
+    'access-list OUTSIDE_IN extended permit tcp object-group SRC_GROUP_WITH_A_LONG_NAME '
+    '10.57.58.44 255.255.255.0 eq 22 log informational interval 300 inactive',
+    'access-list OUTSIDE_IN extended permit object-group PORT_GROUP object-group SRC_GROUP '
+    'object-group DST_GROUP log disable',
+    'access-list OUTSIDE_IN extended deny udp host 192.0.2.10 172.16.0.0 255.240.0.0 '
+    'eq domain log 7 interval 600',
+]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--repeat', type=int, default=100000)
+    args = arg_parser.parse_args()
+
+    token_lists = [ace.split() for ace in LONG_ACES]
+    token_count = sum(len(tokens) for tokens in token_lists) * args.repeat
+    parser = Parser()
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for tokens in token_lists:
+            # parse_ace used to consume its argument, so hand it a fresh list each time
+            parser.parse_ace(list(tokens))
+    elapsed = time.perf_counter() - start
+    print('{} tokens in {:.2f}s: {:.0f} tokens/s'.format(token_count, elapsed, token_count / elapsed))
+
+
+if __name__ == '__main__':
+    main()
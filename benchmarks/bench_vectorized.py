@@ -0,0 +1,78 @@
+"""
+bench_vectorized.py
+NumPy VectorACL.match_batch versus the pure-Python CompiledACL path
+
+run from the repository root:  python -m benchmarks.bench_vectorized --rules 2000 --flows 1000000
+"""
+import argparse
+import ipaddress
+import random
+import time
+
+from fwrp.evaluator import compile_acls
+from fwrp.firewallruleparser import Parser
+from fwrp.resolver import Resolver
+from fwrp.vectorized import VectorACL, flows_to_array
+from benchmarks.synthetic import generate_aces
+
+
+def random_flows(acl, count, seed=1):
+    """Half the flows are aimed at a random rule (so they usually match), half are random."""
+    rnd = random.Random(seed)
+    r_val = []
+    for _ in range(count):
+        if rnd.random() < 0.5:
+            rule = rnd.choice(acl.rules)
+            protocol, ports = next(iter(rule.services.items()))
+            protocol = 'tcp' if protocol == 'ip' else protocol
+            src = ipaddress.IPv4Address(rule.src[0][1])
+            dst = ipaddress.IPv4Address(rnd.randint(*rule.dst[0][1:]))
+            dport = rnd.randint(*ports.ranges[0]) if ports else rnd.randrange(1, 65536)
+        else:
+            protocol = rnd.choice(('tcp', 'udp'))
+            src = '10.{}.{}.{}'.format(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256))
+            dst = '172.{}.{}.{}'.format(rnd.randrange(16, 32), rnd.randrange(256), rnd.randrange(256))
+            dport = rnd.randrange(1, 65536)
+        r_val.append((protocol, src, dst, dport))
+    return r_val
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--rules', type=int, default=2000)
+    arg_parser.add_argument('--flows', type=int, default=1000000)
+    arg_parser.add_argument('--python-flows', type=int, default=100000,
+                            help='flows to time on the pure-Python path (it is much slower)')
+    args = arg_parser.parse_args()
+
+    parser = Parser()
+    parsed = list(parser.parse_lines(generate_aces(args.rules)))
+    acl = compile_acls(parsed, Resolver.from_parser(parser))['OUTSIDE_IN']
+    flows = random_flows(acl, args.flows)
+
+    start = time.perf_counter()
+    vector_acl = VectorACL(acl)
+    print('compiled {} rules to {} rows in {:.2f}s'.format(len(acl.rules), len(vector_acl),
+                                                           time.perf_counter() - start))
+    flow_array = flows_to_array(flows)
+
+    start = time.perf_counter()
+    matches = vector_acl.match_batch(flow_array)
+    elapsed = time.perf_counter() - start
+    print('numpy:  {:>9d} flows {:7.2f}s {:>10.0f} flows/s  {} matched'.format(
+        len(flows), elapsed, len(flows) / elapsed, int((matches >= 0).sum())))
+
+    python_flows = flows[:args.python_flows]
+    start = time.perf_counter()
+    results = acl.evaluate_batch(python_flows)
+    elapsed = time.perf_counter() - start
+    print('python: {:>9d} flows {:7.2f}s {:>10.0f} flows/s  {} matched'.format(
+        len(python_flows), elapsed, len(python_flows) / elapsed, sum(r is not None for r in results)))
+
+    rule_ids = {id(rule.ace): rule_id for rule_id, rule in enumerate(acl.rules)}
+    expected = [-1 if ace is None else rule_ids[id(ace)] for ace in results]
+    print('agreement on the python flows: {}'.format(expected == list(matches[:len(python_flows)])))
+
+
+if __name__ == '__main__':
+    main()
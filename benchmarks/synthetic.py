@@ -0,0 +1,167 @@
+"""
+synthetic.py
+deterministic generator of ASA-style configs for benchmarking
+"""
+import random
+
+
+def generate_aces(count, acl_name='OUTSIDE_IN', seed=0):
+    """
+    Yield ``count`` extended access-list lines.
+
+    :param count: number of ACEs to generate
+    :param acl_name: name of the access-list
+    :param seed: seed for the random generator, so output is repeatable
+    :return: generator of config lines
+    """
+    rnd = random.Random(seed)
+    protocols = ('tcp', 'udp', 'ip')
+    for _ in range(count):
+        action = rnd.choice(('permit', 'deny'))
+        proto = rnd.choice(protocols)
+        src = 'host 10.{}.{}.{}'.format(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256))
+        dst = '172.{}.{}.0 255.255.255.0'.format(rnd.randrange(16, 32), rnd.randrange(256))
+        line = 'access-list {} extended {} {} {} {}'.format(acl_name, action, proto, src, dst)
+        if proto != 'ip':
+            line += ' eq {}'.format(rnd.randrange(1, 65536))
+        yield line
+
+
+def generate_ruleset(count, seed=0):
+    return '\n'.join(generate_aces(count, seed=seed)) + '\n'
+
+
+ACL_NAMES = ('OUTSIDE_IN', 'INSIDE_OUT', 'DMZ_IN', 'MGMT_IN')
+NAMED_PORTS = ('www', 'https', 'ssh', 'domain', 'smtp', 'ftp', 'ldap', 'snmp')
+LOG_VARIANTS = ('', '', '', '', ' log', ' log 6', ' log informational', ' log 6 interval 300', ' log disable')
+
+
+def _address(rnd):
+    return '10.{}.{}.{}'.format(rnd.randrange(256), rnd.randrange(256), rnd.randrange(1, 255))
+
+
+def _subnet(rnd):
+    prefix = rnd.choice((16, 20, 24, 24, 24, 28, 30))
+    network = (10 << 24) | rnd.randrange(1 << 24)
+    network &= (0xffffffff << (32 - prefix)) & 0xffffffff
+    mask = (0xffffffff << (32 - prefix)) & 0xffffffff
+    return '{} {}'.format(*('.'.join(str(value >> shift & 0xff) for shift in (24, 16, 8, 0))
+                            for value in (network, mask)))
+
+
+class ConfigGenerator():
+    """
+    Deterministic generator of realistic ASA configs.
+
+    The config has network objects (hosts and subnets), service objects,
+    network object-groups that nest earlier groups, service object-groups,
+    and ACEs spread over several access-lists.  ACE addresses are any/any4,
+    host, address/mask, object or object-group; services are eq (numeric or
+    named), lt, gt, neq, range or a service object-group; about one in
+    twenty lines is a remark, and log variants and inactive ACEs are mixed in.
+
+    Object counts scale with the number of ACEs, so every size has the same shape.
+
+    :param aces: number of ACEs (remarks included)
+    :param seed: seed for the random generator, so output is repeatable
+    :param acl_names: access-lists the ACEs are spread over
+    """
+
+    def __init__(self, aces, seed=0, acl_names=ACL_NAMES):
+        self.aces = aces
+        self.seed = seed
+        self.acl_names = acl_names
+        self.network_objects = max(10, aces // 20)
+        self.service_objects = max(5, aces // 200)
+        self.network_groups = max(5, aces // 50)
+        self.service_groups = max(3, aces // 200)
+
+    def lines(self):
+        """Yield config lines (without terminators) one at a time, so any size fits in memory."""
+        rnd = random.Random(self.seed)
+        for index in range(self.network_objects):
+            yield 'object network OBJ_{}'.format(index)
+            if rnd.random() < 0.6:
+                yield ' host {}'.format(_address(rnd))
+            else:
+                yield ' subnet {}'.format(_subnet(rnd))
+        for index in range(self.service_objects):
+            yield 'object service SVC_{}'.format(index)
+            yield ' service {} destination eq {}'.format(rnd.choice(('tcp', 'udp')), rnd.randrange(1, 65536))
+        yield '!'
+        for index in range(self.network_groups):
+            yield 'object-group network GRP_{}'.format(index)
+            for _ in range(rnd.randrange(2, 7)):
+                kind = rnd.random()
+                if kind < 0.4:
+                    yield ' network-object host {}'.format(_address(rnd))
+                elif kind < 0.7:
+                    yield ' network-object {}'.format(_subnet(rnd))
+                elif kind < 0.9 or index == 0:
+                    yield ' network-object object OBJ_{}'.format(rnd.randrange(self.network_objects))
+                else:
+                    # nest an earlier group only, so the groups never form a cycle
+                    yield ' group-object GRP_{}'.format(rnd.randrange(index))
+        for index in range(self.service_groups):
+            yield 'object-group service PORTS_{} {}'.format(index, rnd.choice(('tcp', 'udp', 'tcp-udp')))
+            for _ in range(rnd.randrange(1, 5)):
+                if rnd.random() < 0.7:
+                    yield ' port-object eq {}'.format(rnd.choice((rnd.randrange(1, 65536),) + NAMED_PORTS))
+                else:
+                    low = rnd.randrange(1, 60000)
+                    yield ' port-object range {} {}'.format(low, low + rnd.randrange(1, 5000))
+        yield '!'
+        for index in range(self.aces):
+            acl_name = self.acl_names[rnd.randrange(len(self.acl_names))]
+            if rnd.random() < 0.05:
+                yield 'access-list {} remark change {} approved'.format(acl_name, index)
+            else:
+                yield self._ace(rnd, acl_name)
+
+    def _ace(self, rnd, acl_name):
+        proto = rnd.choice(('tcp', 'tcp', 'tcp', 'udp', 'udp', 'ip', 'icmp'))
+        line = 'access-list {} extended {} {} {} {}'.format(
+            acl_name, 'permit' if rnd.random() < 0.8 else 'deny', proto, self._target(rnd), self._target(rnd))
+        if proto in ('tcp', 'udp'):
+            line += self._service(rnd)
+        line += rnd.choice(LOG_VARIANTS)
+        if rnd.random() < 0.02:
+            line += ' inactive'
+        return line
+
+    def _target(self, rnd):
+        kind = rnd.random()
+        if kind < 0.1:
+            return rnd.choice(('any', 'any4'))
+        elif kind < 0.35:
+            return 'host {}'.format(_address(rnd))
+        elif kind < 0.6:
+            return _subnet(rnd)
+        elif kind < 0.8:
+            return 'object OBJ_{}'.format(rnd.randrange(self.network_objects))
+        return 'object-group GRP_{}'.format(rnd.randrange(self.network_groups))
+
+    def _service(self, rnd):
+        kind = rnd.random()
+        if kind < 0.15:
+            return ''
+        elif kind < 0.45:
+            return ' eq {}'.format(rnd.randrange(1, 65536))
+        elif kind < 0.65:
+            return ' eq {}'.format(rnd.choice(NAMED_PORTS))
+        elif kind < 0.75:
+            return ' {} {}'.format(rnd.choice(('lt', 'gt', 'neq')), rnd.randrange(1, 65536))
+        elif kind < 0.9:
+            low = rnd.randrange(1, 60000)
+            return ' range {} {}'.format(low, low + rnd.randrange(1, 5000))
+        return ' object-group PORTS_{}'.format(rnd.randrange(self.service_groups))
+
+    def write(self, path):
+        """Write the config to ``path``; returns the number of lines written."""
+        count = 0
+        with open(path, 'w') as fil:
+            for line in self.lines():
+                fil.write(line)
+                fil.write('\n')
+                count += 1
+        return count
@@ -0,0 +1,266 @@
+"""
+analysis.py
+find shadowed, redundant and correlated rules in parsed ACLs
+"""
+from .evaluator import CompiledRule
+from .records import Finding
+from .index import PrefixIndex
+
+# a side covering more than this fraction of the address space (a /8) is too wide to look up
+# in an index: the lookup would return most earlier rules, so it is checked per candidate
+WIDE_SPAN = 1 / 256
+
+
+def _ranges_cover(outer, inner):
+    # plain loops: this and _ranges_overlap run once per candidate pair
+    for i_version, i_low, i_high in inner:
+        for o_version, o_low, o_high in outer:
+            if o_low <= i_low and i_high <= o_high and o_version == i_version:
+                break
+        else:
+            return False
+    return True
+
+
+def _ranges_overlap(a, b):
+    for a_version, a_low, a_high in a:
+        for b_version, b_low, b_high in b:
+            if a_low <= b_high and b_low <= a_high and a_version == b_version:
+                return True
+    return False
+
+
+def _span(ranges):
+    """Fraction of the address space (summed over both versions) that ``ranges`` covers."""
+    return sum((high - low + 1) / (1 << (32 if version == 4 else 128)) for version, low, high in ranges)
+
+
+def _ports_cover(outer, inner):
+    if outer is None:
+        return True
+    if inner is None:
+        return False
+    return outer.issuperset(inner)
+
+
+def _ports_overlap(a, b):
+    if a is None or b is None:
+        return True
+    return not a.isdisjoint(b)
+
+
+def covers(outer, inner):
+    """True if every packet CompiledRule ``inner`` matches is also matched by ``outer``."""
+    if not (_ranges_cover(outer.src, inner.src) and _ranges_cover(outer.dst, inner.dst)):
+        return False
+    if 'ip' in outer.services:
+        return True
+    for protocol, ports in inner.services.items():
+        if protocol not in outer.services or not _ports_cover(outer.services[protocol], ports):
+            return False
+    return True
+
+
+def services_overlap(a, b):
+    """True if some protocol/port is matched by both CompiledRules (addresses are not checked)."""
+    if not (a.services and b.services):
+        return False
+    if 'ip' in a.services or 'ip' in b.services:
+        return True
+    return any(_ports_overlap(ports, b.services[protocol])
+               for protocol, ports in a.services.items() if protocol in b.services)
+
+
+# a rule filed under more (source prefix, destination prefix, protocol) keys than this in a
+# _CoverIndex is kept in its per-side fallback indexes instead
+MAX_COVER_KEYS = 64
+
+
+class _CoverIndex():
+    """
+    Earlier rules by (source prefix, destination prefix, protocol), to find the first one covering a rule.
+
+    A rule that covers another has a source prefix containing each of its
+    source networks, a destination prefix containing each of its destination
+    networks, and its protocols or ``ip``; so probing with a rule's first source
+    and destination network, masked to each pair of prefix lengths in use, and
+    with one of its protocols finds every rule that can cover it.
+    """
+
+    def __init__(self):
+        self._rules = {}
+        # (source version, source prefix length): {(destination version, destination prefix length)}
+        self._lengths = {}
+        # rules with too many keys, by source and by destination prefix
+        self._src = PrefixIndex()
+        self._dst = PrefixIndex()
+        self._fallback = False
+
+    def add(self, rule_id, rule, resolved):
+        if len(resolved.src) * len(resolved.dst) * len(rule.services) > MAX_COVER_KEYS:
+            for network in resolved.src:
+                self._src.add(network, rule_id)
+            for network in resolved.dst:
+                self._dst.add(network, rule_id)
+            self._fallback = True
+            return
+        for src in resolved.src:
+            src_key = (src.version, src.prefixlen, int(src.network_address))
+            dst_lengths = self._lengths.setdefault(src_key[:2], set())
+            for dst in resolved.dst:
+                dst_lengths.add((dst.version, dst.prefixlen))
+                for protocol in rule.services:
+                    key = src_key + (dst.version, dst.prefixlen, int(dst.network_address), protocol)
+                    self._rules.setdefault(key, []).append(rule_id)
+
+    def first_covering(self, rules, rule, resolved):
+        """Index of the earliest rule in ``rules`` covering ``rule``, or None."""
+        src = next(iter(resolved.src))
+        dst = next(iter(resolved.dst))
+        src_version, src_value, src_bits = src.version, int(src.network_address), src.max_prefixlen
+        dst_version, dst_value, dst_bits = dst.version, int(dst.network_address), dst.max_prefixlen
+        src_prefix_len = src.prefixlen
+        dst_prefix_len = dst.prefixlen
+        protocols = ('ip',) if 'ip' in rule.services else ('ip', next(iter(rule.services)))
+        r_val = None
+        for (version, src_len), dst_lengths in self._lengths.items():
+            if version != src_version or src_len > src_prefix_len:
+                continue
+            shift = src_bits - src_len
+            src_key = (version, src_len, src_value >> shift << shift)
+            for version, dst_len in dst_lengths:
+                if version != dst_version or dst_len > dst_prefix_len:
+                    continue
+                shift = dst_bits - dst_len
+                key = src_key + (version, dst_len, dst_value >> shift << shift)
+                for protocol in protocols:
+                    for rule_id in self._rules.get(key + (protocol,), ()):
+                        # each list is in rule order, so only its first covering rule can be the earliest
+                        if r_val is not None and rule_id >= r_val:
+                            break
+                        if covers(rules[rule_id], rule):
+                            r_val = rule_id
+                            break
+        fallback = self._src.covering(src) & self._dst.covering(dst) if self._fallback else ()
+        for rule_id in sorted(fallback):
+            if r_val is not None and rule_id >= r_val:
+                break
+            if covers(rules[rule_id], rule):
+                r_val = rule_id
+                break
+        return r_val
+
+
+def analyze_acl(acl_name, resolved_aces):
+    """
+    Compare each active rule with the earlier rules it can overlap.
+
+    A rule is *shadowed* if an earlier rule with a different action matches
+    everything it does, *redundant* if that earlier rule has the same action,
+    and *correlated* if it only partly overlaps earlier rules with a
+    different action.  Coverage is checked against single earlier rules;
+    a rule covered only by several earlier rules together is not reported.
+    A shadowed or redundant rule is related to the earliest rule covering it,
+    the one that decides its traffic; a correlated rule to every rule it
+    partly overlaps.  Rules limited to a user or user-group, or to a
+    time-range, never cover a later rule, since other traffic (or the same
+    traffic at other times) passes them by; a later rule they would cover is
+    at most correlated with them.
+
+    The covering rule is looked up in a _CoverIndex, so wide rules are not
+    compared with every earlier rule they overlap.  Only rules no earlier rule
+    covers are checked for correlation, against source and destination prefix
+    indexes of the rules with the other action.  Each such rule looks up its
+    narrower side first (the destination of ``any -> host`` rules, say); the
+    other side is looked up too and intersected unless it is wider than
+    WIDE_SPAN, in which case it is checked per candidate instead.
+
+    :param acl_name: name of the ACL, used in the findings
+    :param resolved_aces: ResolvedACEs of one ACL, in order
+    :return: list of Findings in rule order
+    """
+    rules = []
+    cover_index = _CoverIndex()
+    # action: (source index, destination index) of the earlier rules with that action
+    action_indexes = {}
+    r_val = []
+
+    for resolved in resolved_aces:
+        if not resolved.ace['active']:
+            continue
+        rule = CompiledRule(resolved)
+        if not (rule.services and resolved.src and resolved.dst):
+            # matches nothing, so neither covers nor overlaps any rule
+            rules.append(rule)
+            continue
+
+        covering = cover_index.first_covering(rules, rule, resolved)
+        if covering is not None:
+            earlier = rules[covering]
+            kind = 'redundant' if earlier.action == rule.action else 'shadowed'
+            r_val.append(Finding(kind=kind, acl=acl_name, ace=rule.ace, related=(earlier.ace,)))
+        else:
+            src_span = _span(rule.src)
+            dst_span = _span(rule.dst)
+            check_src = src_span > dst_span
+            check_wide = (src_span if check_src else dst_span) > WIDE_SPAN
+            narrow_networks, wide_networks = (resolved.dst, resolved.src) if check_src else (resolved.src, resolved.dst)
+            candidates = set()
+            for action, (src_index, dst_index) in action_indexes.items():
+                if action == rule.action:
+                    continue
+                narrow_index, wide_index = (dst_index, src_index) if check_src else (src_index, dst_index)
+                found = set()
+                for network in narrow_networks:
+                    found.update(narrow_index.overlapping(network))
+                if found and not check_wide:
+                    wide_found = set()
+                    for network in wide_networks:
+                        wide_found.update(wide_index.overlapping(network))
+                    found &= wide_found
+                candidates |= found
+
+            correlated = []
+            for rule_id in sorted(candidates):
+                earlier = rules[rule_id]
+                if check_wide and not (_ranges_overlap(earlier.src, rule.src) if check_src
+                                       else _ranges_overlap(earlier.dst, rule.dst)):
+                    continue
+                if services_overlap(earlier, rule) and not covers(rule, earlier):
+                    correlated.append(earlier)
+            if correlated:
+                r_val.append(Finding(kind='correlated', acl=acl_name, ace=rule.ace,
+                                     related=tuple(earlier.ace for earlier in correlated)))
+
+        rule_id = len(rules)
+        rules.append(rule)
+        if 'user' not in rule.ace and 'time_range' not in rule.ace:
+            # a rule limited to a user or user-group, or to a time-range, does not match
+            # all the traffic it names, so it never covers a later rule; it can still be
+            # reported as correlated
+            cover_index.add(rule_id, rule, resolved)
+        src_index, dst_index = action_indexes.setdefault(rule.action, (PrefixIndex(), PrefixIndex()))
+        for network in resolved.src:
+            src_index.add(network, rule_id)
+        for network in resolved.dst:
+            dst_index.add(network, rule_id)
+
+    return r_val
+
+
+def analyze(parsed, resolver):
+    """
+    Analyze every ACL in parser output.
+
+    :param parsed: iterable of Parser results; objects and remarks are skipped
+    :param resolver: Resolver used to expand object references
+    :return: dict of ACL name to list of Findings
+    """
+    acls = {}
+    for item in parsed:
+        if isinstance(item, dict):
+            continue
+        resolved = resolver.resolve(item)
+        if resolved is not None:
+            acls.setdefault(item['acl'], []).append(resolved)
+    return {acl_name: analyze_acl(acl_name, resolved_aces) for acl_name, resolved_aces in acls.items()}
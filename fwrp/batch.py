@@ -0,0 +1,173 @@
+"""
+batch.py
+parse many device configs across a pool of worker processes
+"""
+import collections
+import fnmatch
+import json
+import os
+import tempfile
+
+from .firewallruleparser import Parser
+from .utils import json_default
+
+OUTPUT_SUFFIXES = {
+    'jsonl': '.jsonl',
+    'binary': '.fwrpb',
+}
+
+DeviceJob = collections.namedtuple('DeviceJob', 'path output_path lenient', defaults=(False,))
+# ``error`` is why the whole device failed; ``group_errors`` are the GroupErrors a lenient parse skipped
+DeviceResult = collections.namedtuple('DeviceResult', 'path output_path lines records error group_errors',
+                                      defaults=((),))
+
+
+def json_lines(parsed):
+    """Parsed items as compact JSON lines, in one string; an ``encode`` function for Parser.parse_lines."""
+    return ''.join(json.dumps(item, default=json_default, separators=(',', ':')) + '\n' for item in parsed)
+
+
+def write_json_lines(parsed, fileobj, flush=False):
+    """
+    Write each parsed item to ``fileobj`` as one compact JSON line.
+
+    :param flush: flush after every line, for output that is consumed live
+    :return: number of items written
+    """
+    count = 0
+    for item in parsed:
+        fileobj.write(json.dumps(item, default=json_default, separators=(',', ':')))
+        fileobj.write('\n')
+        if flush:
+            fileobj.flush()
+        count += 1
+    return count
+
+
+def find_configs(paths, pattern='*'):
+    """
+    Expand files and directories of device backups into a sorted list of config files.
+
+    Directories are walked recursively and only files whose name matches
+    ``pattern`` are taken from them; files named explicitly are always taken.
+
+    :return: list of (path, relative name) tuples; the name is used for the output file
+    """
+    configs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dir_path, dir_names, file_names in os.walk(path):
+                dir_names.sort()
+                for file_name in sorted(fnmatch.filter(file_names, pattern)):
+                    full_path = os.path.join(dir_path, file_name)
+                    configs.append((full_path, os.path.relpath(full_path, path)))
+        else:
+            configs.append((path, os.path.basename(path)))
+    return configs
+
+
+def _path_name(path):
+    """Output name for ``path`` that keeps its directories: relative to the current directory, if under it."""
+    name = os.path.relpath(path)
+    if name == os.pardir or name.startswith(os.pardir + os.sep):
+        name = os.path.splitdrive(os.path.abspath(path))[1].lstrip(os.sep)
+    return name
+
+
+def plan_jobs(configs, output_dir, output_format='jsonl', lenient=False):
+    """
+    Map each (path, name) from find_configs to a DeviceJob writing under ``output_dir``.
+
+    Inputs that share a name (``site1/fw.cfg`` and ``site2/fw.cfg`` named
+    explicitly) are written under their paths instead, so no two devices
+    write the same file; a clash that remains (the same file given twice)
+    raises ValueError.
+    """
+    suffix = OUTPUT_SUFFIXES[output_format]
+
+    def normalized(name):
+        return os.path.normcase(os.path.normpath(name))
+
+    name_counts = collections.Counter(normalized(name) for _, name in configs)
+    jobs = []
+    writers = {}
+    for path, name in configs:
+        if name_counts[normalized(name)] > 1:
+            name = _path_name(path)
+        output_path = os.path.join(output_dir, name + suffix)
+        if normalized(output_path) in writers:
+            raise ValueError('{} and {} would both be written to {}'.format(
+                writers[normalized(output_path)], path, output_path))
+        writers[normalized(output_path)] = path
+        jobs.append(DeviceJob(path, output_path, lenient))
+    return jobs
+
+
+def _file_mode():
+    """Permission bits open() gives a new file: 0o666 less the process umask."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def parse_device(job):
+    """
+    Parse one config file and write its per-device output.
+
+    Runs in a worker process, so failures are reported in the result rather than raised.
+    Output goes to a temporary file that is renamed into place once the device
+    has parsed, so a failure never leaves a partial output file behind.
+
+    :param job: DeviceJob
+    :return: DeviceResult
+    """
+    counter = [0]
+
+    def counted(lines):
+        for line in lines:
+            counter[0] += 1
+            yield line
+
+    parser = Parser(lenient=job.lenient)
+    tmp_path = None
+    try:
+        output_dir = os.path.dirname(job.output_path) or '.'
+        os.makedirs(output_dir, exist_ok=True)
+        # newline='' keeps CRLF terminators, so recorded byte offsets match the file
+        with open(job.path, newline='') as fil:
+            parsed = parser.parse_lines(counted(fil))
+            fd, tmp_path = tempfile.mkstemp(dir=output_dir, suffix='.tmp')
+            if job.output_path.endswith(OUTPUT_SUFFIXES['binary']):
+                from . import serialization
+                with os.fdopen(fd, 'wb') as out:
+                    records = serialization.dump(parsed, out)
+            else:
+                with os.fdopen(fd, 'w') as out:
+                    records = write_json_lines(parsed, out)
+        # mkstemp creates the file 0600; give the output the mode a plain open() would
+        os.chmod(tmp_path, _file_mode())
+        os.replace(tmp_path, job.output_path)
+    except (OSError, UnicodeDecodeError, ValueError) as err:
+        if tmp_path is not None:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+        return DeviceResult(job.path, job.output_path, counter[0], 0, '{}: {}'.format(type(err).__name__, err))
+    return DeviceResult(job.path, job.output_path, counter[0], records, None, parser.errors)
+
+
+def parse_devices(jobs, workers=None):
+    """
+    Run parse_device over ``jobs``, in a pool of ``workers`` processes when workers > 1.
+
+    :return: generator of DeviceResults, in order of completion
+    """
+    if workers is None or workers <= 1:
+        yield from map(parse_device, jobs)
+        return
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(parse_device, job) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
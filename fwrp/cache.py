@@ -0,0 +1,160 @@
+"""
+cache.py
+on-disk cache of parsed rulesets, keyed by a hash of the config text
+"""
+import hashlib
+import os
+import tempfile
+import zlib
+
+from .firewallruleparser import PARSER_VERSION, Parser
+from .records import Target
+from .utils import pickle_dumps, pickle_loads
+
+CACHE_SUFFIX = '.fwrpc'
+
+
+def _share_equal_targets(parsed):
+    """
+    Rebuild parsed output so equal Target records are one shared object.
+
+    Pickle writes a shared object once and restores it once, so this makes
+    entries smaller and loads faster; most ACE targets repeat.
+    """
+    canonical = {}
+    r_val = []
+    for item in parsed:
+        if isinstance(item, dict):
+            item = dict(item, target=[canonical.setdefault(t, t) for t in item['target']])
+        elif 'src' in item:
+            values = [getattr(item, name) for name in item._field_names]
+            item = type(item)(*(canonical.setdefault(v, v) if isinstance(v, Target) else v for v in values))
+        r_val.append(item)
+    return r_val
+
+
+def dumps(parsed, errors=()):
+    """
+    Serialize parsed output, and any GroupErrors from a lenient parse, to compressed bytes.
+
+    Shared values (interned networks and names, equal targets) stay shared on load.
+    """
+    return zlib.compress(pickle_dumps((_share_equal_targets(parsed), tuple(errors))), 1)
+
+
+def loads_entry(data):
+    """Inverse of dumps: tuple of the parsed list and the tuple of GroupErrors."""
+    return pickle_loads(zlib.decompress(data))
+
+
+def loads(data):
+    return loads_entry(data)[0]
+
+
+class ParseCache():
+    """
+    Cache of parsed rulesets in ``directory``.
+
+    Entries are keyed by a SHA-256 of PARSER_VERSION, the parse mode and the
+    config text, so an unchanged config is never re-parsed and a parser
+    upgrade never serves stale output.  Lenient parses are cached apart from
+    strict ones, with the GroupErrors they collected: a strict parse of a bad
+    config still raises, and a lenient hit reports the same errors as a miss.
+    When the cache grows past ``max_bytes`` the least recently used entries
+    (by file mtime, refreshed on every hit) are removed.
+
+    Entries are pickles; only point this at a directory you trust.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 2 ** 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(ruleset_text, lenient=False):
+        digest = hashlib.sha256('{}\0{}\0'.format(PARSER_VERSION, 'lenient' if lenient else 'strict').encode())
+        digest.update(ruleset_text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def get_entry(self, ruleset_text, lenient=False):
+        """Return the cached (parsed list, GroupErrors) for ``ruleset_text``, or None."""
+        path = self._path(self.key(ruleset_text, lenient))
+        try:
+            with open(path, 'rb') as fil:
+                data = fil.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # evicted by another process since the read; the data is still good
+            pass
+        self.hits += 1
+        return loads_entry(data)
+
+    def get(self, ruleset_text, lenient=False):
+        """Return the cached parse of ``ruleset_text`` as a list, or None."""
+        entry = self.get_entry(ruleset_text, lenient)
+        return None if entry is None else entry[0]
+
+    def put(self, ruleset_text, parsed, errors=(), lenient=False):
+        """Store ``parsed`` (a list of parser results) and the ``errors`` of a lenient parse for ``ruleset_text``."""
+        path = self._path(self.key(ruleset_text, lenient))
+        # write to a temporary file first so concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fil:
+                fil.write(dumps(parsed, errors))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.evict()
+
+    def parse(self, ruleset_text, parser=None):
+        """
+        Return the parse of ``ruleset_text``, from the cache if possible.
+
+        :param ruleset_text: config text
+        :param parser: Parser to use on a miss (default: a new one); its lenient
+            flag picks the cache entry, and on a hit the entry's objects and
+            GroupErrors are added to it just as a parse would add them
+        :return: list of parsed objects and ACEs
+        """
+        parser = parser if parser is not None else Parser()
+        entry = self.get_entry(ruleset_text, parser.lenient)
+        if entry is not None:
+            parsed, errors = entry
+            for item in parsed:
+                if isinstance(item, dict):
+                    parser.add_object(item)
+            parser.errors.extend(errors)
+            return parsed
+        first_error = len(parser.errors)
+        parsed = list(parser.parse_ruleset(ruleset_text))
+        self.put(ruleset_text, parsed, parser.errors[first_error:], parser.lenient)
+        return parsed
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(CACHE_SUFFIX):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,202 @@
+"""
+evaluator.py
+first-match evaluation of flows against compiled ACLs
+"""
+import collections
+import ipaddress
+
+from .index import PrefixIndex
+from .ports import ICMP_PROTOCOLS, PortSet, icmp_types
+
+Flow = collections.namedtuple('Flow', ['protocol', 'src', 'dst', 'dport'])
+Flow.__new__.__defaults__ = (None,)
+Flow.__doc__ = ('A flow to evaluate: protocol name or number, source and destination address, destination port '
+                '(for icmp and icmp6, the icmp type).')
+
+PROTOCOL_NAMES = {
+    '1': 'icmp',
+    '6': 'tcp',
+    '17': 'udp',
+    '47': 'gre',
+    '50': 'esp',
+    '51': 'ah',
+    '58': 'icmp6',
+    '89': 'ospf',
+}
+
+# protocols whose services are ports; icmp services are types, and for anything else any port-like value matches
+PORT_PROTOCOLS = frozenset(('tcp', 'udp', 'sctp'))
+
+
+def _address_ranges(networks):
+    return tuple((network.version, int(network.network_address), int(network.broadcast_address))
+                 for network in networks)
+
+
+def _service_ports(protocol, ports):
+    """PortSet a resolved Service's ports stand for (icmp type numbers for icmp), or None for every port."""
+    if ports is None or type(ports) is PortSet:
+        return ports
+    # a ServiceSpec that was built without its PortSet
+    if protocol in PORT_PROTOCOLS:
+        return PortSet.from_spec(ports['op'], ports['val'])
+    if protocol in ICMP_PROTOCOLS:
+        try:
+            return icmp_types(protocol, ports['val'])
+        except ValueError:
+            return None
+    return None
+
+
+def _service_table(services):
+    """
+    Reduce resolved Services to {protocol: PortSet or None}; None means every port.
+    """
+    r_val = {}
+    for service in services:
+        protocol = PROTOCOL_NAMES.get(service.protocol, service.protocol)
+        if protocol not in PORT_PROTOCOLS and protocol not in ICMP_PROTOCOLS:
+            r_val[protocol] = None
+        elif protocol not in r_val or r_val[protocol] is not None:
+            ports = _service_ports(protocol, service.ports)
+            if ports is None:
+                r_val[protocol] = None
+            else:
+                r_val[protocol] = r_val[protocol] | ports if protocol in r_val else ports
+    return r_val
+
+
+class CompiledRule():
+    __slots__ = ('ace', 'action', 'src', 'dst', 'services')
+
+    def __init__(self, resolved):
+        self.ace = resolved.ace
+        self.action = resolved.ace['action']
+        self.src = _address_ranges(resolved.src)
+        self.dst = _address_ranges(resolved.dst)
+        self.services = _service_table(resolved.service)
+
+    def matches(self, protocol, src, dst, dport):
+        """Match pre-converted flow fields: src/dst as (version, int), dport as int or None."""
+        if 'ip' in self.services:
+            ports = None
+        elif protocol in self.services:
+            ports = self.services[protocol]
+        else:
+            return False
+        if ports is not None:
+            if dport is None or dport not in ports:
+                return False
+        return (any(version == src[0] and low <= src[1] <= high for version, low, high in self.src) and
+                any(version == dst[0] and low <= dst[1] <= high for version, low, high in self.dst))
+
+
+class CompiledACL():
+    """
+    One access-list compiled for evaluation.
+
+    Inactive rules, remarks and rules limited to a user or user-group (flows
+    carry no identity, so they never match) are dropped at compile time.  Rules are indexed
+    by destination prefix, so a flow is only tested against rules that can
+    match its destination, in ACL order, and the first match wins.
+
+    Flows carry no time either, and the time-range definitions are not
+    parsed, so a rule with a time-range is by default evaluated as if the
+    range were always in effect; with ``time_ranged=False`` such rules are
+    dropped, as if it never were.
+
+    :param name: access-list name
+    :param resolved_aces: ResolvedACEs to add, in order
+    :param time_ranged: keep rules that have a time-range
+    """
+
+    def __init__(self, name, resolved_aces=(), time_ranged=True):
+        self.name = name
+        self.time_ranged = time_ranged
+        self.rules = []
+        self.dst_index = PrefixIndex()
+        for resolved in resolved_aces:
+            self.add(resolved)
+
+    def add(self, resolved):
+        ace = resolved.ace
+        if not ace['active'] or 'user' in ace or (not self.time_ranged and 'time_range' in ace):
+            return
+        rule_id = len(self.rules)
+        rule = CompiledRule(resolved)
+        self.rules.append(rule)
+        for network in resolved.dst:
+            self.dst_index.add(network, rule_id)
+
+    @staticmethod
+    def _flow_key(flow):
+        protocol, src, dst, dport = flow
+        protocol = str(protocol)
+        protocol = PROTOCOL_NAMES.get(protocol, protocol)
+        src = ipaddress.ip_address(src)
+        dst = ipaddress.ip_address(dst)
+        if dport is not None:
+            dport = int(dport)
+        return protocol, (src.version, int(src)), dst, dport
+
+    def _evaluate(self, protocol, src, dst, dport):
+        rules = self.rules
+        dst_key = (dst.version, int(dst))
+        for rule_id in sorted(self.dst_index.lookup_address(dst)):
+            rule = rules[rule_id]
+            if rule.matches(protocol, src, dst_key, dport):
+                return rule.ace
+        return None
+
+    def evaluate(self, flow):
+        """
+        Find the first rule matching a flow.
+
+        :param flow: Flow or (protocol, src, dst, dport) tuple
+        :return: the matching ACE, or None if the flow falls through to the implicit deny
+        """
+        return self._evaluate(*self._flow_key(flow))
+
+    def permits(self, flow):
+        ace = self.evaluate(flow)
+        return ace is not None and ace['action'] == 'permit'
+
+    def evaluate_batch(self, flows):
+        """
+        Evaluate many flows, returning the matching ACE (or None) for each, in order.
+
+        Repeated flows, common in NetFlow exports, are only evaluated once.
+        """
+        cache = {}
+        r_val = []
+        for flow in flows:
+            key = tuple(flow)
+            try:
+                r_val.append(cache[key])
+            except KeyError:
+                result = cache[key] = self._evaluate(*self._flow_key(key))
+                r_val.append(result)
+        return r_val
+
+
+def compile_acls(parsed, resolver, time_ranged=True):
+    """
+    Compile every access-list in parser output.
+
+    :param parsed: iterable of Parser results; objects and remarks are skipped
+    :param resolver: Resolver used to expand object references
+    :param time_ranged: see CompiledACL
+    :return: dict of ACL name to CompiledACL
+    """
+    r_val = {}
+    for item in parsed:
+        if isinstance(item, dict):
+            continue
+        resolved = resolver.resolve(item)
+        if resolved is None:
+            continue
+        acl_name = item['acl']
+        if acl_name not in r_val:
+            r_val[acl_name] = CompiledACL(acl_name, time_ranged=time_ranged)
+        r_val[acl_name].add(resolved)
+    return r_val
@@ -2,9 +2,18 @@
 firewall_rule_parser.py
 """
 
-import ipaddress
+import collections
+import functools
+import time
+import types
 
-from .utils import lpop, cidr_from_netmask, is_ip_address, is_ip_network
+from .ports import ICMP_PROTOCOLS
+from .records import ACE, GroupError, ServiceSpec, Target
+from .utils import (Interner, TokenStream, is_ip_address, is_ip_network, json_default, pickle_dumps, pickle_loads,
+                    token_stream)
+
+# bump whenever the shape of parsed output changes, so cached results are not reused
+PARSER_VERSION = 8
 
 test_rules = [
     'access-list 123 permit tcp any host 10.20.30.40 eq 80'
@@ -22,239 +31,780 @@ log_levels = [
 ]
 log_levels.extend(range(0, 8))
 
+# tokens that may follow 'log' to set its level; log_levels holds the numeric levels as ints
+LOG_LEVEL_KEYWORDS = frozenset(str(level) for level in log_levels) | {'default', 'Default', 'disable'}
+
 
 def cli_group(lines):
+    """
+    Group CLI lines into top-level commands and their indented sub-commands.
+
+    Only the group currently being built is held in memory, so ``lines`` may
+    be any iterable (a list, a file object, a generator).  Blank lines are
+    dropped without ending the current group; ``!`` comment lines end it.
+    Indented lines with no group to belong to (after a ``!``, or at the top of
+    the input) are grouped on their own, so parse_group can report them.
+
+    :param lines: iterable of CLI lines without line terminators
+    :return: generator of lists of lines, one list per CLI group
+    """
+    for _, _, grp in located_cli_group(lines):
+        yield grp
+
+
+def line_size(line):
+    """Size of ``line`` in bytes (UTF-8) in the source file; a line without a terminator counts one for its newline."""
+    size = len(line) if line.isascii() else len(line.encode('utf-8'))
+    if not line.endswith(('\n', '\r')):
+        size += 1
+    return size
+
+
+def located_cli_group(lines, first_line=1, first_offset=0):
+    """
+    cli_group, also giving the line number and byte offset each group starts at.
+
+    Offsets are exact when ``lines`` keep their terminators (a file opened
+    with ``newline=''``, or ``splitlines(keepends=True)``); lines without one
+    are taken to end in a single newline.
+
+    :param lines: iterable of CLI lines, with or without line terminators
+    :param first_line: line number of the first line in ``lines``
+    :param first_offset: byte offset of the first line in ``lines``
+    :return: generator of (line number, byte offset, list of lines) tuples
+    """
     current_grp = []
-    for line in lines:
-        if not line.startswith(' '):
+    current_line = first_line
+    current_offset = offset = first_offset
+    for line_number, raw_line in enumerate(lines, first_line):
+        line = raw_line.rstrip('\r\n')
+        if not line or line.isspace():
+            pass  # blank lines do not end a group
+        elif not line.startswith(' '):
             if current_grp:
-                yield current_grp
-            if line and not line.startswith('!'):
+                yield current_line, current_offset, current_grp
+            if line.startswith('!'):
+                current_grp = []
+            else:
                 current_grp = [line]
-        else:
+                current_line = line_number
+                current_offset = offset
+        elif current_grp:
             current_grp.append(line)
+        else:
+            # an orphaned sub-command: keep it as a group of its own rather than losing it
+            current_grp = [line]
+            current_line = line_number
+            current_offset = offset
+        offset += line_size(raw_line)
     if current_grp:
-        yield current_grp
+        yield current_line, current_offset, current_grp
 
 
-class Parser():
+def chunk_lines(lines, chunk_size):
+    """
+    Split lines into chunks of roughly ``chunk_size`` lines, cutting only at CLI group boundaries.
 
-    def __init__(self):
-        self.objects = {}
-        self.object_groups = {}
+    :param lines: iterable of CLI lines, with or without line terminators
+    :param chunk_size: minimum number of lines per chunk (the last chunk may be shorter)
+    :return: generator of lists of lines
+    """
+    chunk = []
+    for line in lines:
+        # blank lines do not end a group, so never cut in front of one
+        if len(chunk) >= chunk_size and not line.startswith((' ', '\r', '\n')) and line:
+            yield chunk
+            chunk = []
+        chunk.append(line)
+    if chunk:
+        yield chunk
 
-    @staticmethod
-    def parse_ace(ace_list):
-        acl_name, ace_type = ace_list[1:3]
 
-        r_val = {'log': '',
-                 'active': True,
-                 'text': ' '.join(ace_list)}
-
-        if ace_type == 'remark':
-            r_val.update({'type': 'remark',
-                          'text': ' '.join(ace_list)})
-        elif ace_type == 'extended':
-            ace_action, ace_proto = ace_list[3:5]
-            r_val.update({
-                'acl_type': ace_type,
-                'action': ace_action,
-                'protocol': ace_proto,
-                'acl': acl_name,
-            })
-            r_val.update(Parser.parse_targets(ace_list[4:]))
-            r_ace_list = r_val.pop('remaining_list')
-
-            for index, item in enumerate(r_ace_list):
-                if item == 'log':
-                    try:
-                        n_item = r_ace_list[index + 1]
-                        if n_item in log_levels or n_item in ('disable', 'Default'):
-                            r_val['log'] = 'log {}'.format(n_item)
-                        elif n_item == 'interval':
-                            r_val['log'] = 'log {} {}'.format(n_item, r_ace_list[index + 2])
-                        else:
-                            raise IndexError
-                    except IndexError:
-                        r_val['log'] = ['log']
-
-                elif item == 'inactive':
-                    r_val['active'] = False
-
-            return r_val
-
-    @staticmethod
-    def parse_targets(targets_list):
-
-        if 'object' in targets_list[0]:
-            s_type = targets_list[0]
-        else:
-            s_type = lpop(targets_list)
+def _parse_chunk(chunk, lenient=False, first_line=1, first_offset=0, profile=False, encode=None):
+    # runs in a worker process; must stay a module-level function so it can be pickled.
+    # The results go back pre-pickled (or already encoded): the executor would unpickle
+    # them with default pickling (networks re-parsed from strings) and GC running, in the
+    # parent's one result thread, which then costs more than parsing the chunk did
+    parser = Parser(lenient=lenient, profile=Profile() if profile else None)
+    results = [parsed for parsed in parser._parse_groups(chunk, first_line, first_offset) if parsed is not None]
+    return (pickle_dumps(results) if encode is None else encode(results)), parser.errors, parser.profile
 
-        # staying generic about this because we don't know exactly what format this is yet
-        t_A, targets_list = Parser.parse_target(targets_list)
-        t_B, targets_list = Parser.parse_target(targets_list)
-        try:
-            t_C, targets_list = Parser.parse_target(targets_list)
-        except ValueError:
-            t_C = {'type': 'protocol',
-                   'target': s_type}
 
-        if 'object' in s_type:
-            svc, src, dst = t_A, t_B, t_C
-        else:
-            src, dst, svc = t_A, t_B, t_C
+def _first_token(target_list):
+    if isinstance(target_list, TokenStream):
+        return target_list.peek()
+    return target_list[0] if target_list else None
 
-        if svc['type'] == 'service':
-            svc['type'] = s_type
 
-        return {'src': src, 'dst': dst, 'service': svc, 'remaining_list': targets_list}
+def _branch(token, keywords):
+    # keywords are the dispatch tables' keys (TARGET_KEYWORDS, OBJECT_TARGET_KEYWORDS); anything else is an address
+    if token is None:
+        return '(end)'
+    return token if token in keywords else '(address)'
 
-    @staticmethod
-    def parse_target(target_list):
-        o_tl = target_list.copy()
-        try:
-            t_type = lpop(target_list)
-        except ValueError:
-            raise ValueError('invalid target_list "{}"'.format(target_list))
-        r_val = {'type': t_type}
-
-        if t_type in ('any', 'any4', 'any6'):
-            r_val['target'] = t_type
-
-        elif t_type == 'host':
-            r_val['type'] = 'network'
-            t_target = lpop(target_list)
-            r_val['target'] = ipaddress.ip_network('/'.join([t_target, '32']))
-
-        elif t_type in ('object', 'object-group'):
-            t_target = lpop(target_list)
-            r_val['target'] = t_target
-
-        elif t_type in ('eq', 'lt', 'gt'):
-            r_val['type'] = 'service'
-            r_val['target'] = {'op': t_type,
-                               'val': lpop(target_list)}
-
-        elif is_ip_address(t_type):  # it's an address and mask combination
-            t_target = t_type
-            r_val['type'] = 'network'
-            t_mask = lpop(target_list)
-            t_bit_len = cidr_from_netmask(t_mask)
-            t_cidr = '/'.join((t_target, str(t_bit_len)))
-            r_val['target'] = ipaddress.ip_network(t_cidr, False)
 
-        else:
-            raise ValueError('Invalid target list: {}'.format(o_tl))
+def _target_branch(target_list):
+    return _branch(_first_token(target_list), TARGET_KEYWORDS)
 
-        return r_val, target_list
 
-    @staticmethod
-    def parse_object_target(target_list):
-        r_val = {}
-        t_type = lpop(target_list)
-        if t_type == 'object':
-            r_val['type'] = 'object'
-            r_val['target'] = lpop(target_list)
-        elif is_ip_address(t_type):
-            t_target = t_type
-            r_val['type'] = 'network'
-            t_mask = lpop(target_list)
-            t_bit_len = cidr_from_netmask(t_mask)
-            t_cidr = '/'.join((t_target, str(t_bit_len)))
-            r_val['target'] = ipaddress.ip_network(t_cidr, False)
-        elif is_ip_network(t_type):
-            r_val['type'] = 'network'
-            r_val['target'] = ipaddress.ip_network(t_type)
-        elif t_type == 'range':
-            r_val['type'] = t_type
-            r_val['target'] = target_list
-        elif t_type == 'host':
-            r_val['type'] = 'network'
-            r_val['target'] = ipaddress.ip_network(target_list[0])
-        elif t_type in ('subnet', 'network-object'):
-            r_val['type'] = 'network'
-            r_val.update(Parser.parse_object_target(target_list))
-        elif t_type == 'port-object':
-            r_val['type'] = 'service'
-            t_op, *t_val = target_list
-            r_val['target'] = {'op': t_op, 'val': ' '.join(t_val)}
-        elif t_type in ('service', 'service-object'):
-            s_type = lpop(target_list)
-            if s_type == 'object':
-                r_val['type'] = 'object'
-                r_val['target'] = lpop(target_list)
-            else:
-                r_val['type'] = 'service'
-                r_val['protocol'] = s_type
-                if s_type == 'icmp':
-                    try:
-                        r_val['target'] = {'op': 'eq', 'val': target_list[0]}
-                    except IndexError:
-                        r_val['target'] = {'op': 'eq', 'val': 'any'}
-                else:
-                    _ = lpop(target_list)
-                    t_op, *t_val = target_list
-                    r_val['target'] = {'op': t_op, 'val': ' '.join(t_val)}
-        elif t_type == 'icmp-object':
-            r_val['type'] = 'service'
-            r_val['protocol'] = 'icmp'
-            r_val['target'] = {'op': 'eq', 'val': lpop(target_list)}
-        elif t_type == 'group-object':
-            r_val['type'] = 'object-group'
-            r_val['target'] = lpop(target_list)
-        elif t_type == 'protocol-object':
-            r_val['type'] = 'protocol'
-            r_val['target'] = lpop(target_list)
-        elif t_type == 'description':
+def _object_target_branch(target_list):
+    return _branch(_first_token(target_list), OBJECT_TARGET_KEYWORDS)
+
+
+class Profile():
+    """
+    Opt-in instrumentation for a Parser: ``Parser(profile=Profile())``.
+
+    Records, per stage, the number of calls and the inclusive wall time, and
+    per parse method, how often each keyword branch was taken.  A Parser
+    without a profile is not instrumented at all, so profiling costs nothing
+    unless it is asked for.
+
+    Interner lookups are split into hit and miss branches; a network miss is
+    an ip_network construction.
+    """
+
+    # (stage, branch classifier or None) for every instrumented Parser method
+    PARSER_STAGES = (
+        ('parse_group', None),
+        ('parse_ace', lambda ace_list, *args, **kwargs: ace_list[2] if len(ace_list) > 2 else None),
+        ('parse_object', lambda object_lines, *args, **kwargs: ' '.join(object_lines[0].split()[:2])),
+        ('parse_targets', None),
+        ('parse_target', _target_branch),
+        ('parse_object_target', _object_target_branch),
+        ('_is_ip_address', None),
+        ('_is_ip_network', None),
+    )
+
+    def __init__(self):
+        self.times = collections.Counter()
+        self.calls = collections.Counter()
+        self.branches = collections.Counter()
+
+    def instrument(self, parser):
+        """Wrap ``parser``'s parse methods and interner (on the instance only) to record into this profile."""
+        for stage, classify in self.PARSER_STAGES:
+            setattr(parser, stage, self.wrap(stage.lstrip('_'), getattr(parser, stage), classify))
+        tables = parser.interner.tables
+        parser.interner.name = self.wrap(
+            'interner.name', parser.interner.name,
+            lambda text: 'hit' if text in tables['name'] else 'miss')
+        parser.interner.network = self.wrap(
+            'interner.network', parser.interner.network,
+            lambda address, netmask=None: 'hit' if (address if netmask is None else (address, netmask))
+            in tables['network'] else 'miss')
+        parser.interner.service = self.wrap(
+            'interner.service', parser.interner.service,
+            lambda op, val: 'hit' if (op, val) in tables['service'] else 'miss')
+
+    def wrap(self, stage, func, classify=None):
+        """``func`` wrapped to count its calls and time, and its branches if ``classify`` is given."""
+        times, calls, branches = self.times, self.calls, self.branches
+        perf_counter = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            calls[stage] += 1
+            if classify is not None:
+                branches[stage, classify(*args, **kwargs)] += 1
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                times[stage] += perf_counter() - start
+        return wrapper
+
+    def timed_iter(self, stage, iterable):
+        """Yield from ``iterable``, counting items and the time spent producing them as ``stage``."""
+        iterator = iter(iterable)
+        perf_counter = time.perf_counter
+        while True:
+            start = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.times[stage] += perf_counter() - start
+                return
+            self.times[stage] += perf_counter() - start
+            self.calls[stage] += 1
+            yield item
+
+    def update(self, other):
+        """Merge the counts and times of another Profile (e.g. from a worker process) into this one."""
+        self.times.update(other.times)
+        self.calls.update(other.calls)
+        self.branches.update(other.branches)
+
+    def as_dict(self):
+        return {
+            'stages': {stage: {'calls': self.calls[stage], 'seconds': self.times[stage]} for stage in self.calls},
+            'branches': {'{} {}'.format(*key): count for key, count in sorted(self.branches.items(), key=str)},
+        }
+
+    def report(self):
+        """The profile as a plain-text table."""
+        lines = ['{:<22} {:>10} {:>10} {:>10}'.format('stage', 'calls', 'seconds', 'us/call')]
+        for stage, seconds in self.times.most_common():
+            calls = self.calls[stage]
+            lines.append('{:<22} {:>10} {:>10.3f} {:>10.2f}'.format(
+                stage, calls, seconds, seconds / calls * 1e6 if calls else 0.0))
+        lines.append('(times are inclusive of nested stages)')
+        lines.append('{:<36} {:>10}'.format('branch', 'count'))
+        for (stage, branch), count in sorted(self.branches.items(), key=lambda item: (item[0][0], -item[1])):
+            lines.append('{:<36} {:>10}'.format('{} {}'.format(stage, branch), count))
+        return '\n'.join(lines)
+
+
+class parsermethod():
+    """
+    Method decorator for Parser.
+
+    Called on an instance it behaves like a normal method.  Called on the class
+    itself (``Parser.parse_ace(...)``) it binds to a fresh Parser, so callers
+    that never construct one keep working, just without shared per-instance state.
+    """
+
+    def __init__(self, func):
+        self.__func__ = func
+        functools.update_wrapper(self, func)
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return types.MethodType(self.__func__, owner())
+        bound = types.MethodType(self.__func__, instance)
+        # cache on the instance; the parse methods call each other constantly and
+        # later lookups then find the bound method without going through here
+        instance.__dict__[self.__name__] = bound
+        return bound
+
+
+class Parser():
+    """
+    :param lenient: instead of raising ValueError on the first CLI group that
+        fails to parse, record it in ``self.errors`` as a GroupError and carry on
+    :param profile: a Profile to record stage timings and branch counts into
+    """
+    # looked up through the instance so a Profile can count them
+    _is_ip_address = staticmethod(is_ip_address)
+    _is_ip_network = staticmethod(is_ip_network)
+
+    def __init__(self, lenient=False, profile=None):
+        self.objects = {}
+        self.object_groups = {}
+        self.interner = Interner()
+        self.lenient = lenient
+        self.errors = []
+        self.profile = profile
+        if profile is not None:
+            profile.instrument(self)
+
+    @parsermethod
+    def parse_ace(self, ace_list, line=None, offset=None):
+        """
+        Parse one access-list line.
+
+        The ACE type (``remark``, ``standard``, ``extended``, ...) picks its handler from
+        ACE_HANDLERS; types without one are not parsed and give None.
+
+        :param ace_list: the line's tokens
+        :param line: line number, recorded on the ACE
+        :param offset: byte offset, recorded on the ACE
+        :return: ACE, or None
+        """
+        acl_name, ace_type = ace_list[1:3]
+        handler = ACE_HANDLERS.get(ace_type)
+        if handler is None:
             return None
-        elif t_type in ('port-object', 'service-object', 'icmp-object',
-                        'group-object', 'protocol-object'):
-            r_val['target'] = 'Not Implemented'
+        return handler(self, ace_list, self.interner.name(acl_name), ace_type, line, offset)
+
+    def _parse_remark(self, ace_list, acl_name, ace_type, line, offset):
+        return ACE(text=' '.join(ace_list), acl=acl_name, type='remark', line=line, offset=offset)
+
+    def _parse_standard(self, ace_list, acl_name, ace_type, line, offset):
+        # access-list NAME standard {permit|deny} {any4|host ADDR|ADDR MASK}; matches destinations only
+        tokens = TokenStream(ace_list, 3)
+        ace_action = self.interner.name(tokens.pop())
+        dst, _ = self.parse_target(tokens)
+        ace_log, ace_time_range, ace_active = self._parse_options(tokens.rest())
+        return ACE(text=' '.join(ace_list), acl=acl_name, acl_type=ace_type, action=ace_action,
+                   dst=dst, log=ace_log, time_range=ace_time_range, active=ace_active,
+                   line=line, offset=offset)
+
+    def _parse_extended(self, ace_list, acl_name, ace_type, line, offset):
+        intern_name = self.interner.name
+        ace_action, ace_proto = map(intern_name, ace_list[3:5])
+        targets = self.parse_targets(TokenStream(ace_list, 4))
+        ace_log, ace_time_range, ace_active = self._parse_options(targets['remaining_list'])
+        return ACE(text=' '.join(ace_list),
+                   acl=acl_name,
+                   acl_type=ace_type,
+                   action=ace_action,
+                   protocol=ace_proto,
+                   src=targets['src'],
+                   dst=targets['dst'],
+                   service=targets['service'],
+                   user=targets['user'],
+                   log=ace_log,
+                   time_range=ace_time_range,
+                   active=ace_active,
+                   line=line,
+                   offset=offset)
+
+    def _parse_ethertype(self, ace_list, acl_name, ace_type, line, offset):
+        # access-list NAME ethertype {permit|deny} {any|bpdu|dsap HEX|ipx|isis|mpls-*|HEX}
+        tokens = TokenStream(ace_list, 3)
+        ace_action = self.interner.name(tokens.pop())
+        ethertype = tokens.pop()
+        if ethertype == 'dsap':
+            ethertype = '{} {}'.format(ethertype, tokens.pop())
+        ace_log, ace_time_range, ace_active = self._parse_options(tokens.rest())
+        return ACE(text=' '.join(ace_list), acl=acl_name, acl_type=ace_type, action=ace_action,
+                   protocol=self.interner.name(ethertype), log=ace_log, time_range=ace_time_range,
+                   active=ace_active,
+                   line=line, offset=offset)
+
+    def _parse_webtype(self, ace_list, acl_name, ace_type, line, offset):
+        # access-list NAME webtype {permit|deny} url URL ...
+        # access-list NAME webtype {permit|deny} tcp DEST [OPERATOR PORT] ...
+        tokens = TokenStream(ace_list, 3)
+        ace_action = self.interner.name(tokens.pop())
+        ace_proto = self.interner.name(tokens.pop())
+        service = None
+        if ace_proto == 'url':
+            dst = Target(type='url', target=tokens.pop())
         else:
-            raise ValueError('Invalid object target type: {}'.format(t_type))
-        return r_val
+            dst, _ = self.parse_target(tokens)
+            if tokens.peek() in SERVICE_KEYWORDS:
+                service, _ = self.parse_target(tokens)
+                if service.type == 'service':
+                    service = Target(type=ace_proto, target=service.target)
+        ace_log, ace_time_range, ace_active = self._parse_options(tokens.rest())
+        return ACE(text=' '.join(ace_list), acl=acl_name, acl_type=ace_type, action=ace_action,
+                   protocol=ace_proto, dst=dst, service=service, log=ace_log,
+                   time_range=ace_time_range, active=ace_active,
+                   line=line, offset=offset)
+
+    def _parse_options(self, options):
+        """
+        Log setting, time-range and active state from the tokens after an ACE's targets.
+
+        Handles ``log [LEVEL] [interval SECS]``, ``log disable``, ``time-range NAME``
+        and ``inactive`` in one pass; unknown tokens are skipped.
+
+        :return: tuple of the log string, the time-range name (or None) and the active flag
+        """
+        ace_log = ''
+        ace_time_range = None
+        ace_active = True
+
+        index, count = 0, len(options)
+        while index < count:
+            item = options[index]
+            index += 1
+            if item == 'log':
+                words = ['log']
+                if index < count and options[index] in LOG_LEVEL_KEYWORDS:
+                    words.append(options[index])
+                    index += 1
+                if index + 1 < count and options[index] == 'interval':
+                    words.extend(options[index:index + 2])
+                    index += 2
+                ace_log = ' '.join(words)
+            elif item == 'time-range' and index < count:
+                ace_time_range = self.interner.name(options[index])
+                index += 1
+            elif item == 'inactive':
+                ace_active = False
+        return ace_log, ace_time_range, ace_active
+
+    @parsermethod
+    def parse_targets(self, targets_list):
+        tokens = token_stream(targets_list)
+
+        s_type = tokens.peek()
+        if s_type is None:
+            raise ValueError('invalid target_list "{}"'.format(' '.join(tokens.tokens)))
+        # a service object or object-group takes the protocol's place ahead of the addresses
+        svc_first = 'object' in s_type
+        if svc_first:
+            svc, _ = self.parse_target(tokens)
+        else:
+            tokens.pos += 1
+
+        user = None
+        if tokens.peek() in USER_KEYWORDS:
+            user, _ = self.parse_target(tokens)
+
+        src, _ = self.parse_target(tokens)
+        dst, _ = self.parse_target(tokens)
+        if not svc_first:
+            word = tokens.peek()
+            if word in SERVICE_KEYWORDS:
+                svc, _ = self.parse_target(tokens)
+            elif s_type in ICMP_PROTOCOLS and word is not None and word not in OPTION_KEYWORDS:
+                # an icmp type and optional code; like icmp-objects, these specs get no PortSet
+                words = [tokens.pop()]
+                if tokens.peek() is not None and tokens.peek().isdigit():
+                    words.append(tokens.pop())
+                svc = Target(type=s_type, target=ServiceSpec(op='eq', val=' '.join(words)))
+            else:
+                svc = Target(type='protocol', target=s_type)
+
+        if svc.type == 'service':
+            svc = Target(type=s_type, target=svc.target)
+
+        return {'src': src, 'dst': dst, 'service': svc, 'user': user, 'remaining_list': tokens.rest()}
 
-    @staticmethod
-    def parse_object(object_lines):
+    @parsermethod
+    def parse_target(self, target_list):
+        """
+        Parse one target off the front of ``target_list``.
+
+        The first token picks its handler from TARGET_HANDLERS; anything else
+        is tried as an address and mask, or as an address/prefix.
+
+        :param target_list: list of tokens or a TokenStream; a stream is advanced
+            past the target, and left where it was if no target could be parsed
+        :return: tuple of the parsed Target and the TokenStream
+        """
+        tokens = token_stream(target_list)
+        start = tokens.pos
+        try:
+            t_type = tokens.pop()
+            handler = TARGET_HANDLERS.get(t_type)
+            if handler is None:
+                handler = Parser._target_address
+            r_val = handler(self, t_type, tokens)
+        except ValueError:
+            tokens.pos = start
+            raise
+
+        return r_val, tokens
+
+    def _target_any(self, t_type, tokens):
+        return Target(type=t_type, target=t_type)
+
+    def _target_host(self, t_type, tokens):
+        return Target(type='network', target=self.interner.network(tokens.pop()))
+
+    def _target_name(self, t_type, tokens):
+        return Target(type=t_type, target=self.interner.name(tokens.pop()))
+
+    def _target_port(self, t_type, tokens):
+        return Target(type='service', target=self.interner.service(t_type, tokens.pop()))
+
+    def _target_range(self, t_type, tokens):
+        t_range = ' '.join((tokens.pop(), tokens.pop()))
+        return Target(type='service', target=self.interner.service(t_type, t_range))
+
+    def _target_address(self, t_type, tokens):
+        if self._is_ip_address(t_type):  # it's an address and mask combination
+            return Target(type='network', target=self.interner.network(t_type, tokens.pop()))
+        elif self._is_ip_network(t_type):  # an address/prefix, as IPv6 ACEs give them
+            return Target(type='network', target=self.interner.network(t_type))
+        raise ValueError('Invalid target list: {}'.format(tokens.tokens[tokens.pos - 1:]))
+
+    @parsermethod
+    def parse_object_target(self, target_list):
+        """
+        Parse one line of an object or object-group body.
+
+        The first token picks its handler from OBJECT_TARGET_HANDLERS, so only
+        lines that start with no keyword at all reach the IP checks.
+
+        :param target_list: the line's tokens, or a TokenStream
+        :return: Target, or None for lines that carry no target (description)
+        """
+        tokens = token_stream(target_list)
+        t_type = tokens.pop()
+        handler = OBJECT_TARGET_HANDLERS.get(t_type)
+        if handler is None:
+            handler = Parser._object_target_address
+        return handler(self, t_type, tokens)
+
+    def _object_target_name(self, t_type, tokens):
+        # group-object names an object-group, the rest name themselves
+        return Target(type='object-group' if t_type == 'group-object' else t_type,
+                      target=self.interner.name(tokens.pop()))
+
+    def _object_target_range(self, t_type, tokens):
+        return Target(type=t_type, target=tuple(tokens.rest()))
+
+    def _object_target_nested(self, t_type, tokens):
+        # 'subnet ...' and 'network-object ...' wrap an ordinary target; dispatch it here rather
+        # than re-entering parse_object_target, which is most of the cost of these short lines
+        t_type = tokens.pop()
+        handler = OBJECT_TARGET_HANDLERS.get(t_type)
+        if handler is None:
+            handler = Parser._object_target_address
+        return handler(self, t_type, tokens)
+
+    def _object_target_port(self, t_type, tokens):
+        t_op = tokens.pop()
+        return Target(type='service', target=self.interner.service(t_op, ' '.join(tokens.rest())))
+
+    def _object_target_service(self, t_type, tokens):
+        s_type = tokens.pop()
+        if s_type == 'object':
+            return Target(type='object', target=self.interner.name(tokens.pop()))
+        if s_type in ICMP_PROTOCOLS:
+            t_target = ServiceSpec(op='eq', val=tokens.peek() or 'any')
+        else:
+            tokens.pos += 1  # source / destination
+            t_op = tokens.pop()
+            t_target = self.interner.service(t_op, ' '.join(tokens.rest()))
+        return Target(type='service', target=t_target, protocol=s_type)
+
+    def _object_target_icmp(self, t_type, tokens):
+        # icmp types are not ports, so these specs get no PortSet
+        return Target(type='service', target=ServiceSpec(op='eq', val=tokens.pop()), protocol='icmp')
+
+    def _object_target_protocol(self, t_type, tokens):
+        return Target(type='protocol', target=tokens.pop())
+
+    def _object_target_none(self, t_type, tokens):
+        return None
+
+    def _object_target_address(self, t_type, tokens):
+        if self._is_ip_address(t_type):
+            return Target(type='network', target=self.interner.network(t_type, tokens.pop()))
+        elif self._is_ip_network(t_type):
+            return Target(type='network', target=self.interner.network(t_type))
+        raise ValueError('Invalid object target type: {}'.format(t_type))
+
+    @parsermethod
+    def parse_object(self, object_lines, line=None, offset=None):
         r_val = {}
         try:
-            _, o_type, o_name = object_lines[0].split()
+            o_kind, o_type, o_name = object_lines[0].split()
         except ValueError:
-            _, o_type, o_name, o_protocol = object_lines[0].split()
+            o_kind, o_type, o_name, o_protocol = object_lines[0].split()
             r_val['protocol'] = o_protocol
-        r_val['object'] = o_name
-        r_val['target'] = [Parser.parse_object_target(line.split())
+        r_val['object'] = self.interner.name(o_name)
+        r_val['kind'] = o_kind
+        r_val['type'] = o_type
+        r_val['target'] = [self.parse_object_target(line.split())
                            for line in object_lines[1:]]
         r_val['target'] = [t for t in r_val['target'] if t is not None]
+        if line is not None:
+            r_val['line'] = line
+            r_val['offset'] = offset
         return r_val
 
-    @staticmethod
-    def parse_ruleset(ruleset_text):
-        ruleset_lines = [line for line in ruleset_text.splitlines() if line]
-        ruleset_grps = cli_group(ruleset_lines)
-        for grp in ruleset_grps:
-            if grp[0].startswith('object'):
-                yield Parser.parse_object(grp)
-            elif len(grp) > 1:
-                raise ValueError(
-                    'invalid CLI Group in ruleset_text: {}'.format('\n'.join(grp)))
-            elif grp[0].startswith('access-list'):
-                yield Parser.parse_ace(grp[0].split())
-
-
-def get_ruleset():
-    with open('testruleset.cfg') as fil:
+    @parsermethod
+    def parse_group(self, grp, line=None, offset=None):
+        """
+        Parse a single CLI group.
+
+        :param grp: list of lines as produced by cli_group
+        :param line: line number the group starts on, recorded on the result
+        :param offset: byte offset the group starts at, recorded on the result
+        :return: parsed object or ACE, or None if the group is not one we parse
+        """
+        if grp[0].startswith('object'):
+            return self.parse_object(grp, line, offset)
+        elif len(grp) > 1 or grp[0].startswith(' '):
+            raise ValueError(
+                'invalid CLI Group in ruleset_text: {}'.format('\n'.join(grp)))
+        elif grp[0].startswith('access-list'):
+            return self.parse_ace(grp[0].split(), line, offset)
+        return None
+
+    @parsermethod
+    def parse_ruleset(self, ruleset_text, workers=None, chunk_size=10000, encode=None):
+        """
+        Parse a whole ruleset.
+
+        :param ruleset_text: config text
+        :param workers: if greater than 1, parse chunks of the config in a pool of this many processes;
+            each worker interns values in its own Parser, not in this one
+        :param chunk_size: approximate number of lines handed to each worker at a time
+        :param encode: see parse_lines
+        :return: generator of parsed objects and ACEs, in config order
+        """
+        return self.parse_lines(ruleset_text.splitlines(keepends=True), workers=workers, chunk_size=chunk_size,
+                                encode=encode)
+
+    @parsermethod
+    def parse_file(self, path_or_fileobj, workers=None, chunk_size=10000, encode=None):
+        """
+        Parse a config file incrementally.
+
+        The file is read line by line, so peak memory is bounded by the
+        largest single CLI group rather than by the size of the config.
+
+        :param path_or_fileobj: path to a config file, or an open text file object
+        :param workers: see parse_ruleset
+        :param chunk_size: see parse_ruleset
+        :param encode: see parse_lines
+        :return: generator of parsed objects and ACEs
+        """
+        if hasattr(path_or_fileobj, 'read'):
+            yield from self.parse_lines(path_or_fileobj, workers=workers, chunk_size=chunk_size, encode=encode)
+        else:
+            # newline='' keeps CRLF terminators, so byte offsets match the file
+            with open(path_or_fileobj, newline='') as fil:
+                yield from self.parse_lines(fil, workers=workers, chunk_size=chunk_size, encode=encode)
+
+    @parsermethod
+    def parse_lines(self, lines, workers=None, chunk_size=10000, encode=None):
+        """
+        Parse an iterable of config lines, yielding results as each CLI group completes.
+
+        Every object and ACE records the line number and byte offset it
+        starts at (see located_cli_group).
+
+        :param lines: iterable of lines; trailing line terminators are ignored
+        :param workers: see parse_ruleset
+        :param chunk_size: see parse_ruleset
+        :param encode: optional module-level function turning a list of parsed
+            items into output (e.g. batch.json_lines).  Given one, the generator
+            yields its output for each chunk instead of the items, and with
+            workers the encoding is done in the workers too, so no items are
+            rebuilt in this process; objects are then not indexed in self.objects
+        :return: generator of parsed objects and ACEs
+        """
+        if encode is not None:
+            yield from self._encode_chunks(lines, workers, chunk_size, encode)
+            return
+        if workers is not None and workers > 1:
+            results = self._parse_parallel(lines, workers, chunk_size)
+        else:
+            results = self._parse_groups(lines)
+
+        for parsed in results:
+            if parsed is None:
+                continue
+            if isinstance(parsed, dict):
+                self.add_object(parsed)
+            yield parsed
+
+    def add_object(self, parsed_object):
+        """Index a parsed object or object-group by name in self.objects / self.object_groups."""
+        if parsed_object['kind'] == 'object-group':
+            self.object_groups[parsed_object['object']] = parsed_object
+        else:
+            self.objects[parsed_object['object']] = parsed_object
+
+    def _parse_groups(self, lines, first_line=1, first_offset=0):
+        groups = located_cli_group(lines, first_line, first_offset)
+        if self.profile is not None:
+            groups = self.profile.timed_iter('cli_group', groups)
+        for line_number, offset, grp in groups:
+            try:
+                yield self.parse_group(grp, line_number, offset)
+            except ValueError as err:
+                if not self.lenient:
+                    raise
+                self._add_error(grp, line_number, offset, err)
+
+    def _add_error(self, grp, line, offset, err):
+        """Record a group that failed to parse in lenient mode."""
+        self.errors.append(GroupError(line=line, offset=offset, group='\n'.join(grp), reason=str(err)))
+
+    def _encode_chunks(self, lines, workers, chunk_size, encode):
+        if workers is not None and workers > 1:
+            yield from self._parse_parallel(lines, workers, chunk_size, encode)
+            return
+        first_line = 1
+        first_offset = 0
+        for chunk in chunk_lines(lines, chunk_size):
+            yield encode([parsed for parsed in self._parse_groups(chunk, first_line, first_offset)
+                          if parsed is not None])
+            first_line += len(chunk)
+            first_offset += sum(map(line_size, chunk))
+
+    def _parse_parallel(self, lines, workers, chunk_size, encode=None):
+        # keep a bounded window of chunks in flight so memory stays proportional to
+        # workers * chunk_size, and yield results strictly in submission order
+        # imported here: multiprocessing is a large share of start-up time, and most runs are serial
+        from concurrent.futures import ProcessPoolExecutor
+
+        def collect(future):
+            results, errors, profile = future.result()
+            self.errors.extend(errors)
+            if profile is not None:
+                self.profile.update(profile)
+            return [results] if encode is not None else pickle_loads(results)
+
+        pending = collections.deque()
+        first_line = 1
+        first_offset = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk in chunk_lines(lines, chunk_size):
+                pending.append(executor.submit(_parse_chunk, chunk, self.lenient, first_line, first_offset,
+                                               self.profile is not None, encode))
+                first_line += len(chunk)
+                first_offset += sum(map(line_size, chunk))
+                if len(pending) >= workers * 2:
+                    yield from collect(pending.popleft())
+            while pending:
+                yield from collect(pending.popleft())
+
+
+# keyword -> handler tables for the grammar; each token dispatches with one dict lookup,
+# so adding a keyword does not slow down the others
+ACE_HANDLERS = {
+    'remark': Parser._parse_remark,
+    'standard': Parser._parse_standard,
+    'extended': Parser._parse_extended,
+    'ethertype': Parser._parse_ethertype,
+    'webtype': Parser._parse_webtype,
+}
+
+USER_KEYWORDS = frozenset(('user', 'user-group', 'object-group-user'))
+
+TARGET_HANDLERS = {
+    'any': Parser._target_any,
+    'any4': Parser._target_any,
+    'any6': Parser._target_any,
+    'host': Parser._target_host,
+    'object': Parser._target_name,
+    'object-group': Parser._target_name,
+    'eq': Parser._target_port,
+    'neq': Parser._target_port,
+    'lt': Parser._target_port,
+    'gt': Parser._target_port,
+    'range': Parser._target_range,
+}
+TARGET_HANDLERS.update(dict.fromkeys(USER_KEYWORDS, Parser._target_name))
+
+OBJECT_TARGET_HANDLERS = {
+    'object': Parser._object_target_name,
+    'group-object': Parser._object_target_name,
+    'user': Parser._object_target_name,
+    'user-group': Parser._object_target_name,
+    'range': Parser._object_target_range,
+    'host': Parser._target_host,
+    'subnet': Parser._object_target_nested,
+    'network-object': Parser._object_target_nested,
+    'port-object': Parser._object_target_port,
+    'service': Parser._object_target_service,
+    'service-object': Parser._object_target_service,
+    'icmp-object': Parser._object_target_icmp,
+    'protocol-object': Parser._object_target_protocol,
+    'description': Parser._object_target_none,
+}
+
+TARGET_KEYWORDS = frozenset(TARGET_HANDLERS)
+# keywords that start a service target after an ACE's addresses; anything else ends the targets
+SERVICE_KEYWORDS = frozenset(('eq', 'neq', 'lt', 'gt', 'range', 'object', 'object-group'))
+# keywords that start an ACE's options; before them, an icmp ACE may give an icmp type
+OPTION_KEYWORDS = frozenset(('log', 'time-range', 'inactive'))
+OBJECT_TARGET_KEYWORDS = frozenset(OBJECT_TARGET_HANDLERS)
+
+
+def get_ruleset(path='testruleset.cfg'):
+    with open(path) as fil:
         ruleset = fil.read()
     return ruleset
 
 
-def run_ruleset():
+def run_ruleset(path='testruleset.cfg', output_path='rules_out.txt'):
     import json
-    rs = get_ruleset()
+    rs = get_ruleset(path)
     parsed = Parser.parse_ruleset(rs)
-    with open('rules_out.txt', 'w') as fil:
-        fil.write(json.dumps(list(parsed), default=lambda o: str(o), indent=4 ))
+    with open(output_path, 'w') as fil:
+        fil.write(json.dumps(list(parsed), default=json_default, indent=4 ))
 
 
 def main():
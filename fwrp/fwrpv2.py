@@ -6,6 +6,9 @@ import ipaddress
 
 import attr
 
+# the parser's records live in records.py (which does not need attrs); re-exported here for existing imports
+from .records import ACE, Delta, Finding, RecordMapping, ResolvedACE, Service, ServiceSpec, Target, record  # noqa: F401
+
 
 @attr.s
 class ACLObject(object):
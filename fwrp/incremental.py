@@ -0,0 +1,171 @@
+"""
+incremental.py
+re-parse only the CLI groups that changed since the previous parse
+"""
+import collections
+import difflib
+import hashlib
+
+from .firewallruleparser import Parser, located_cli_group
+from .records import ACE, Delta, replace
+
+
+def group_digest(grp):
+    return hashlib.blake2b('\n'.join(grp).encode('utf-8'), digest_size=16).digest()
+
+
+def _unlocated(parsed):
+    return {key: value for key, value in parsed.items() if key not in ('line', 'offset')}
+
+
+def aligned_groups(old_groups, new_groups):
+    """
+    Indexes of the groups that are unchanged between two digest sequences.
+
+    Groups are aligned in order (a longest common subsequence, as difflib finds
+    it), so a group that moved relative to the others is not unchanged: under
+    first-match semantics moving an ACE changes the ACL.
+
+    :return: tuple of the set of unchanged indexes into ``old_groups`` and the set into ``new_groups``
+    """
+    # trim the common head and tail first; edits are usually a few lines in a long config
+    head = 0
+    limit = min(len(old_groups), len(new_groups))
+    while head < limit and old_groups[head] == new_groups[head]:
+        head += 1
+    tail = 0
+    while tail < limit - head and old_groups[-1 - tail] == new_groups[-1 - tail]:
+        tail += 1
+    old_kept = set(range(head)) | set(range(len(old_groups) - tail, len(old_groups)))
+    new_kept = set(range(head)) | set(range(len(new_groups) - tail, len(new_groups)))
+    matcher = difflib.SequenceMatcher(None, old_groups[head:len(old_groups) - tail],
+                                      new_groups[head:len(new_groups) - tail], autojunk=False)
+    for old_start, new_start, size in matcher.get_matching_blocks():
+        old_kept.update(range(head + old_start, head + old_start + size))
+        new_kept.update(range(head + new_start, head + new_start + size))
+    return old_kept, new_kept
+
+
+def relocate(parsed, line, offset):
+    """``parsed`` (an ACE or object) with its source location set to ``line`` and ``offset``."""
+    if parsed is None or (parsed.get('line'), parsed.get('offset')) == (line, offset):
+        return parsed
+    if isinstance(parsed, ACE):
+        return replace(parsed, line=line, offset=offset)
+    return dict(parsed, line=line, offset=offset)
+
+
+class IncrementalParser():
+    """
+    Parse successive versions of one config, re-parsing only changed CLI groups.
+
+    The previous version is kept as its sequence of group digests plus the
+    parse result for each digest, so each update costs one hash per group and
+    one parse per new or edited group.  Results are cached by content alone;
+    a group that moved (lines inserted or removed above it) is given its new
+    line number and offset without being re-parsed.
+
+    With a lenient parser, groups that fail to parse are collected in
+    ``parser.errors`` (reset on each update) instead of raising; they are not
+    cached, so they are reported again for as long as they stay in the config.
+
+    :param parser: Parser used for changed groups (default: a new one)
+    """
+
+    def __init__(self, parser=None):
+        self.parser = parser if parser is not None else Parser()
+        self.groups = []
+        self.results = {}
+        self.located = []
+        self.reparsed = 0
+
+    def parsed(self):
+        """Current parse results in config order, as Parser.parse_ruleset would yield them."""
+        return [parsed for parsed in self.located if parsed is not None]
+
+    def update_text(self, ruleset_text):
+        return self.update(ruleset_text.splitlines(keepends=True))
+
+    def update(self, lines):
+        """
+        Parse a new version of the config.
+
+        :param lines: iterable of config lines
+        :return: Delta against the previous version (everything is added on the first call)
+        """
+        new_groups = []
+        new_results = {}
+        new_located = []
+        self.reparsed = 0
+        self.parser.errors.clear()
+        for line_number, offset, grp in located_cli_group(lines):
+            digest = group_digest(grp)
+            if digest not in new_results:
+                if digest in self.results:
+                    new_results[digest] = self.results[digest]
+                else:
+                    self.reparsed += 1
+                    try:
+                        new_results[digest] = self.parser.parse_group(grp, line_number, offset)
+                    except ValueError as err:
+                        if not self.parser.lenient:
+                            raise
+                        self.parser._add_error(grp, line_number, offset, err)
+                        new_groups.append(digest)
+                        new_located.append(None)
+                        continue
+            new_groups.append(digest)
+            new_located.append(relocate(new_results[digest], line_number, offset))
+
+        delta = self._diff(self.groups, self.located, new_groups, new_located)
+        self.groups, self.results, self.located = new_groups, new_results, new_located
+        self.parser.objects.clear()
+        self.parser.object_groups.clear()
+        for parsed in self.parsed():
+            if isinstance(parsed, dict):
+                self.parser.add_object(parsed)
+        return delta
+
+    @staticmethod
+    def _changed(located, unchanged):
+        """
+        Split groups whose index is not in ``unchanged`` into objects by name and
+        ACEs by (anchor, acl), where the anchor counts the unchanged groups before them.
+        """
+        anchor = 0
+        objects = {}
+        aces = collections.defaultdict(list)
+        for index, parsed in enumerate(located):
+            if index in unchanged:
+                anchor += 1
+                continue
+            if parsed is None:
+                continue
+            if isinstance(parsed, dict):
+                objects[parsed['object']] = parsed
+            else:
+                aces[anchor, parsed['acl']].append(parsed)
+        return objects, aces
+
+    @classmethod
+    def _diff(cls, old_groups, old_located, new_groups, new_located):
+        old_unchanged, new_unchanged = aligned_groups(old_groups, new_groups)
+        old_objects, old_aces = cls._changed(old_located, old_unchanged)
+        new_objects, new_aces = cls._changed(new_located, new_unchanged)
+
+        added = [obj for name, obj in new_objects.items() if name not in old_objects]
+        removed = [obj for name, obj in old_objects.items() if name not in new_objects]
+        # objects are looked up by name, so one that only moved has not changed
+        modified = [(obj, new_objects[name]) for name, obj in old_objects.items()
+                    if name in new_objects and _unlocated(obj) != _unlocated(new_objects[name])]
+
+        # an ACE replaced in place (same ACL, between the same unchanged groups) is a modification;
+        # one that moved is removed where it was and added where it now is
+        for key in sorted(old_aces.keys() | new_aces.keys()):
+            old_list, new_list = old_aces.get(key, []), new_aces.get(key, [])
+            paired = min(len(old_list), len(new_list))
+            modified.extend(zip(old_list[:paired], new_list[:paired]))
+            removed.extend(old_list[paired:])
+            added.extend(new_list[paired:])
+
+        return Delta(added=tuple(added), removed=tuple(removed), modified=tuple(modified))
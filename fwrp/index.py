@@ -0,0 +1,167 @@
+"""
+index.py
+prefix indexes answering "which rules match this address or network"
+"""
+import bisect
+import ipaddress
+
+
+def _as_ip(value):
+    """Turn a string into an ip_address, or an ip_network if it has a prefix."""
+    if isinstance(value, str):
+        if '/' in value:
+            return ipaddress.ip_network(value, False)
+        return ipaddress.ip_address(value)
+    return value
+
+
+class PrefixIndex():
+    """
+    Map IP prefixes to the items stored under them.
+
+    Prefixes are bucketed by IP version and prefix length, keyed by the network
+    address as an integer, so an address lookup is one dict probe per prefix
+    length in use (at most 33 for IPv4, 129 for IPv6), the same walk a radix
+    trie makes.  Finding prefixes inside a query prefix bisects a sorted copy
+    of each bucket's keys, giving O(W log n + k) for both kinds of query.
+    """
+
+    def __init__(self):
+        self._buckets = {4: {}, 6: {}}
+        self._sorted_keys = {}
+
+    def __len__(self):
+        return sum(len(items)
+                   for by_len in self._buckets.values()
+                   for by_net in by_len.values()
+                   for items in by_net.values())
+
+    def add(self, network, item):
+        network = _as_ip(network)
+        by_net = self._buckets[network.version].setdefault(network.prefixlen, {})
+        key = int(network.network_address)
+        if key not in by_net:
+            by_net[key] = []
+            # keep an existing sorted key list current rather than re-sorting on the
+            # next query, so interleaved adds and queries stay cheap
+            keys = self._sorted_keys.get((network.version, network.prefixlen))
+            if keys is not None:
+                bisect.insort(keys, key)
+        by_net[key].append(item)
+
+    def _keys(self, version, prefix_len):
+        try:
+            return self._sorted_keys[version, prefix_len]
+        except KeyError:
+            keys = self._sorted_keys[version, prefix_len] = sorted(self._buckets[version][prefix_len])
+            return keys
+
+    def lookup_address(self, address):
+        """Items stored under any prefix containing ``address``."""
+        address = _as_ip(address)
+        value = int(address)
+        bits = address.max_prefixlen
+        r_val = set()
+        for prefix_len, by_net in self._buckets[address.version].items():
+            shift = bits - prefix_len
+            items = by_net.get(value >> shift << shift)
+            if items:
+                r_val.update(items)
+        return r_val
+
+    def covering(self, network):
+        """Items stored under ``network`` or any prefix containing it."""
+        network = _as_ip(network)
+        value = int(network.network_address)
+        bits = network.max_prefixlen
+        r_val = set()
+        for prefix_len, by_net in self._buckets[network.version].items():
+            if prefix_len <= network.prefixlen:
+                shift = bits - prefix_len
+                items = by_net.get(value >> shift << shift)
+                if items:
+                    r_val.update(items)
+        return r_val
+
+    def within(self, network):
+        """Items stored under ``network`` or any prefix inside it."""
+        network = _as_ip(network)
+        start = int(network.network_address)
+        end = int(network.broadcast_address)
+        r_val = set()
+        for prefix_len, by_net in self._buckets[network.version].items():
+            if prefix_len >= network.prefixlen:
+                keys = self._keys(network.version, prefix_len)
+                for key in keys[bisect.bisect_left(keys, start):bisect.bisect_right(keys, end)]:
+                    r_val.update(by_net[key])
+        return r_val
+
+    def overlapping(self, network):
+        """Items stored under any prefix that shares at least one address with ``network``."""
+        return self.covering(network) | self.within(network)
+
+    def lookup(self, value):
+        """Point lookup for an address, overlap lookup for a network."""
+        value = _as_ip(value)
+        if isinstance(value, ipaddress._BaseNetwork):
+            return self.overlapping(value)
+        return self.lookup_address(value)
+
+
+class RuleIndex():
+    """
+    Index of resolved ACEs by source and destination prefix.
+
+    Queries return matching rules in their original order, so the first
+    result for an address pair is the rule a firewall would hit first
+    (ignoring protocol and ports).
+    """
+
+    def __init__(self, resolved_aces=()):
+        self.rules = []
+        self.src = PrefixIndex()
+        self.dst = PrefixIndex()
+        for resolved in resolved_aces:
+            self.add(resolved)
+
+    @classmethod
+    def from_parsed(cls, parsed, resolver):
+        """
+        Build an index from parser output, resolving each ACE with ``resolver``.
+
+        Remarks and objects are skipped.
+        """
+        r_val = cls()
+        for item in parsed:
+            if isinstance(item, dict):
+                continue
+            resolved = resolver.resolve(item)
+            if resolved is not None:
+                r_val.add(resolved)
+        return r_val
+
+    def add(self, resolved):
+        rule_id = len(self.rules)
+        self.rules.append(resolved)
+        for network in resolved.src:
+            self.src.add(network, rule_id)
+        for network in resolved.dst:
+            self.dst.add(network, rule_id)
+
+    def query(self, src=None, dst=None):
+        """
+        Rules matching a source and/or destination.
+
+        :param src: address or network (object or string); None matches any source
+        :param dst: address or network (object or string); None matches any destination
+        :return: list of ResolvedACEs in rule order
+        """
+        rule_ids = None
+        if src is not None:
+            rule_ids = self.src.lookup(src)
+        if dst is not None:
+            dst_ids = self.dst.lookup(dst)
+            rule_ids = dst_ids if rule_ids is None else rule_ids & dst_ids
+        if rule_ids is None:
+            return list(self.rules)
+        return [self.rules[rule_id] for rule_id in sorted(rule_ids)]
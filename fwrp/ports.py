@@ -0,0 +1,316 @@
+"""
+ports.py
+named ports and icmp types, conversion of port specifications to integer ranges, and port sets
+"""
+from bisect import bisect_right
+
+MAX_PORT = 65535
+_INFINITY = float('inf')
+
+# port names the ASA accepts in place of numbers (tcp and udp share one namespace)
+NAMED_PORTS = {
+    'aol': 5190,
+    'bgp': 179,
+    'biff': 512,
+    'bootpc': 68,
+    'bootps': 67,
+    'chargen': 19,
+    'cifs': 3020,
+    'citrix-ica': 1494,
+    'cmd': 514,
+    'ctiqbe': 2748,
+    'daytime': 13,
+    'diameter': 3868,
+    'discard': 9,
+    'dnsix': 195,
+    'domain': 53,
+    'echo': 7,
+    'exec': 512,
+    'finger': 79,
+    'ftp': 21,
+    'ftp-data': 20,
+    'gopher': 70,
+    'h323': 1720,
+    'hostname': 101,
+    'http': 80,
+    'https': 443,
+    'ident': 113,
+    'imap4': 143,
+    'irc': 194,
+    'isakmp': 500,
+    'kerberos': 750,
+    'klogin': 543,
+    'kshell': 544,
+    'ldap': 389,
+    'ldaps': 636,
+    'login': 513,
+    'lotusnotes': 1352,
+    'lpd': 515,
+    'mobile-ip': 434,
+    'nameserver': 42,
+    'netbios-dgm': 138,
+    'netbios-ns': 137,
+    'netbios-ssn': 139,
+    'nfs': 2049,
+    'nntp': 119,
+    'non500-isakmp': 4500,
+    'ntp': 123,
+    'pcanywhere-data': 5631,
+    'pcanywhere-status': 5632,
+    'pim-auto-rp': 496,
+    'pop2': 109,
+    'pop3': 110,
+    'pptp': 1723,
+    'radius': 1645,
+    'radius-acct': 1646,
+    'rip': 520,
+    'rsh': 514,
+    'rtsp': 554,
+    'secureid-udp': 5510,
+    'sip': 5060,
+    'smtp': 25,
+    'snmp': 161,
+    'snmptrap': 162,
+    'sqlnet': 1521,
+    'ssh': 22,
+    'sunrpc': 111,
+    'syslog': 514,
+    'tacacs': 49,
+    'talk': 517,
+    'telnet': 23,
+    'tftp': 69,
+    'time': 37,
+    'uucp': 540,
+    'vxlan': 4789,
+    'who': 513,
+    'whois': 43,
+    'www': 80,
+    'xdmcp': 177,
+}
+
+# icmp types the ASA accepts by name, per protocol
+ICMP_TYPES = {
+    'icmp': {
+        'echo-reply': 0,
+        'unreachable': 3,
+        'source-quench': 4,
+        'redirect': 5,
+        'alternate-address': 6,
+        'echo': 8,
+        'router-advertisement': 9,
+        'router-solicitation': 10,
+        'time-exceeded': 11,
+        'parameter-problem': 12,
+        'timestamp-request': 13,
+        'timestamp-reply': 14,
+        'information-request': 15,
+        'information-reply': 16,
+        'mask-request': 17,
+        'mask-reply': 18,
+        'traceroute': 30,
+        'conversion-error': 31,
+        'mobile-redirect': 32,
+    },
+    'icmp6': {
+        'unreachable': 1,
+        'packet-too-big': 2,
+        'time-exceeded': 3,
+        'parameter-problem': 4,
+        'echo': 128,
+        'echo-reply': 129,
+        'membership-query': 130,
+        'membership-report': 131,
+        'membership-reduction': 132,
+        'router-solicitation': 133,
+        'router-advertisement': 134,
+        'neighbor-solicitation': 135,
+        'neighbor-advertisement': 136,
+        'neighbor-redirect': 137,
+        'router-renumbering': 138,
+    },
+}
+ICMP_PROTOCOLS = frozenset(ICMP_TYPES)
+MAX_ICMP_TYPE = 255
+
+
+def icmp_types(protocol, val):
+    """
+    PortSet of the icmp type numbers named by an icmp ServiceSpec value.
+
+    The sets hold type numbers rather than ports, so icmp rules compare with
+    the same set operations as tcp and udp ones.  Any code after the type is
+    ignored, so a rule for one code of a type is treated as the whole type.
+
+    :param protocol: 'icmp' or 'icmp6'
+    :param val: type number or name, optionally followed by a code, or 'any'
+    :return: PortSet
+    """
+    icmp_type = val.split()[0] if val else 'any'
+    if icmp_type == 'any':
+        return PortSet(((0, MAX_ICMP_TYPE),))
+    if icmp_type.isdigit():
+        number = int(icmp_type)
+        if number > MAX_ICMP_TYPE:
+            raise ValueError('Invalid icmp type "{}"'.format(val))
+    else:
+        try:
+            number = ICMP_TYPES[protocol][icmp_type]
+        except KeyError:
+            raise ValueError('Unknown icmp type "{}"'.format(icmp_type))
+    return PortSet(((number, number),))
+
+
+def port_number(val):
+    """
+    Convert a port number or ASA port name to an integer.
+
+    :param val: e.g. '443' or 'https'
+    :return: port number
+    """
+    if val.isdigit():
+        port = int(val)
+        if port > MAX_PORT:
+            raise ValueError('Invalid port "{}"'.format(val))
+        return port
+    try:
+        return NAMED_PORTS[val]
+    except KeyError:
+        raise ValueError('Unknown port name "{}"'.format(val))
+
+
+def port_ranges(op, val):
+    """
+    Convert an operator and value, as in ServiceSpec, to inclusive port ranges.
+
+    :param op: one of eq, neq, lt, gt, range
+    :param val: port number or name; for range, two of them separated by a space
+    :return: tuple of (low, high) tuples
+    """
+    if op == 'range':
+        low, high = (port_number(port) for port in val.split())
+        return ((low, high),) if low <= high else ()
+    port = port_number(val)
+    if op == 'eq':
+        return ((port, port),)
+    elif op == 'lt':
+        return ((0, port - 1),) if port > 0 else ()
+    elif op == 'gt':
+        return ((port + 1, MAX_PORT),) if port < MAX_PORT else ()
+    elif op == 'neq':
+        return tuple(r for r in ((0, port - 1), (port + 1, MAX_PORT)) if r[0] <= r[1])
+    raise ValueError('Invalid port operator "{}"'.format(op))
+
+
+class PortSet():
+    """
+    Immutable set of ports, held as sorted, disjoint inclusive (low, high) ranges.
+
+    Overlapping and adjacent ranges are merged on construction, so two PortSets
+    holding the same ports are equal however they were built.  Iterating gives
+    the ranges; ``in`` takes a port number (found by bisection) or another
+    PortSet (a subset test).
+
+    :param ranges: iterable of (low, high) tuples, in any order
+    """
+    __slots__ = ('ranges',)
+
+    def __init__(self, ranges=()):
+        merged = []
+        for low, high in sorted(ranges):
+            if low > high:
+                continue
+            if merged and low <= merged[-1][1] + 1:
+                if high > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], high)
+            else:
+                merged.append((low, high))
+        self.ranges = tuple(merged)
+
+    @classmethod
+    def from_spec(cls, op, val):
+        """PortSet for an operator and value, as in ServiceSpec; see port_ranges."""
+        # port_ranges already gives sorted, disjoint ranges, so skip the merge
+        r_val = cls.__new__(cls)
+        r_val.ranges = port_ranges(op, val)
+        return r_val
+
+    def __iter__(self):
+        return iter(self.ranges)
+
+    def __len__(self):
+        return sum(high - low + 1 for low, high in self.ranges)
+
+    def __bool__(self):
+        return bool(self.ranges)
+
+    def __contains__(self, item):
+        if isinstance(item, PortSet):
+            return self.issuperset(item)
+        # (low, high) <= (item, inf) exactly when low <= item, so this finds the last range starting at or below item
+        index = bisect_right(self.ranges, (item, _INFINITY)) - 1
+        return index >= 0 and item <= self.ranges[index][1]
+
+    def __eq__(self, other):
+        if not isinstance(other, PortSet):
+            return NotImplemented
+        return self.ranges == other.ranges
+
+    def __hash__(self):
+        return hash(self.ranges)
+
+    def __reduce__(self):
+        return type(self), (self.ranges,)
+
+    def __repr__(self):
+        return 'PortSet({!r})'.format(list(self.ranges))
+
+    def union(self, other):
+        return PortSet(self.ranges + other.ranges)
+
+    def intersection(self, other):
+        r_val = []
+        mine, theirs = self.ranges, other.ranges
+        i = j = 0
+        while i < len(mine) and j < len(theirs):
+            low = max(mine[i][0], theirs[j][0])
+            high = min(mine[i][1], theirs[j][1])
+            if low <= high:
+                r_val.append((low, high))
+            # drop whichever range ends first; the other may overlap the next one
+            if mine[i][1] < theirs[j][1]:
+                i += 1
+            else:
+                j += 1
+        return PortSet(r_val)
+
+    def issuperset(self, other):
+        """True if every port in ``other`` is also in this set."""
+        ranges = self.ranges
+        for low, high in other.ranges:
+            index = bisect_right(ranges, (low, _INFINITY)) - 1
+            if index < 0 or high > ranges[index][1]:
+                return False
+        return True
+
+    def issubset(self, other):
+        return other.issuperset(self)
+
+    def isdisjoint(self, other):
+        mine, theirs = self.ranges, other.ranges
+        i = j = 0
+        while i < len(mine) and j < len(theirs):
+            if mine[i][0] <= theirs[j][1] and theirs[j][0] <= mine[i][1]:
+                return False
+            if mine[i][1] < theirs[j][1]:
+                i += 1
+            else:
+                j += 1
+        return True
+
+    __or__ = union
+    __and__ = intersection
+    __ge__ = issuperset
+    __le__ = issubset
+
+
+ALL_PORTS = PortSet(((0, MAX_PORT),))
@@ -0,0 +1,206 @@
+"""
+records.py
+immutable records emitted by the parser and the modules built on it
+
+Records used to be attrs classes.  They are generated here instead so that
+parsing (and CLI start-up) does not pay for importing attrs; the generated
+classes behave the same way: slotted, frozen, keyword or positional
+construction, and an attrs-style repr.
+"""
+from collections.abc import Mapping
+
+_NOTHING = object()
+
+
+class FrozenInstanceError(AttributeError):
+    """Raised on any attempt to set or delete an attribute of a record."""
+
+
+class field():
+    """
+    Declare a record field, optionally with an (immutable) default.
+
+    A field with ``view=False`` is part of the record (construction, equality,
+    pickling) but left out of its dict view, and so out of JSON output.
+    """
+    __slots__ = ('default', 'view')
+
+    def __init__(self, default=_NOTHING, view=True):
+        self.default = default
+        self.view = view
+
+
+class RecordMapping(Mapping):
+    """
+    Read-only dict view over a record.
+
+    Fields set to None are left out of the view, so a record compares equal to
+    (and can be used in place of) the dict the parser used to emit.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key not in self._view_names:
+            raise KeyError(key)
+        value = getattr(self, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return (name for name in self._view_names if getattr(self, name) is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __eq__(self, other):
+        if type(other) is type(self):
+            return all(getattr(self, name) == getattr(other, name) for name in self._field_names)
+        return Mapping.__eq__(self, other)
+
+    def __hash__(self):
+        return hash(tuple(getattr(self, name) for name in self._field_names))
+
+    def __reduce__(self):
+        # rebuild through __init__ from a plain tuple; much cheaper than slot-by-slot setstate
+        return type(self), tuple(getattr(self, name) for name in self._field_names)
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            '{}={!r}'.format(name, getattr(self, name)) for name in self._field_names))
+
+    def __setattr__(self, name, value):
+        raise FrozenInstanceError(name)
+
+    def __delattr__(self, name):
+        raise FrozenInstanceError(name)
+
+
+def _make_init(names, defaults):
+    # generated source, as attrs does: a plain positional __init__ is several times faster than a generic one
+    params = ['self']
+    for name in names:
+        params.append('{0}=_default_{0}'.format(name) if name in defaults else name)
+    lines = ['def __init__({}):'.format(', '.join(params))]
+    lines.extend('    _setattr(self, {0!r}, {0})'.format(name) for name in names)
+    if not names:
+        lines.append('    pass')
+    namespace = {'_setattr': object.__setattr__}
+    namespace.update(('_default_' + name, value) for name, value in defaults.items())
+    exec('\n'.join(lines), namespace)
+    return namespace['__init__']
+
+
+def record(cls):
+    """Class decorator for parser records: slotted, frozen, and viewable as a dict."""
+    names = []
+    view_names = []
+    defaults = {}
+    namespace = {}
+    for name, value in cls.__dict__.items():
+        if isinstance(value, field):
+            names.append(name)
+            if value.view:
+                view_names.append(name)
+            if value.default is not _NOTHING:
+                defaults[name] = value.default
+            elif defaults:
+                raise ValueError('field {} without a default follows one with a default'.format(name))
+        elif name not in ('__dict__', '__weakref__'):
+            namespace[name] = value
+    namespace['__slots__'] = tuple(names)
+    namespace['_field_names'] = tuple(names)
+    namespace['_view_names'] = tuple(view_names)
+    namespace['__init__'] = _make_init(names, defaults)
+    return type(cls.__name__, cls.__bases__, namespace)
+
+
+def replace(rec, **changes):
+    """Copy of record ``rec`` with the given fields changed."""
+    values = {name: getattr(rec, name) for name in rec._field_names}
+    values.update(changes)
+    return type(rec)(**values)
+
+
+@record
+class ServiceSpec(RecordMapping):
+    """A port operator and value as written (``eq www``), and the PortSet they stand for, if any."""
+    op = field()
+    val = field()
+    ports = field(default=None, view=False)
+
+
+@record
+class Target(RecordMapping):
+    type = field()
+    target = field()
+    protocol = field(default=None)
+
+
+@record
+class ACE(RecordMapping):
+    text = field()
+    acl = field(default=None)
+    type = field(default=None)
+    acl_type = field(default=None)
+    action = field(default=None)
+    protocol = field(default=None)
+    src = field(default=None)
+    dst = field(default=None)
+    service = field(default=None)
+    user = field(default=None)
+    log = field(default='')
+    time_range = field(default=None)
+    active = field(default=True)
+    line = field(default=None)
+    offset = field(default=None)
+
+
+@record
+class Service(RecordMapping):
+    """
+    A protocol and the destination ports it applies to: a PortSet, a ServiceSpec
+    for values that are not ports (icmp types), or None for every port.
+    """
+    protocol = field()
+    ports = field(default=None)
+
+
+@record
+class ResolvedACE(RecordMapping):
+    """An ACE with its src, dst and service references expanded to frozensets."""
+    ace = field()
+    src = field()
+    dst = field()
+    service = field()
+
+
+@record
+class Finding(RecordMapping):
+    """An analysis result: ``kind`` of problem with ``ace``, caused by the ``related`` ACEs."""
+    kind = field()
+    acl = field()
+    ace = field()
+    related = field(default=())
+
+
+@record
+class Delta(RecordMapping):
+    """
+    Difference between two parses of a config.
+
+    ``added`` and ``removed`` hold parsed ACEs and objects; ``modified`` holds
+    (old, new) pairs.
+    """
+    added = field(default=())
+    removed = field(default=())
+    modified = field(default=())
+
+
+@record
+class GroupError(RecordMapping):
+    """A CLI group a lenient Parser skipped: where it starts, its text, and why it failed."""
+    line = field()
+    offset = field()
+    group = field()
+    reason = field()
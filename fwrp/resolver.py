@@ -0,0 +1,172 @@
+"""
+resolver.py
+expand object and object-group references in parsed ACEs
+"""
+import ipaddress
+
+from .evaluator import PROTOCOL_NAMES
+from .ports import PortSet
+from .records import ResolvedACE, Service
+
+ANY_NETWORKS = {
+    'any': frozenset((ipaddress.ip_network('0.0.0.0/0'), ipaddress.ip_network('::/0'))),
+    'any4': frozenset((ipaddress.ip_network('0.0.0.0/0'),)),
+    'any6': frozenset((ipaddress.ip_network('::/0'),)),
+}
+
+# protocol keywords that stand for more than one IP protocol
+PROTOCOL_ALIASES = {
+    'tcp-udp': ('tcp', 'udp'),
+}
+
+
+def _services(protocol, ports):
+    return [Service(protocol=proto, ports=ports) for proto in PROTOCOL_ALIASES.get(protocol, (protocol,))]
+
+
+def _spec_ports(spec):
+    # a Service carries the spec's PortSet; specs that name no ports (icmp types) are kept as they are
+    return spec if spec.ports is None else spec.ports
+
+
+def _merge_services(members):
+    """
+    Replace the Services of each protocol whose ports are PortSets with one
+    Service holding their union; other members are passed through.
+    """
+    merged = {}
+    r_val = set()
+    for member in members:
+        if type(member) is Service and type(member.ports) is PortSet:
+            protocol = member.protocol
+            if protocol in merged:
+                member = Service(protocol=protocol, ports=merged[protocol].ports | member.ports)
+            merged[protocol] = member
+        else:
+            r_val.add(member)
+    r_val.update(merged.values())
+    return r_val
+
+
+class Resolver():
+    """
+    Resolve object and object-group names to flat sets of networks and services.
+
+    Each object is flattened at most once; the result is memoized and shared by
+    every ACE and every enclosing group that references it.  Members are
+    ipaddress networks for network objects and Service records for service and
+    protocol objects, with one Service per protocol holding all its ports.
+    """
+
+    def __init__(self, objects=()):
+        self.objects = {}
+        self.flattened = {}
+        self._resolving = []
+        for parsed_object in objects:
+            self.add(parsed_object)
+
+    @classmethod
+    def from_parser(cls, parser):
+        """Build a Resolver over the objects a Parser instance has collected so far."""
+        return cls(list(parser.objects.values()) + list(parser.object_groups.values()))
+
+    def add(self, parsed_object):
+        """Index a parsed object (as produced by Parser.parse_object) by name."""
+        self.objects[parsed_object['object']] = parsed_object
+        # a redefinition invalidates anything flattened so far
+        self.flattened.clear()
+
+    def flatten(self, name):
+        """
+        Return the frozenset of networks and Services an object or object-group stands for.
+
+        :param name: object or object-group name
+        :return: frozenset of ipaddress networks and Service records
+        """
+        try:
+            return self.flattened[name]
+        except KeyError:
+            pass
+
+        if name in self._resolving:
+            cycle = self._resolving[self._resolving.index(name):] + [name]
+            raise ValueError('object-group cycle: {}'.format(' -> '.join(cycle)))
+        try:
+            parsed_object = self.objects[name]
+        except KeyError:
+            raise ValueError('unknown object "{}"'.format(name))
+
+        self._resolving.append(name)
+        try:
+            members = set()
+            for target in parsed_object['target']:
+                members.update(self._expand(target, parsed_object.get('protocol')))
+        finally:
+            self._resolving.pop()
+
+        r_val = self.flattened[name] = frozenset(_merge_services(members))
+        return r_val
+
+    def _expand(self, target, protocol=None):
+        t_type = target['type']
+        if t_type in ('object', 'object-group'):
+            return self.flatten(target['target'])
+        elif t_type == 'network':
+            return (target['target'],)
+        elif t_type in ANY_NETWORKS:
+            return ANY_NETWORKS[t_type]
+        elif t_type == 'range':
+            start, end = map(ipaddress.ip_address, target['target'])
+            return tuple(ipaddress.summarize_address_range(start, end))
+        elif t_type == 'protocol':
+            return _services(target['target'], None)
+        elif t_type == 'service':
+            return _services(target.get('protocol', protocol), _spec_ports(target['target']))
+        else:
+            # ACE service targets carry the protocol as their type, e.g. {'type': 'tcp', ...}
+            return _services(t_type, _spec_ports(target['target']))
+
+    def networks(self, target):
+        """Expand an ACE src/dst target to a frozenset of networks."""
+        return frozenset(member for member in self._expand(target)
+                         if isinstance(member, ipaddress._BaseNetwork))
+
+    def services(self, target, protocol=None):
+        """
+        Expand an ACE service target to a frozenset of Services.
+
+        Members that do not name a protocol (port-objects in a group without one)
+        take ``protocol``, normally the ACE's own protocol; when that is not ``ip``,
+        members of other protocols (the udp half of a tcp-udp group in a tcp ACE)
+        are dropped, as the ACE only matches its own protocol.
+        """
+        if protocol is None or protocol == 'ip':
+            allowed = None
+        else:
+            allowed = {PROTOCOL_NAMES.get(proto, proto) for proto in PROTOCOL_ALIASES.get(protocol, (protocol,))}
+        r_val = set()
+        for member in self._expand(target, protocol):
+            if isinstance(member, Service):
+                if member.protocol is None:
+                    r_val.update(_services(protocol, member.ports))
+                elif allowed is None or PROTOCOL_NAMES.get(member.protocol, member.protocol) in allowed:
+                    r_val.add(member)
+        return frozenset(_merge_services(r_val))
+
+    def resolve(self, ace):
+        """
+        Expand every reference in a parsed ACE.
+
+        :param ace: ACE as produced by Parser.parse_ace
+        :return: ResolvedACE with src, dst and service as frozensets, or None for remarks
+        """
+        if 'src' not in ace:
+            return None
+        protocol = ace['protocol']
+        if 'object' in protocol:
+            # the protocol is the service object itself, so there is no separate ACE protocol
+            protocol = None
+        return ResolvedACE(ace=ace,
+                           src=self.networks(ace['src']),
+                           dst=self.networks(ace['dst']),
+                           service=self.services(ace['service'], protocol))
@@ -0,0 +1,452 @@
+"""
+serialization.py
+compact binary format for parsed rulesets
+
+A file is the magic bytes ``FWRP``, a format version byte, a run of blocks,
+and an index.  Each block holds up to BLOCK_ITEMS frames, one per parsed
+item: a little-endian uint32 payload length followed by the payload.
+Payloads are tagged values in the spirit of msgpack:
+
+* integers are zigzag varints
+* networks and addresses are their packed bytes (plus a prefix length byte)
+* port sets are a range count followed by each range's low and high port
+* records (ACE, Target, ServiceSpec) are a type code followed by their fields
+* short strings, networks, addresses, Targets and ServiceSpecs are written
+  once per block and referred to by number afterwards; the tables start
+  empty in every block, so a block decodes without the ones before it
+
+The index follows the last block: a uint64 offset and uint32 item count
+per block, then a trailer of the index's offset, the block count and the
+magic bytes again.  Writes stream item by item and the index is written
+last.  Reads memory-map the file and decode straight from a memoryview of
+the map, with no copy of any frame; the index lets Reader seek to a block
+instead of decoding everything before it.
+
+Reading rebuilds records, networks and PortSets in Python, which costs
+more than json.loads building plain dicts and strings from text; the
+binary format is smaller, lossless and quicker to write, not quicker to read.
+"""
+import bisect
+import contextlib
+import gc
+import ipaddress
+import mmap
+import struct
+
+from .ports import PortSet
+from .records import ACE, ServiceSpec, Target
+
+MAGIC = b'FWRP'
+FORMAT_VERSION = 6
+
+NONE, TRUE, FALSE, INT, STR_DEF, STR_REF, STR_RAW, LIST, TUPLE, DICT, \
+    NET4, NET6, ADDR4, ADDR6, IP_REF, RECORD, RECORD_REF, PORTS = range(18)
+
+# items per block: each block repeats the table entries it uses, so larger blocks are smaller and
+# quicker to read through, while smaller ones make a seek to one item cheaper
+BLOCK_ITEMS = 16384
+
+# strings longer than this (rule text) are almost never repeated, so they stay out of the string table
+MAX_TABLE_STRING = 64
+
+RECORD_TYPES = (ACE, Target, ServiceSpec)
+RECORD_CODES = {cls: code for code, cls in enumerate(RECORD_TYPES)}
+# records that repeat across ACEs and go in a table; every ACE is unique
+SHARED_RECORDS = (Target, ServiceSpec)
+
+_IP_TAGS = {
+    ipaddress.IPv4Network: NET4,
+    ipaddress.IPv6Network: NET6,
+    ipaddress.IPv4Address: ADDR4,
+    ipaddress.IPv6Address: ADDR6,
+}
+
+# encoded size of each ip tag's value: packed address, plus a prefix length byte for networks
+_IP_SIZES = {NET4: 5, NET6: 17, ADDR4: 4, ADDR6: 16}
+
+_frame_header = struct.Struct('<I')
+_index_entry = struct.Struct('<QI')  # block offset, item count
+_trailer = struct.Struct('<QI4s')  # index offset, block count, MAGIC
+
+
+def _put_varint(buf, value):
+    while value > 0x7f:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _get_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+class Writer():
+    """
+    Write parsed items to a binary file object as they are produced.
+
+    The file is not complete until close() writes the block index.
+
+    :param fileobj: file object opened for binary writing
+    :param block_items: items per block
+    """
+
+    def __init__(self, fileobj, block_items=BLOCK_ITEMS):
+        self.fileobj = fileobj
+        self.block_items = block_items
+        self.blocks = []
+        self.count = 0
+        header = MAGIC + bytes((FORMAT_VERSION,))
+        fileobj.write(header)
+        # tracked rather than asked of fileobj, which need not be seekable
+        self.offset = len(header)
+
+    def _start_block(self):
+        self.strings = {}
+        self.ips = {}
+        self.records = {}
+        self.blocks.append([self.offset, 0])
+
+    def write(self, item):
+        if not self.blocks or self.blocks[-1][1] == self.block_items:
+            self._start_block()
+        buf = bytearray()
+        self._encode(item, buf)
+        self.fileobj.write(_frame_header.pack(len(buf)))
+        self.fileobj.write(buf)
+        self.offset += _frame_header.size + len(buf)
+        self.blocks[-1][1] += 1
+        self.count += 1
+
+    def close(self):
+        """Write the block index and trailer; fileobj itself is left open."""
+        index = b''.join(_index_entry.pack(offset, count) for offset, count in self.blocks)
+        self.fileobj.write(index + _trailer.pack(self.offset, len(self.blocks), MAGIC))
+
+    def _encode(self, value, buf):
+        value_type = type(value)
+        if value_type is str:
+            string_id = self.strings.get(value)
+            if string_id is not None:
+                buf.append(STR_REF)
+                _put_varint(buf, string_id)
+                return
+            encoded = value.encode('utf-8')
+            if len(encoded) <= MAX_TABLE_STRING:
+                self.strings[value] = len(self.strings)
+                buf.append(STR_DEF)
+            else:
+                buf.append(STR_RAW)
+            _put_varint(buf, len(encoded))
+            buf += encoded
+        elif value_type in RECORD_CODES:
+            shared = value_type in SHARED_RECORDS
+            if shared:
+                record_id = self.records.get(value)
+                if record_id is not None:
+                    buf.append(RECORD_REF)
+                    _put_varint(buf, record_id)
+                    return
+            buf.append(RECORD)
+            buf.append(RECORD_CODES[value_type])
+            for name in value_type._field_names:
+                self._encode(getattr(value, name), buf)
+            if shared:
+                # numbered after its fields, matching the order the Reader builds them in
+                self.records[value] = len(self.records)
+        elif value is None:
+            buf.append(NONE)
+        elif value is True:
+            buf.append(TRUE)
+        elif value is False:
+            buf.append(FALSE)
+        elif value_type is int:
+            buf.append(INT)
+            _put_varint(buf, value << 1 if value >= 0 else (-value << 1) - 1)
+        elif value_type in _IP_TAGS:
+            ip_id = self.ips.get(value)
+            if ip_id is not None:
+                buf.append(IP_REF)
+                _put_varint(buf, ip_id)
+                return
+            self.ips[value] = len(self.ips)
+            buf.append(_IP_TAGS[value_type])
+            if value_type is ipaddress.IPv4Network or value_type is ipaddress.IPv6Network:
+                buf += value.network_address.packed
+                buf.append(value.prefixlen)
+            else:
+                buf += value.packed
+        elif value_type is PortSet:
+            buf.append(PORTS)
+            _put_varint(buf, len(value.ranges))
+            for low, high in value.ranges:
+                _put_varint(buf, low)
+                _put_varint(buf, high)
+        elif value_type is list or value_type is tuple:
+            buf.append(LIST if value_type is list else TUPLE)
+            _put_varint(buf, len(value))
+            for member in value:
+                self._encode(member, buf)
+        elif value_type is dict:
+            buf.append(DICT)
+            _put_varint(buf, len(value))
+            for key, member in value.items():
+                self._encode(key, buf)
+                self._encode(member, buf)
+        else:
+            raise ValueError('cannot serialize {!r}'.format(value))
+
+
+def dump(parsed, fileobj):
+    """
+    Write every item of ``parsed`` (which may be a Parser generator) to ``fileobj``.
+
+    :return: number of items written
+    """
+    writer = Writer(fileobj)
+    for item in parsed:
+        writer.write(item)
+    writer.close()
+    return writer.count
+
+
+class _BlockDecoder():
+    """
+    Decode the frames of one block, building its tables as it goes.
+
+    Strings, networks and addresses defined in the block are looked up in
+    ``pool``, shared by every block a Reader decodes, so equal ones from
+    different blocks are still one object.  Targets and ServiceSpecs are
+    only shared within a block.
+    """
+
+    def __init__(self, data, pool):
+        self.data = data
+        self.pool = pool
+        self.strings = []
+        self.ips = []
+        self.records = []
+
+    def frames(self, pos, count):
+        """Yield ``count`` items from the frames starting at offset ``pos``."""
+        data = self.data
+        for _ in range(count):
+            length, = _frame_header.unpack_from(data, pos)
+            pos += _frame_header.size
+            value, frame_end = self._decode(data, pos)
+            if frame_end != pos + length:
+                raise ValueError('corrupt frame at offset {}'.format(pos - _frame_header.size))
+            pos = frame_end
+            yield value
+
+    def _ip(self, data, pos, tag):
+        size = _IP_SIZES[tag]
+        # keyed by tag and packed bytes, which is much cheaper than building the ipaddress object again
+        key = bytes(data[pos - 1:pos + size])
+        value = self.pool.get(key)
+        if value is None:
+            if tag == NET4:
+                value = ipaddress.IPv4Network((int.from_bytes(data[pos:pos + 4], 'big'), data[pos + 4]))
+            elif tag == NET6:
+                value = ipaddress.IPv6Network((int.from_bytes(data[pos:pos + 16], 'big'), data[pos + 16]))
+            elif tag == ADDR4:
+                value = ipaddress.IPv4Address(int.from_bytes(data[pos:pos + 4], 'big'))
+            else:
+                value = ipaddress.IPv6Address(int.from_bytes(data[pos:pos + 16], 'big'))
+            self.pool[key] = value
+        self.ips.append(value)
+        return value, pos + size
+
+    def _decode(self, data, pos):
+        tag = data[pos]
+        pos += 1
+        if tag == RECORD:
+            cls = RECORD_TYPES[data[pos]]
+            pos += 1
+            strings = self.strings
+            values = []
+            for _ in cls._field_names:
+                # short-circuit the common scalar cases rather than recursing
+                tag = data[pos]
+                if tag == STR_REF and data[pos + 1] < 0x80:
+                    values.append(strings[data[pos + 1]])
+                    pos += 2
+                elif tag == NONE:
+                    values.append(None)
+                    pos += 1
+                elif tag == TRUE or tag == FALSE:
+                    values.append(tag == TRUE)
+                    pos += 1
+                elif tag == INT:
+                    value, pos = _get_varint(data, pos + 1)
+                    values.append((value >> 1) ^ -(value & 1))
+                else:
+                    value, pos = self._decode(data, pos)
+                    values.append(value)
+            value = cls(*values)
+            if cls in SHARED_RECORDS:
+                self.records.append(value)
+            return value, pos
+        # remaining tags in rough order of frequency
+        elif NET4 <= tag <= ADDR6:
+            return self._ip(data, pos, tag)
+        elif tag == STR_DEF or tag == STR_RAW:
+            length, pos = _get_varint(data, pos)
+            value = str(data[pos:pos + length], 'utf-8')
+            if tag == STR_DEF:
+                value = self.pool.setdefault(value, value)
+                self.strings.append(value)
+            return value, pos + length
+        elif tag == RECORD_REF:
+            record_id, pos = _get_varint(data, pos)
+            return self.records[record_id], pos
+        elif tag == STR_REF:
+            string_id, pos = _get_varint(data, pos)
+            return self.strings[string_id], pos
+        elif tag == IP_REF:
+            ip_id, pos = _get_varint(data, pos)
+            return self.ips[ip_id], pos
+        elif tag == NONE:
+            return None, pos
+        elif tag == TRUE:
+            return True, pos
+        elif tag == FALSE:
+            return False, pos
+        elif tag == INT:
+            value, pos = _get_varint(data, pos)
+            return (value >> 1) ^ -(value & 1), pos
+        elif tag == LIST or tag == TUPLE:
+            length, pos = _get_varint(data, pos)
+            values = []
+            for _ in range(length):
+                value, pos = self._decode(data, pos)
+                values.append(value)
+            return (values if tag == LIST else tuple(values)), pos
+        elif tag == PORTS:
+            length, pos = _get_varint(data, pos)
+            ranges = []
+            for _ in range(length):
+                low, pos = _get_varint(data, pos)
+                high, pos = _get_varint(data, pos)
+                ranges.append((low, high))
+            return PortSet(ranges), pos
+        elif tag == DICT:
+            length, pos = _get_varint(data, pos)
+            r_val = {}
+            for _ in range(length):
+                key, pos = self._decode(data, pos)
+                r_val[key], pos = self._decode(data, pos)
+            return r_val, pos
+        raise ValueError('unknown tag {} at offset {}'.format(tag, pos - 1))
+
+
+class Reader():
+    """
+    Decode items from a buffer holding a whole file (bytes or an mmap).
+
+    Items are decoded from a memoryview of the buffer, without copying it.
+    Iterating gives every item in order; indexing decodes only the block
+    holding the item, up to the item.  Each string, network and address is
+    built once and shared between the items that refer to it, like the
+    Parser's interning; Targets and ServiceSpecs are shared within a block.
+    """
+
+    def __init__(self, data):
+        data = memoryview(data)
+        try:
+            if bytes(data[:len(MAGIC)]) != MAGIC:
+                raise ValueError('not an fwrp binary file')
+            if data[len(MAGIC)] != FORMAT_VERSION:
+                raise ValueError('unsupported fwrp binary format version {}'.format(data[len(MAGIC)]))
+            index_end = len(data) - _trailer.size
+            if index_end < len(MAGIC) + 1:
+                raise ValueError('truncated fwrp binary file')
+            index_offset, block_count, magic = _trailer.unpack_from(data, index_end)
+            if magic != MAGIC or index_offset + block_count * _index_entry.size != index_end:
+                raise ValueError('truncated or corrupt fwrp binary file')
+            self.blocks = [_index_entry.unpack_from(data, index_offset + number * _index_entry.size)
+                           for number in range(block_count)]
+        except Exception:
+            data.release()
+            raise
+        self.data = data
+        # number of the first item in each block
+        self.starts = []
+        count = 0
+        for _, items in self.blocks:
+            self.starts.append(count)
+            count += items
+        self.count = count
+        self.pool = {}
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for offset, items in self.blocks:
+            yield from _BlockDecoder(self.data, self.pool).frames(offset, items)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('item index out of range')
+        number = bisect.bisect_right(self.starts, index) - 1
+        for value in _BlockDecoder(self.data, self.pool).frames(self.blocks[number][0],
+                                                               index - self.starts[number] + 1):
+            pass
+        return value
+
+    def release(self):
+        """Release the view of the buffer, so an mmap behind it can be closed."""
+        self.data.release()
+
+
+def loads(data):
+    """Decode every item from ``data`` (bytes) into a list."""
+    # everything decoded is acyclic; cyclic GC passes over the growing result only cost time
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        reader = Reader(data)
+        try:
+            return list(reader)
+        finally:
+            reader.release()
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+@contextlib.contextmanager
+def mapped(path):
+    """
+    Memory-map the binary file at ``path`` and give a Reader over the map.
+
+    Use for random access (``reader[index]``); items must not be decoded
+    once the ``with`` block has exited.
+    """
+    with open(path, 'rb') as fil:
+        with mmap.mmap(fil.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            reader = Reader(data)
+            try:
+                yield reader
+            finally:
+                reader.release()
+
+
+def load(path):
+    """
+    Memory-map the binary file at ``path`` and yield its items in order.
+
+    The file is read through the map as items are consumed, never copied into memory whole.
+    """
+    with mapped(path) as reader:
+        yield from reader
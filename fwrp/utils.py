@@ -3,8 +3,15 @@ utils.py
 """
 __author__ = 'William George'
 
+import copyreg
+import gc
 import json
 import ipaddress
+import re
+from collections.abc import Mapping
+
+from .ports import PortSet
+from .records import ServiceSpec
 
 
 def lpop(src_list):
@@ -16,61 +23,238 @@ def lpop(src_list):
         raise ValueError('cannot left pop src_list "{}"'.format(src_list))
 
 
+class TokenStream():
+    """
+    Read-only cursor over a sequence of tokens.
+
+    Consuming a token just advances an index, so unlike lpop nothing is shifted
+    or copied, and a caller can rewind by resetting ``pos``.
+    """
+    __slots__ = ('tokens', 'pos')
+
+    def __init__(self, tokens, pos=0):
+        self.tokens = tokens
+        self.pos = pos
+
+    def pop(self):
+        try:
+            token = self.tokens[self.pos]
+        except IndexError:
+            raise ValueError('cannot pop past end of tokens "{}"'.format(' '.join(self.tokens)))
+        self.pos += 1
+        return token
+
+    def peek(self):
+        try:
+            return self.tokens[self.pos]
+        except IndexError:
+            return None
+
+    def rest(self):
+        return list(self.tokens[self.pos:])
+
+    def __len__(self):
+        return max(len(self.tokens) - self.pos, 0)
+
+
+def token_stream(tokens):
+    """Wrap a token list in a TokenStream, passing existing streams through unchanged."""
+    if isinstance(tokens, TokenStream):
+        return tokens
+    return TokenStream(tokens)
+
+
+def _prefix_to_int(prefix_len):
+    return (0xffffffff << (32 - prefix_len)) & 0xffffffff
+
+
+def _int_to_dotted(value):
+    return '.'.join(str((value >> shift) & 0xff) for shift in (24, 16, 8, 0))
+
+
+# every valid IPv4 netmask, as an integer and in dotted-quad form, mapped to its prefix length
+NETMASK_INT_PREFIXES = {_prefix_to_int(prefix_len): prefix_len for prefix_len in range(33)}
+NETMASK_PREFIXES = {_int_to_dotted(mask): prefix_len for mask, prefix_len in NETMASK_INT_PREFIXES.items()}
+
+
 def cidr_from_netmask(netmask):
     """
     Give the subnet mask length for a given netmask.
 
-    Note:  This only lightly validates the netmask, this will not catch errors including but not limited to:
-        0.255.255.255
-        255.254.255.0
-        etc...
+    Only the 33 contiguous netmasks are accepted, so masks like 0.255.255.255
+    or 255.254.255.0 raise ValueError.
 
-    :param netmask: a valid netmask of the form 255.255.255.0
-    :return:
+    :param netmask: a netmask of the form 255.255.255.0, or the same as an integer
+    :return: prefix length
     """
-    valid_octets = [
-        '0',
-        '128',
-        '192',
-        '224',
-        '240',
-        '248',
-        '252',
-        '254',
-        '255'
-    ]
+    try:
+        if isinstance(netmask, int):
+            return NETMASK_INT_PREFIXES[netmask]
+        return NETMASK_PREFIXES[netmask]
+    except (KeyError, TypeError):
+        raise ValueError('Invalid netmask "{}"'.format(netmask))
 
-    octet_values = {octet: value for value, octet in enumerate(valid_octets)}
 
-    if not is_ip_address(netmask):
-        raise ValueError('Invalid netmask {}'.format(netmask))
+def ipv4_to_int(address):
+    """
+    Convert a dotted-quad IPv4 address to an integer without going through ipaddress.
 
-    octets = netmask.split('.')
+    :param address: address of the form 10.1.2.3
+    :return: integer value of the address
+    """
+    octets = address.split('.')
+    if len(octets) != 4:
+        raise ValueError('Invalid IPv4 address "{}"'.format(address))
+    value = 0
+    for octet in octets:
+        # isdigit alone would accept non-ASCII digits, int() alone would accept '+1' and ' 1'
+        if not (octet.isascii() and octet.isdigit()) or len(octet) > 3 or (octet[0] == '0' and len(octet) > 1):
+            raise ValueError('Invalid IPv4 address "{}"'.format(address))
+        octet_value = int(octet)
+        if octet_value > 255:
+            raise ValueError('Invalid IPv4 address "{}"'.format(address))
+        value = value << 8 | octet_value
+    return value
 
-    try:
-        bits = sum(octet_values[octet] for octet in octets)
-    except KeyError:
-        raise ValueError('Invalid netmask "{}"'.format(netmask))
 
-    return bits
+def ipv4_network(address, netmask):
+    """
+    Build the IPv4Network for an address/netmask pair, masking off host bits.
+
+    Both parts are converted to integers directly, so no string is re-parsed
+    by ipaddress and no exception is raised for valid input.
+
+    :param address: address of the form 10.1.2.3
+    :param netmask: netmask of the form 255.255.255.0, or the same as an integer
+    :return: ipaddress.IPv4Network
+    """
+    prefix_len = cidr_from_netmask(netmask)
+    return ipaddress.IPv4Network((ipv4_to_int(address) & _prefix_to_int(prefix_len), prefix_len))
+
+
+_IPV4_OCTET = r'(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])'
+_IPV4_RE = re.compile(r'{0}(?:\.{0}){{3}}\Z'.format(_IPV4_OCTET))
+_IPV6_CHARS = frozenset('0123456789abcdefABCDEF:.')
+
+
+def _looks_like_ipv6(text):
+    return ':' in text and _IPV6_CHARS.issuperset(text)
 
 
 def is_ip_address(text):
+    """
+    True if ``text`` is an IPv4 or IPv6 address.
+
+    IPv4 is decided by a regex alone; ipaddress is only consulted for tokens made
+    up entirely of IPv6 characters, so keywords and names never raise internally.
+    """
+    text = text.strip()
+    if _IPV4_RE.match(text):
+        return True
+    if not _looks_like_ipv6(text):
+        return False
     try:
-        ipaddress.ip_address(text.strip())
+        ipaddress.IPv6Address(text)
         return True
-    except (ipaddress.AddressValueError, ValueError):
+    except ValueError:
         return False
 
 
 def is_ip_network(text):
+    """
+    True if ``text`` is an address or network ipaddress.ip_network accepts (strictly).
+
+    Tokens that cannot be lexically an address, optionally followed by
+    ``/prefix`` or ``/netmask``, are rejected before ipaddress is involved.
+    """
+    text = text.strip()
+    address, _, prefix = text.partition('/')
+    if not (_IPV4_RE.match(address) or _looks_like_ipv6(address)):
+        return False
+    if prefix and not (prefix.isascii() and prefix.isdigit()) and not _IPV4_RE.match(prefix):
+        return False
     try:
-        ipaddress.ip_network(text.strip())
+        ipaddress.ip_network(text)
         return True
-    except (ipaddress.AddressValueError, ValueError):
+    except ValueError:
         return False
 
 
+class Interner():
+    """
+    Hand out one shared object per distinct value.
+
+    A ruleset references the same hosts, networks and object names over and
+    over; interning them means each is constructed and stored only once.
+    Hits and misses are counted per kind so the tables can be tuned.
+    """
+
+    def __init__(self):
+        self.tables = {'name': {}, 'network': {}, 'service': {}}
+        self.hits = {'name': 0, 'network': 0, 'service': 0}
+        self.misses = {'name': 0, 'network': 0, 'service': 0}
+
+    def name(self, text):
+        table = self.tables['name']
+        try:
+            value = table[text]
+        except KeyError:
+            self.misses['name'] += 1
+            value = table[text] = text
+        else:
+            self.hits['name'] += 1
+        return value
+
+    def network(self, address, netmask=None):
+        """
+        Return the shared ip_network for ``address`` (a host address or CIDR
+        string) or for an address/netmask pair; host bits are masked off.
+        """
+        key = address if netmask is None else (address, netmask)
+        table = self.tables['network']
+        try:
+            value = table[key]
+        except KeyError:
+            self.misses['network'] += 1
+            if netmask is None:
+                value = ipaddress.ip_network(address)
+            else:
+                value = ipv4_network(address, netmask)
+            table[key] = value
+        else:
+            self.hits['network'] += 1
+        return value
+
+    def service(self, op, val):
+        """
+        Return the shared ServiceSpec for a port operator and value.
+
+        Its PortSet is worked out here, once per distinct spec.  Values that
+        do not name ports (unknown port names) raise ValueError, so the line is
+        a parse error rather than a spec nothing downstream can match on.
+        """
+        key = (op, val)
+        table = self.tables['service']
+        try:
+            value = table[key]
+        except KeyError:
+            self.misses['service'] += 1
+            value = table[key] = ServiceSpec(op=op, val=val, ports=PortSet.from_spec(op, val))
+        else:
+            self.hits['service'] += 1
+        return value
+
+    def stats(self):
+        r_val = {}
+        for kind, table in self.tables.items():
+            lookups = self.hits[kind] + self.misses[kind]
+            r_val[kind] = {'size': len(table),
+                           'hits': self.hits[kind],
+                           'misses': self.misses[kind],
+                           'hit_rate': self.hits[kind] / lookups if lookups else 0.0}
+        return r_val
+
+
 def instance_in(obj, classes):
     for cls in classes:
         if isinstance(obj, cls):
@@ -78,6 +262,72 @@ def instance_in(obj, classes):
     return False
 
 
+def source_line(data, offset):
+    """
+    The config line starting at byte ``offset``, e.g. a parsed record's ``offset``.
+
+    :param data: the config file's bytes, or an mmap of it, so the lookup is a seek rather than a scan
+    :param offset: byte offset of the start of the line
+    :return: the line as text, without its terminator
+    """
+    end = data.find(b'\n', offset)
+    if end < 0:
+        end = len(data)
+    return bytes(data[offset:end]).rstrip(b'\r').decode('utf-8')
+
+
+def _network(cls, value, prefix_len):
+    return cls((value, prefix_len))
+
+
+def _reduce_network(network):
+    # ipaddress pickles networks as strings and re-parses them on load; integers are much cheaper
+    return _network, (type(network), int(network.network_address), network.prefixlen)
+
+
+_dispatch_table = copyreg.dispatch_table.copy()
+_dispatch_table[ipaddress.IPv4Network] = _reduce_network
+_dispatch_table[ipaddress.IPv6Network] = _reduce_network
+
+
+def pickle_dumps(obj):
+    """pickle.dumps, writing networks as integers rather than strings to re-parse."""
+    # imported here: only the cache and parallel parsing pickle, and parse start-up stays lean
+    import io
+    import pickle
+    buffer = io.BytesIO()
+    pickler = pickle.Pickler(buffer, protocol=pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = _dispatch_table
+    pickler.dump(obj)
+    return buffer.getvalue()
+
+
+def pickle_loads(data):
+    """
+    pickle.loads for parser output, with cyclic GC paused.
+
+    Parser output is acyclic, so GC passes over the objects being rebuilt only
+    cost time; on a large result they are most of the time unpickling takes.
+    """
+    import pickle
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return pickle.loads(data)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def json_default(obj):
+    """
+    ``default`` hook for json.dumps: parser records become dicts, anything else its string form.
+    """
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    return str(obj)
+
+
 class IPEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, ipaddress._IPAddressBase):
@@ -85,7 +335,9 @@ class IPEncoder(json.JSONEncoder):
                 '__class__': obj.__class__.__name__,
                 'value': str(obj)
             }
-        return super().default(self, obj)
+        if isinstance(obj, Mapping):
+            return dict(obj)
+        return super().default(obj)
 
 
 def as_IP(dct):
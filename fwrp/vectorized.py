@@ -0,0 +1,151 @@
+"""
+vectorized.py
+NumPy batch matching of flows against a compiled ACL
+
+This module needs numpy, which the rest of fwrp does not.
+"""
+import ipaddress
+
+import numpy as np
+
+from .evaluator import PROTOCOL_NAMES
+
+PROTOCOL_NUMBERS = {name: int(number) for number, name in PROTOCOL_NAMES.items()}
+ANY_PROTOCOL = -1
+UNKNOWN_PROTOCOL = -2
+NO_PORT = -1
+
+_MASK32 = 0xffffffff
+
+
+def protocol_number(protocol):
+    """Protocol name or number as an int: ANY_PROTOCOL for 'ip', UNKNOWN_PROTOCOL if not known."""
+    protocol = str(protocol)
+    if protocol == 'ip':
+        return ANY_PROTOCOL
+    if protocol.isdigit():
+        return int(protocol)
+    return PROTOCOL_NUMBERS.get(protocol, UNKNOWN_PROTOCOL)
+
+
+def flows_to_array(flows):
+    """
+    Encode flows for match_batch.
+
+    :param flows: iterable of (protocol, src, dst, dport) with IPv4 addresses; dport may be None
+    :return: int64 array of shape (n, 4): protocol number, src, dst, dport (NO_PORT if None)
+    """
+    rows = []
+    for protocol, src, dst, dport in flows:
+        code = protocol_number(protocol)
+        if code in (ANY_PROTOCOL, UNKNOWN_PROTOCOL):
+            raise ValueError('Invalid flow protocol "{}"'.format(protocol))
+        rows.append((code,
+                     int(ipaddress.IPv4Address(src)),
+                     int(ipaddress.IPv4Address(dst)),
+                     NO_PORT if dport is None else int(dport)))
+    return np.array(rows, dtype=np.int64).reshape(-1, 4)
+
+
+class VectorACL():
+    """
+    A CompiledACL flattened into parallel NumPy arrays, one row per
+    (src range, dst range, service) combination of each rule, in rule order.
+
+    Rows are also grouped by destination prefix length and sorted by
+    destination network within each group.  A batch of flows is matched
+    with one searchsorted per prefix length, so each flow is only compared
+    with rows whose destination contains it, as CompiledACL does with its
+    prefix index.
+
+    Only IPv4 is represented.  Rows for IPv6 ranges are left out, since they
+    can never match an IPv4 flow.
+    """
+
+    def __init__(self, compiled_acl):
+        self.compiled_acl = compiled_acl
+        rows = []
+        for rule_id, rule in enumerate(compiled_acl.rules):
+            src_ranges = [r for r in rule.src if r[0] == 4]
+            dst_ranges = [r for r in rule.dst if r[0] == 4]
+            services = []
+            for protocol, ports in rule.services.items():
+                code = protocol_number(protocol)
+                if ports is None:
+                    services.append((code, NO_PORT, 65535))
+                else:
+                    services.extend((code, low, high) for low, high in ports)
+            for _, s_low, s_high in src_ranges:
+                for _, d_low, d_high in dst_ranges:
+                    for code, p_low, p_high in services:
+                        rows.append((s_low, ~(s_high - s_low) & _MASK32,
+                                     d_low, ~(d_high - d_low) & _MASK32,
+                                     code, p_low, p_high, rule_id))
+
+        table = np.array(rows, dtype=np.int64).reshape(-1, 8)
+        self.src_net, self.src_mask = table[:, 0].astype(np.uint32), table[:, 1].astype(np.uint32)
+        self.dst_net, self.dst_mask = table[:, 2].astype(np.uint32), table[:, 3].astype(np.uint32)
+        self.protocol = table[:, 4].astype(np.int16)
+        self.port_low, self.port_high = table[:, 5].astype(np.int32), table[:, 6].astype(np.int32)
+        self.rule = table[:, 7].astype(np.int32)
+        self.action = np.array([rule.action == 'permit' for rule in compiled_acl.rules], dtype=bool)
+
+        # per destination mask: rows sorted by (dst_net, rule), plus the start and
+        # length of each run of rows sharing a dst_net
+        self.dst_groups = []
+        for mask in np.unique(self.dst_mask):
+            members = np.flatnonzero(self.dst_mask == mask)
+            members = members[np.lexsort((self.rule[members], self.dst_net[members]))]
+            keys, starts, counts = np.unique(self.dst_net[members], return_index=True, return_counts=True)
+            self.dst_groups.append((mask, keys, starts, counts, members))
+
+    def __len__(self):
+        return len(self.rule)
+
+    def match_batch(self, flows):
+        """
+        Find the first matching rule for every flow.
+
+        :param flows: array as produced by flows_to_array
+        :return: int32 array of indexes into compiled_acl.rules, -1 for the implicit deny
+        """
+        flows = np.asarray(flows, dtype=np.int64).reshape(-1, 4)
+        no_match = np.iinfo(np.int32).max
+        best = np.full(len(flows), no_match, dtype=np.int32)
+        protocol = flows[:, 0].astype(np.int16)
+        src = flows[:, 1].astype(np.uint32)
+        dst = flows[:, 2].astype(np.uint32)
+        dport = flows[:, 3].astype(np.int32)
+
+        for mask, keys, starts, counts, members in self.dst_groups:
+            flow_keys = dst & mask
+            pos = np.minimum(np.searchsorted(keys, flow_keys), len(keys) - 1)
+            candidates = np.flatnonzero(keys[pos] == flow_keys)
+            group_start = starts[pos[candidates]]
+            group_count = counts[pos[candidates]]
+            # walk the j-th row of every candidate's run at once; runs are in rule
+            # order, so a flow drops out of its run at its first match
+            for j in range(int(group_count.max()) if len(candidates) else 0):
+                live = group_count > j
+                flow_ids = candidates[live]
+                rows = members[group_start[live] + j]
+                r_proto = self.protocol[rows]
+                f_port = dport[flow_ids]
+                ok = (((src[flow_ids] & self.src_mask[rows]) == self.src_net[rows]) &
+                      ((r_proto == ANY_PROTOCOL) | (r_proto == protocol[flow_ids])) &
+                      (f_port >= self.port_low[rows]) &
+                      (f_port <= self.port_high[rows]))
+                np.minimum.at(best, flow_ids[ok], self.rule[rows[ok]])
+                keep = np.ones(len(candidates), dtype=bool)
+                keep[np.flatnonzero(live)[ok]] = False
+                candidates, group_start, group_count = candidates[keep], group_start[keep], group_count[keep]
+
+        best[best == no_match] = -1
+        return best
+
+    def permits(self, matches):
+        """Boolean array: True where match_batch found a permit rule."""
+        matches = np.asarray(matches)
+        if not len(self.action):
+            return np.zeros(len(matches), dtype=bool)
+        return (matches >= 0) & self.action[np.maximum(matches, 0)]
@@ -1,13 +1,104 @@
-import click
+"""
+fwrp_cli.py
+command line interface
+
+Keep module-level imports to click alone: the CLI is started thousands of
+times a night for single small configs, so each command imports only what it
+uses (see tests/test_cli.py TestStartup).
+"""
+import os
 
-from fwrp import firewallruleparser
-from fwrp import fwrpv2
+import click
 
 
-@click.command()
+@click.group()
 def cli():
-    node = fwrpv2.ACLGroup(name='x')
-    print(node)
+    pass
+
+
+@cli.command()
+@click.argument('ruleset', type=click.Path(exists=True, dir_okay=False, allow_dash=True), default='-')
+@click.option('--output', '-o', type=click.File('w'), default='-',
+              help='Where to write the parsed ruleset (default: stdout).')
+@click.option('--workers', '-w', type=int, default=None,
+              help='Parse in a pool of this many processes.')
+@click.option('--lenient', is_flag=True,
+              help='Skip CLI groups that fail to parse, report them on stderr, and exit 1 at the end.')
+@click.option('--profile', is_flag=True,
+              help='Print per-stage timings and keyword branch counts to stderr when done.')
+def parse(ruleset, output, workers, lenient, profile):
+    """
+    Parse RULESET (default: stdin) and write JSON Lines, one object or ACE per line.
+
+    Each record is written and flushed as soon as its CLI group is parsed, so
+    output starts immediately and memory stays flat however large the config.
+    """
+    from fwrp.batch import json_lines, write_json_lines
+    from fwrp.firewallruleparser import Parser, Profile
+    parser = Parser(lenient=lenient, profile=Profile() if profile else None)
+    if ruleset == '-':
+        # not click.File: its text mode translates CRLF, which would throw every byte offset off
+        import io
+        import sys
+        ruleset = io.TextIOWrapper(sys.stdin.buffer, newline='')
+    if workers is not None and workers > 1:
+        # workers write each chunk's JSON themselves, so this process only copies text through
+        for text in parser.parse_file(ruleset, workers=workers, encode=json_lines):
+            output.write(text)
+            output.flush()
+    else:
+        write_json_lines(parser.parse_file(ruleset, workers=workers), output, flush=True)
+    if profile:
+        click.echo(parser.profile.report(), err=True)
+    for error in parser.errors:
+        click.echo('error: line {}: {}'.format(error.line, error.reason), err=True)
+    if parser.errors:
+        raise SystemExit(1)
+
+
+@cli.command('batch')
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--output-dir', '-d', type=click.Path(file_okay=False), default='.',
+              help='Directory for the per-device output files (default: current directory).')
+@click.option('--workers', '-w', type=int, default=os.cpu_count(),
+              help='Number of worker processes (default: one per CPU).')
+@click.option('--pattern', '-p', default='*',
+              help='Only take files matching this glob from directories (default: all files).')
+@click.option('--format', '-f', 'output_format', type=click.Choice(['binary', 'jsonl']), default='jsonl',
+              help='Per-device output format (default: jsonl).')
+@click.option('--lenient', is_flag=True,
+              help='Skip CLI groups that fail to parse instead of failing the whole device.')
+def batch_command(paths, output_dir, workers, pattern, output_format, lenient):
+    """
+    Parse every config in PATHS (files, or directories of device backups).
+
+    Each device is written to its own file under --output-dir, keeping the
+    layout of any directory it was found in.  A summary is printed to stderr;
+    the exit status is 1 if any device (or, with --lenient, any group) failed.
+    """
+    import time
+    from fwrp import batch
+    try:
+        jobs = batch.plan_jobs(batch.find_configs(paths, pattern), output_dir, output_format, lenient)
+    except ValueError as err:
+        raise click.UsageError(str(err))
+    start = time.perf_counter()
+    files = lines = records = errors = 0
+    for result in batch.parse_devices(jobs, workers):
+        files += 1
+        lines += result.lines
+        records += result.records
+        if result.error is not None:
+            errors += 1
+            click.echo('error: {}: {}'.format(result.path, result.error), err=True)
+        for error in result.group_errors:
+            errors += 1
+            click.echo('error: {}:{}: {}'.format(result.path, error.line, error.reason), err=True)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    click.echo('{} files, {} lines, {} records, {} errors in {:.2f}s ({:.1f} files/sec, {:.0f} lines/sec)'.format(
+        files, lines, records, errors, elapsed, files / elapsed, lines / elapsed), err=True)
+    if errors:
+        raise SystemExit(1)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,111 @@
+import unittest
+
+from fwrp.analysis import analyze
+from fwrp.firewallruleparser import Parser
+from fwrp.resolver import Resolver
+__author__ = 'William.George'
+
+RULESET = (
+    'object-group network SERVERS\n'
+    ' network-object 10.0.0.0 255.255.255.0\n'
+    ' network-object host 10.0.1.1\n'
+    'access-list A extended permit tcp any 10.0.0.0 255.255.0.0 eq 443\n'
+    'access-list A extended deny tcp host 192.0.2.1 10.0.0.0 255.255.255.0 eq 443\n'
+    'access-list A extended permit tcp host 192.0.2.1 object-group SERVERS eq https\n'
+    'access-list A extended deny tcp any 10.0.0.0 255.255.255.0 range 400 500\n'
+    'access-list A extended permit udp any any\n'
+    'access-list A extended permit udp any any eq 53 inactive\n'
+    'access-list A extended permit ip any any\n'
+    'access-list A extended deny tcp any any eq 22\n'
+    'access-list B extended permit ip any any\n'
+)
+
+
+class TestAnalysis(unittest.TestCase):
+    def test_analyze(self):
+        parser = Parser()
+        parsed = list(parser.parse_ruleset(RULESET))
+        findings = analyze(parsed, Resolver.from_parser(parser))
+        summary = [(f.kind, f.ace['text'].split(' ', 3)[3], len(f.related)) for f in findings['A']]
+        self.assertEqual([
+            ('shadowed', 'deny tcp host 192.0.2.1 10.0.0.0 255.255.255.0 eq 443', 1),
+            ('redundant', 'permit tcp host 192.0.2.1 object-group SERVERS eq https', 1),
+            ('correlated', 'deny tcp any 10.0.0.0 255.255.255.0 range 400 500', 2),
+            ('shadowed', 'deny tcp any any eq 22', 1),
+        ], summary)
+        self.assertEqual([], findings['B'])
+
+    def test_any_source(self):
+        # any-source rules are looked up by destination; only the overlapping earlier rule is related
+        parser = Parser()
+        parsed = list(parser.parse_ruleset(
+            'access-list C extended permit tcp any 10.1.0.0 255.255.255.0 eq 80\n'
+            'access-list C extended permit tcp any host 10.2.0.1 eq 80\n'
+            'access-list C extended deny tcp any4 host 10.1.0.5 eq 80\n'
+            'access-list C extended deny tcp host 192.0.2.1 any eq 80\n'))
+        findings = analyze(parsed, Resolver.from_parser(parser))['C']
+        self.assertEqual([('shadowed', 'deny tcp any4 host 10.1.0.5 eq 80',
+                           ['permit tcp any 10.1.0.0 255.255.255.0 eq 80']),
+                          ('correlated', 'deny tcp host 192.0.2.1 any eq 80',
+                           ['permit tcp any 10.1.0.0 255.255.255.0 eq 80', 'permit tcp any host 10.2.0.1 eq 80'])],
+                         [(f.kind, f.ace['text'].split(' ', 3)[3], [r['text'].split(' ', 3)[3] for r in f.related])
+                          for f in findings])
+
+    def test_earliest_covering(self):
+        # a covered rule is related to the earliest covering rule only, wherever the coverers are filed
+        parser = Parser()
+        parsed = list(parser.parse_ruleset(
+            'access-list E extended permit tcp 10.0.0.0 255.0.0.0 any\n'
+            'access-list E extended deny ip any 192.0.2.0 255.255.255.0\n'
+            'access-list E extended permit tcp any any\n'
+            'access-list E extended deny tcp host 10.0.0.1 host 192.0.2.1 eq 80\n'
+            'access-list E extended deny udp host 10.0.0.1 host 192.0.2.1 eq 53\n'))
+        findings = analyze(parsed, Resolver.from_parser(parser))['E']
+        self.assertEqual([('shadowed', 'deny tcp host 10.0.0.1 host 192.0.2.1 eq 80',
+                           ['permit tcp 10.0.0.0 255.0.0.0 any']),
+                          ('redundant', 'deny udp host 10.0.0.1 host 192.0.2.1 eq 53',
+                           ['deny ip any 192.0.2.0 255.255.255.0'])],
+                         [(f.kind, f.ace['text'].split(' ', 3)[3], [r['text'].split(' ', 3)[3] for r in f.related])
+                          for f in findings if f.kind != 'correlated'])
+
+    def test_user_rules(self):
+        # a user-scoped rule does not cover later rules, but is still checked against earlier ones
+        parser = Parser()
+        parsed = list(parser.parse_ruleset(
+            'access-list F extended deny ip user LOCAL\\jdoe any any\n'
+            'access-list F extended permit tcp any host 10.0.0.1 eq 80\n'
+            'access-list F extended deny tcp any host 10.0.0.1 eq 80\n'
+            'access-list F extended permit tcp user LOCAL\\jdoe any host 10.0.0.1 eq 80\n'))
+        findings = analyze(parsed, Resolver.from_parser(parser))['F']
+        self.assertEqual([('correlated', 'permit tcp any host 10.0.0.1 eq 80'),
+                          ('shadowed', 'deny tcp any host 10.0.0.1 eq 80'),
+                          ('redundant', 'permit tcp user LOCAL\\jdoe any host 10.0.0.1 eq 80')],
+                         [(f.kind, f.ace['text'].split(' ', 3)[3]) for f in findings])
+
+    def test_time_range_rules(self):
+        # a time-ranged rule does not cover later rules
+        parser = Parser()
+        parsed = list(parser.parse_ruleset(
+            'access-list G extended deny tcp any any time-range NIGHTS\n'
+            'access-list G extended permit tcp any host 10.0.0.1 eq 80\n'
+            'access-list G extended deny tcp any host 10.0.0.1 eq 80 time-range NIGHTS\n'))
+        findings = analyze(parsed, Resolver.from_parser(parser))['G']
+        self.assertEqual([('correlated', 'permit tcp any host 10.0.0.1 eq 80'),
+                          ('shadowed', 'deny tcp any host 10.0.0.1 eq 80 time-range NIGHTS')],
+                         [(f.kind, f.ace['text'].split(' ', 3)[3]) for f in findings])
+
+    def test_icmp_types(self):
+        # icmp rules for different types neither shadow nor overlap one another
+        parser = Parser()
+        parsed = list(parser.parse_ruleset(
+            'access-list D extended deny icmp any any echo\n'
+            'access-list D extended permit icmp any any echo-reply\n'
+            'access-list D extended permit icmp any any 0\n'
+            'access-list D extended permit icmp6 any any echo\n'))
+        findings = analyze(parsed, Resolver.from_parser(parser))['D']
+        self.assertEqual([('redundant', 'permit icmp any any 0')],
+                         [(f.kind, f.ace['text'].split(' ', 3)[3]) for f in findings])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from fwrp import cache
+from fwrp.cache import ParseCache
+from fwrp.firewallruleparser import Parser
+__author__ = 'William.George'
+
+RULESET = (
+    'object network OBJ01\n'
+    ' host 1.1.1.1\n'
+    'object network OBJ02\n'
+    ' subnet 2001:db8::/32\n'
+    'access-list A extended permit tcp host 10.0.0.1 10.1.0.0 255.255.0.0 eq 443\n'
+    'access-list A extended permit tcp host 10.0.0.1 10.1.0.0 255.255.0.0 eq 80\n'
+)
+
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def test_round_trip(self):
+        parsed = list(Parser.parse_ruleset(RULESET))
+        loaded = cache.loads(cache.dumps(parsed))
+        self.assertEqual(parsed, loaded)
+        # equal values are shared after loading
+        self.assertIs(loaded[2]['src'], loaded[3]['src'])
+
+    def test_parse(self):
+        parse_cache = ParseCache(self.tmp_dir.name)
+        parsed = parse_cache.parse(RULESET)
+        self.assertEqual((0, 1), (parse_cache.hits, parse_cache.misses))
+        self.assertEqual(parsed, parse_cache.parse(RULESET))
+        self.assertEqual((1, 1), (parse_cache.hits, parse_cache.misses))
+        self.assertIsNone(parse_cache.get(RULESET + '!\n'))
+
+    def test_hit_objects(self):
+        # a hit indexes the objects on the parser, so a Resolver can be built from it
+        parse_cache = ParseCache(self.tmp_dir.name)
+        parse_cache.parse(RULESET)
+        parser = Parser()
+        parse_cache.parse(RULESET, parser)
+        self.assertEqual((1, 1), (parse_cache.hits, parse_cache.misses))
+        self.assertEqual(['OBJ01', 'OBJ02'], sorted(parser.objects))
+
+    def test_evicted_on_hit(self):
+        # an entry evicted between the read and the access time update is still a hit
+        parse_cache = ParseCache(self.tmp_dir.name)
+        parsed = parse_cache.parse(RULESET)
+        with mock.patch.object(cache.os, 'utime', side_effect=FileNotFoundError):
+            self.assertEqual(parsed, parse_cache.get(RULESET))
+        self.assertEqual((1, 1), (parse_cache.hits, parse_cache.misses))
+
+    def test_lenient(self):
+        parse_cache = ParseCache(self.tmp_dir.name)
+        bad_ruleset = RULESET + 'access-list A extended permit tcp host\n'
+        parser = Parser(lenient=True)
+        parsed = parse_cache.parse(bad_ruleset, parser)
+        self.assertEqual([7], [error.line for error in parser.errors])
+
+        # a lenient hit reports the errors again; a strict parse is not served the partial result
+        parser = Parser(lenient=True)
+        self.assertEqual(parsed, parse_cache.parse(bad_ruleset, parser))
+        self.assertEqual((1, 1), (parse_cache.hits, parse_cache.misses))
+        self.assertEqual([7], [error.line for error in parser.errors])
+        self.assertRaises(ValueError, parse_cache.parse, bad_ruleset, Parser())
+        self.assertNotEqual(ParseCache.key(RULESET), ParseCache.key(RULESET, lenient=True))
+
+    def test_parser_version(self):
+        key = ParseCache.key(RULESET)
+        with mock.patch.object(cache, 'PARSER_VERSION', -1):
+            self.assertNotEqual(key, ParseCache.key(RULESET))
+
+    def test_evict(self):
+        parse_cache = ParseCache(self.tmp_dir.name)
+        texts = ['access-list A extended permit ip host 10.0.0.{} any\n'.format(i) for i in range(3)]
+        entry_size = 0
+        for age, text in enumerate(texts):
+            parse_cache.parse(text)
+            path = os.path.join(self.tmp_dir.name, ParseCache.key(text) + cache.CACHE_SUFFIX)
+            os.utime(path, (time.time() - 100 + age, time.time() - 100 + age))
+            # compressed entries can differ by a byte or so
+            entry_size = max(entry_size, os.path.getsize(path))
+        parse_cache.get(texts[0])  # touch the oldest entry
+        parse_cache.max_bytes = entry_size * 2
+        parse_cache.evict()
+        self.assertIsNone(parse_cache.get(texts[1]))
+        self.assertIsNotNone(parse_cache.get(texts[0]))
+        self.assertIsNotNone(parse_cache.get(texts[2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
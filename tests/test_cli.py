@@ -0,0 +1,189 @@
+import json
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+import unittest
+
+try:
+    from click.testing import CliRunner
+    import fwrp_cli
+except ImportError:  # pragma: no cover
+    fwrp_cli = None
+__author__ = 'William.George'
+
+RULESET = (
+    'object network OBJ01\n'
+    ' host 1.1.1.1\n'
+    'access-list A remark test\n'
+    'access-list A extended permit tcp host 10.0.0.1 10.1.0.0 255.255.0.0 eq 443\n'
+)
+
+
+@unittest.skipIf(fwrp_cli is None, 'click is not installed')
+class TestParseCommand(unittest.TestCase):
+    def test_stdin(self):
+        result = CliRunner().invoke(fwrp_cli.cli, ['parse'], input=RULESET)
+        self.assertEqual(0, result.exit_code, result.output)
+        lines = result.output.splitlines()
+        self.assertEqual(3, len(lines))
+        records = [json.loads(line) for line in lines]
+        self.assertEqual('OBJ01', records[0]['object'])
+        self.assertEqual('remark', records[1]['type'])
+        self.assertEqual({'type': 'network', 'target': '10.1.0.0/16'}, records[2]['dst'])
+
+    def test_file(self):
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as fil:
+            fil.write(RULESET)
+        result = CliRunner().invoke(fwrp_cli.cli, ['parse', path])
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertEqual(3, len(result.output.splitlines()))
+
+    def test_workers(self):
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as fil:
+            fil.write(RULESET * 5)
+        serial = CliRunner().invoke(fwrp_cli.cli, ['parse', path])
+        result = CliRunner().invoke(fwrp_cli.cli, ['parse', path, '-w', '2'])
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertEqual(serial.output, result.output)
+
+    def test_crlf(self):
+        # offsets must count the CR of each CRLF, as Parser.parse_file does
+        crlf = RULESET.replace('\n', '\r\n').encode()
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'wb') as fil:
+            fil.write(crlf)
+        for args, stdin in ((['parse', path], None), (['parse'], crlf)):
+            result = CliRunner().invoke(fwrp_cli.cli, args, input=stdin)
+            self.assertEqual(0, result.exit_code, result.output)
+            self.assertEqual([0, 37, 64], [json.loads(line)['offset'] for line in result.output.splitlines()])
+
+    def test_profile(self):
+        result = CliRunner().invoke(fwrp_cli.cli, ['parse', '--profile'], input=RULESET)
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn('parse_ace extended', result.output)
+
+    def test_lenient(self):
+        ruleset = 'access-list A extended permit tcp host\n' + RULESET
+        result = CliRunner().invoke(fwrp_cli.cli, ['parse'], input=ruleset)
+        self.assertEqual(1, result.exit_code)
+        self.assertIsInstance(result.exception, ValueError)
+        result = CliRunner().invoke(fwrp_cli.cli, ['parse', '--lenient'], input=ruleset)
+        self.assertEqual(1, result.exit_code)
+        self.assertIn('error: line 1: cannot pop past end of tokens', result.output)
+        self.assertEqual(3, len([line for line in result.output.splitlines() if line.startswith('{')]))
+
+
+@unittest.skipIf(fwrp_cli is None, 'click is not installed')
+class TestBatchCommand(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.backups = os.path.join(self.tmp_dir.name, 'backups')
+        os.makedirs(os.path.join(self.backups, 'site1'))
+        self.write('site1/fw1.cfg', RULESET)
+        self.write('fw2.cfg', RULESET)
+        self.write('notes.txt', 'not a config\n')
+
+    def write(self, name, text):
+        with open(os.path.join(self.backups, name), 'w') as fil:
+            fil.write(text)
+
+    def test_directory(self):
+        out_dir = os.path.join(self.tmp_dir.name, 'out')
+        result = CliRunner().invoke(fwrp_cli.cli, ['batch', self.backups, '-d', out_dir, '-p', '*.cfg', '-w', '1'])
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn('2 files, 8 lines, 6 records, 0 errors', result.output)
+        with open(os.path.join(out_dir, 'site1', 'fw1.cfg.jsonl')) as fil:
+            self.assertEqual(3, len(fil.readlines()))
+        self.assertTrue(os.path.exists(os.path.join(out_dir, 'fw2.cfg.jsonl')))
+        # outputs get the usual mode for new files, not the temporary file's 0600
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(0o666 & ~umask, stat.S_IMODE(os.stat(os.path.join(out_dir, 'fw2.cfg.jsonl')).st_mode))
+
+    def test_crlf(self):
+        with open(os.path.join(self.backups, 'fw2.cfg'), 'wb') as fil:
+            fil.write(RULESET.replace('\n', '\r\n').encode())
+        out_dir = os.path.join(self.tmp_dir.name, 'out')
+        result = CliRunner().invoke(fwrp_cli.cli, ['batch', self.backups, '-d', out_dir, '-p', 'fw2.cfg', '-w', '1'])
+        self.assertEqual(0, result.exit_code, result.output)
+        with open(os.path.join(out_dir, 'fw2.cfg.jsonl')) as fil:
+            self.assertEqual([0, 37, 64], [json.loads(line)['offset'] for line in fil])
+
+    def test_same_name(self):
+        os.makedirs(os.path.join(self.backups, 'site2'))
+        self.write('site2/fw1.cfg', RULESET)
+        cwd = os.getcwd()
+        os.chdir(self.backups)
+        self.addCleanup(os.chdir, cwd)
+        out_dir = os.path.join(self.tmp_dir.name, 'out')
+        result = CliRunner().invoke(fwrp_cli.cli, ['batch', 'site1/fw1.cfg', 'site2/fw1.cfg', 'fw2.cfg', '-d', out_dir,
+                                                   '-w', '1'])
+        self.assertEqual(0, result.exit_code, result.output)
+        for name in ('site1/fw1.cfg.jsonl', 'site2/fw1.cfg.jsonl', 'fw2.cfg.jsonl'):
+            self.assertTrue(os.path.exists(os.path.join(out_dir, name)), name)
+
+        result = CliRunner().invoke(fwrp_cli.cli, ['batch', 'fw2.cfg', './fw2.cfg', '-d', out_dir, '-w', '1'])
+        self.assertEqual(2, result.exit_code)
+        self.assertIn('would both be written to', result.output)
+
+    def test_errors(self):
+        self.write('bad.cfg', 'access-list A extended permit tcp host\n')
+        out_dir = os.path.join(self.tmp_dir.name, 'out')
+        result = CliRunner().invoke(fwrp_cli.cli, ['batch', self.backups, '-d', out_dir, '-p', '*.cfg', '-w', '1',
+                                                   '-f', 'binary'])
+        self.assertEqual(1, result.exit_code)
+        self.assertIn('bad.cfg: ValueError', result.output)
+        self.assertIn('3 files, 9 lines, 6 records, 1 errors', result.output)
+        self.assertTrue(os.path.exists(os.path.join(out_dir, 'fw2.cfg.fwrpb')))
+        # the failed device leaves neither a partial output nor its temporary file
+        self.assertEqual(['fw2.cfg.fwrpb', 'site1'], sorted(os.listdir(out_dir)))
+
+        result = CliRunner().invoke(fwrp_cli.cli, ['batch', self.backups, '-d', out_dir, '-p', '*.cfg', '-w', '1',
+                                                   '--lenient'])
+        self.assertEqual(1, result.exit_code)
+        self.assertIn('bad.cfg:1: cannot pop past end of tokens', result.output)
+        self.assertIn('3 files, 9 lines, 6 records, 1 errors', result.output)
+
+
+# run in a fresh interpreter: report which modules importing the CLI, and then running parse, loaded
+STARTUP_SCRIPT = """
+import json, sys
+before = set(sys.modules)
+import fwrp_cli
+on_import = set(sys.modules) - before
+fwrp_cli.cli(['parse', sys.argv[1], '-o', sys.argv[2]], standalone_mode=False)
+print(json.dumps({'import': sorted(on_import), 'parse': sorted(set(sys.modules) - before)}))
+"""
+
+# heavy modules the parse command must not pull in
+NOT_FOR_PARSE = ('attr', 'concurrent.futures', 'multiprocessing', 'numpy', 'fwrp.analysis', 'fwrp.resolver',
+                 'fwrp.index', 'fwrp.evaluator', 'fwrp.cache', 'fwrp.serialization', 'fwrp.fwrpv2')
+
+
+@unittest.skipIf(fwrp_cli is None, 'click is not installed')
+class TestStartup(unittest.TestCase):
+    def test_lazy_imports(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        config = os.path.join(tmp_dir.name, 'fw.cfg')
+        with open(config, 'w') as fil:
+            fil.write(RULESET)
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT, config, os.path.join(tmp_dir.name, 'out.jsonl')],
+            cwd=repo_root, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+        modules = json.loads(output.splitlines()[-1])
+
+        for name in ('fwrp.firewallruleparser', 'ipaddress', 'attr'):
+            self.assertNotIn(name, modules['import'])
+        self.assertIn('fwrp.firewallruleparser', modules['parse'])
+        for name in NOT_FOR_PARSE:
+            self.assertNotIn(name, modules['parse'])
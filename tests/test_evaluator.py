@@ -0,0 +1,108 @@
+import unittest
+
+from fwrp.evaluator import Flow, compile_acls
+from fwrp.firewallruleparser import Parser
+from fwrp.ports import PortSet, icmp_types, port_number, port_ranges
+from fwrp.resolver import Resolver
+__author__ = 'William.George'
+
+RULESET = (
+    'object-group service WEB_PORTS tcp\n'
+    ' port-object eq www\n'
+    ' port-object range 8000 8080\n'
+    'access-list OUTSIDE_IN remark web\n'
+    'access-list OUTSIDE_IN extended permit tcp any host 10.0.0.1 object-group WEB_PORTS\n'
+    'access-list OUTSIDE_IN extended deny tcp host 192.0.2.1 any eq 22\n'
+    'access-list OUTSIDE_IN extended permit tcp any 10.0.0.0 255.255.255.0 gt 1023\n'
+    'access-list OUTSIDE_IN extended permit udp any any eq domain inactive\n'
+    'access-list OUTSIDE_IN extended deny icmp any any redirect\n'
+    'access-list OUTSIDE_IN extended permit icmp any any\n'
+    'access-list INSIDE_OUT extended permit ip any any\n'
+)
+
+
+class TestPorts(unittest.TestCase):
+    def test_port_number(self):
+        self.assertEqual(443, port_number('https'))
+        self.assertEqual(8443, port_number('8443'))
+        self.assertRaises(ValueError, port_number, 'no-such-port')
+        self.assertRaises(ValueError, port_number, '70000')
+        # names where the ASA differs from IANA or has its own
+        self.assertEqual([750, 1521, 1494, 5631, 3020, 1645], [port_number(name) for name in (
+            'kerberos', 'sqlnet', 'citrix-ica', 'pcanywhere-data', 'cifs', 'radius')])
+
+    def test_port_ranges(self):
+        self.assertEqual(((80, 80),), port_ranges('eq', 'www'))
+        self.assertEqual(((0, 1023),), port_ranges('lt', '1024'))
+        self.assertEqual(((1024, 65535),), port_ranges('gt', '1023'))
+        self.assertEqual(((10500, 10600),), port_ranges('range', '10500 10600'))
+        self.assertEqual(((0, 21), (23, 65535)), port_ranges('neq', 'ssh'))
+
+    def test_port_set(self):
+        web = PortSet([(8080, 8090), (80, 80), (443, 443), (8000, 8079)])
+        self.assertEqual(((80, 80), (443, 443), (8000, 8090)), web.ranges)
+        self.assertEqual(web, PortSet.from_spec('eq', 'www') | PortSet.from_spec('eq', 'https') |
+                         PortSet.from_spec('range', '8000 8090'))
+        self.assertIn(443, web)
+        self.assertNotIn(444, web)
+        self.assertNotIn(79, web)
+        self.assertEqual(93, len(web))
+
+        high = PortSet.from_spec('gt', '1023')
+        self.assertEqual(PortSet([(8000, 8090)]), web & high)
+        self.assertIn(PortSet([(8000, 8010)]), web)
+        self.assertTrue(web <= PortSet.from_spec('lt', '9000'))
+        self.assertFalse(web <= high)
+        self.assertTrue(PortSet.from_spec('eq', 'ssh').isdisjoint(web))
+        self.assertFalse(PortSet.from_spec('neq', 'ssh').isdisjoint(web))
+        self.assertFalse(PortSet.from_spec('lt', '0'))
+
+    def test_icmp_types(self):
+        self.assertEqual(PortSet([(8, 8)]), icmp_types('icmp', 'echo'))
+        self.assertEqual(PortSet([(128, 128)]), icmp_types('icmp6', 'echo'))
+        self.assertEqual(PortSet([(3, 3)]), icmp_types('icmp', '3 4'))
+        self.assertEqual(PortSet([(0, 255)]), icmp_types('icmp', 'any'))
+        self.assertRaises(ValueError, icmp_types, 'icmp', 'packet-too-big')
+
+
+class TestEvaluator(unittest.TestCase):
+    def setUp(self):
+        parser = Parser()
+        parsed = list(parser.parse_ruleset(RULESET))
+        self.acls = compile_acls(parsed, Resolver.from_parser(parser))
+
+    def test_first_match(self):
+        acl = self.acls['OUTSIDE_IN']
+        self.assertEqual('permit', acl.evaluate(Flow('tcp', '192.0.2.1', '10.0.0.1', 80))['action'])
+        self.assertTrue(acl.permits(Flow('tcp', '192.0.2.1', '10.0.0.1', 8080)))
+        self.assertFalse(acl.permits(Flow('tcp', '192.0.2.1', '10.0.0.1', 22)))
+        self.assertTrue(acl.permits(Flow(6, '192.0.2.9', '10.0.0.1', 2000)))
+        self.assertFalse(acl.permits(Flow('tcp', '192.0.2.9', '10.0.0.1', 1000)))
+        self.assertTrue(acl.permits(Flow('icmp', '192.0.2.9', '10.9.9.9', 8)))
+        self.assertFalse(acl.permits(Flow('icmp', '192.0.2.9', '10.9.9.9', 5)))
+
+    def test_inactive_and_implicit_deny(self):
+        acl = self.acls['OUTSIDE_IN']
+        self.assertIsNone(acl.evaluate(Flow('udp', '192.0.2.9', '10.0.0.1', 53)))
+        self.assertEqual(5, len(acl.rules))
+
+    def test_evaluate_batch(self):
+        acl = self.acls['OUTSIDE_IN']
+        flows = [('tcp', '192.0.2.1', '10.0.0.1', 22), ('tcp', '192.0.2.1', '10.0.0.1', 80)] * 3
+        actions = [ace['action'] for ace in acl.evaluate_batch(flows)]
+        self.assertEqual(['deny', 'permit'] * 3, actions)
+        self.assertTrue(self.acls['INSIDE_OUT'].permits(('gre', '10.0.0.1', '2001:db8::1', None)))
+
+    def test_time_range(self):
+        # time-ranged rules count as in effect unless left out
+        parser = Parser()
+        parsed = list(parser.parse_ruleset(
+            'access-list T extended deny tcp any any eq 22 time-range NIGHTS\n'
+            'access-list T extended permit tcp any any\n'))
+        flow = Flow('tcp', '192.0.2.1', '10.0.0.1', 22)
+        self.assertFalse(compile_acls(parsed, Resolver.from_parser(parser))['T'].permits(flow))
+        self.assertTrue(compile_acls(parsed, Resolver.from_parser(parser), time_ranged=False)['T'].permits(flow))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,8 +6,10 @@ import unittest
 # from .context.fwrp.firewallruelparser import lpop, cidr_from_netmask, is_ip_address, cli_group
 # from .context import fwrp
 # from .context.fwrp import firewallruelparser
-from fwrp.utils import lpop, cidr_from_netmask, is_ip_address
-from fwrp.firewallruleparser import cli_group
+import ipaddress
+
+from fwrp.utils import Interner, TokenStream, lpop, cidr_from_netmask, is_ip_address, is_ip_network, ipv4_network
+from fwrp.firewallruleparser import cli_group, chunk_lines, located_cli_group
 
 
 class TestLpop(unittest.TestCase):
@@ -29,6 +31,17 @@ class TestLpop(unittest.TestCase):
         for test in tests:
             t_val, e_r_val = test
             self.assertEqual(e_r_val, cidr_from_netmask(t_val))
+        self.assertEqual(0, cidr_from_netmask('0.0.0.0'))
+        self.assertEqual(24, cidr_from_netmask(0xffffff00))
+        for t_val in ('0.255.255.255', '255.254.255.0', '255.255.255', '255.255.255.0 ', 0x00ffffff):
+            self.assertRaises(ValueError, cidr_from_netmask, t_val)
+
+    def test_ipv4_network(self):
+        self.assertEqual(ipaddress.IPv4Network('10.57.58.0/24'),
+                         ipv4_network('10.57.58.44', '255.255.255.0'))
+        self.assertEqual(ipaddress.IPv4Network('0.0.0.0/0'), ipv4_network('10.1.1.1', '0.0.0.0'))
+        for t_val in ('10.1.1', '10.1.1.256', '10.1.1.01', '10.1.1.+1', 'a.b.c.d'):
+            self.assertRaises(ValueError, ipv4_network, t_val, '255.255.255.0')
 
     def test_is_ip_address(self):
         tests = [
@@ -38,9 +51,25 @@ class TestLpop(unittest.TestCase):
             ('256.255.255.255', False),
             ('1.1.1.1.1', False),
             (' 1.1.1.1', True),
+            ('01.1.1.1', False),
+            ('2001:db8::1', True),
+            ('face', False),
+            ('range', False),
         ]
         [self.assertEqual(e_out, is_ip_address(src)) for src, e_out in tests]
 
+    def test_is_ip_network(self):
+        tests = [
+            ('10.0.0.0/24', True),
+            ('10.0.0.0/255.255.255.0', True),
+            ('10.0.0.1/24', False),
+            ('10.0.0.1', True),
+            ('2001:db8::/32', True),
+            ('10.0.0.0/x', False),
+            ('network-object', False),
+        ]
+        [self.assertEqual(e_out, is_ip_network(src)) for src, e_out in tests]
+
     def test_cli_group(self):
         src_val = (
             'line1\n'
@@ -62,6 +91,66 @@ class TestLpop(unittest.TestCase):
 
         self.assertEqual(test[1], list(cli_group(test[0].splitlines())))
 
+    def test_cli_group_comments(self):
+        src_val = [
+            'line1',
+            '!',
+            ' orphan',
+            '',
+            'line2',
+            '',
+            ' subline2.1',
+            '   ',
+            ' subline2.2',
+        ]
+        # blank lines are skipped inside a group; an orphaned sub-line is kept, on its own
+        self.assertEqual([['line1'], [' orphan'], ['line2', ' subline2.1', ' subline2.2']],
+                         list(cli_group(iter(src_val))))
+        self.assertEqual([(1, 0, ['line1']), (3, 8, [' orphan']), (5, 17, ['line2', ' subline2.1', ' subline2.2'])],
+                         list(located_cli_group(iter(src_val))))
+
+    def test_located_cli_group_offsets(self):
+        src_val = 'a\r\n b\r\n!\r\nc\xe9\ndef\n'
+        self.assertEqual([(1, 0, ['a', ' b']), (4, 10, ['c\xe9']), (5, 14, ['def'])],
+                         list(located_cli_group(src_val.splitlines(keepends=True))))
+
+    def test_chunk_lines(self):
+        src_val = ['a', ' a.1', ' a.2', 'b', 'c', ' c.1', 'd']
+        self.assertEqual([['a', ' a.1', ' a.2'], ['b', 'c', ' c.1'], ['d']],
+                         list(chunk_lines(src_val, 2)))
+        self.assertEqual([['a', '', ' a.1'], ['b']], list(chunk_lines(['a', '', ' a.1', 'b'], 1)))
+
+
+class TestTokenStream(unittest.TestCase):
+    def test_token_stream(self):
+        src_val = ['a', 'b', 'c']
+        tokens = TokenStream(src_val, 1)
+        self.assertEqual('b', tokens.pop())
+        self.assertEqual('c', tokens.peek())
+        self.assertEqual(['c'], tokens.rest())
+        self.assertEqual(1, len(tokens))
+        self.assertEqual('c', tokens.pop())
+        self.assertIsNone(tokens.peek())
+        self.assertRaises(ValueError, tokens.pop)
+        self.assertEqual(['a', 'b', 'c'], src_val)
+
+
+class TestInterner(unittest.TestCase):
+    def test_network(self):
+        interner = Interner()
+        net = interner.network('10.1.1.7', '255.255.255.0')
+        self.assertEqual(ipaddress.IPv4Network('10.1.1.0/24'), net)
+        self.assertIs(net, interner.network('10.1.1.7', '255.255.255.0'))
+        self.assertEqual(ipaddress.IPv4Network('10.1.1.7/32'), interner.network('10.1.1.7'))
+        self.assertEqual({'size': 2, 'hits': 1, 'misses': 2, 'hit_rate': 1 / 3},
+                         interner.stats()['network'])
+
+    def test_name(self):
+        interner = Interner()
+        name = interner.name(''.join(['DMZ', '_SERVERS']))
+        self.assertIs(name, interner.name(''.join(['DMZ_', 'SERVERS'])))
+        self.assertEqual(1, interner.stats()['name']['hits'])
+
 
 # if __name__ == '__main__':
 #     unittest.main()
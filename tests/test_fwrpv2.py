@@ -0,0 +1,35 @@
+import ipaddress
+import unittest
+
+from fwrp.fwrpv2 import ACE, ServiceSpec, Target
+from fwrp.records import FrozenInstanceError
+__author__ = 'William.George'
+
+
+class TestRecords(unittest.TestCase):
+    def test_dict_view(self):
+        target = Target(type='service', target=ServiceSpec(op='eq', val='www'))
+        self.assertEqual({'type': 'service', 'target': {'op': 'eq', 'val': 'www'}}, target)
+        self.assertEqual(['type', 'target'], list(target))
+        self.assertEqual('www', target['target']['val'])
+        self.assertIsNone(target.get('protocol'))
+        with self.assertRaises(KeyError):
+            target['protocol']
+
+    def test_frozen_and_hashable(self):
+        network = ipaddress.ip_network('10.0.0.0/8')
+        target = Target(type='network', target=network)
+        with self.assertRaises(FrozenInstanceError):
+            target.type = 'object'
+        self.assertEqual(hash(target), hash(Target(type='network', target=network)))
+        self.assertEqual(1, len({target, Target(type='network', target=network)}))
+
+    def test_ace_view(self):
+        ace = ACE(text='access-list A remark hello', acl='A', type='remark')
+        self.assertEqual({'text': 'access-list A remark hello', 'acl': 'A', 'type': 'remark',
+                          'log': '', 'active': True}, dict(ace))
+        self.assertFalse(hasattr(ace, '__dict__'))
+
+
+if __name__ == '__main__':
+    unittest.main()
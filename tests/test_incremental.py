@@ -0,0 +1,92 @@
+import unittest
+
+from fwrp.firewallruleparser import Parser
+from fwrp.incremental import IncrementalParser
+__author__ = 'William.George'
+
+RULESET = (
+    'object-group network SERVERS\n'
+    ' network-object host 10.0.0.1\n'
+    'object network OLD\n'
+    ' host 10.0.0.9\n'
+    'access-list A extended permit tcp any object-group SERVERS eq 443\n'
+    'access-list A extended permit tcp any object-group SERVERS eq 80\n'
+    'access-list A extended deny ip any any\n'
+)
+
+CHANGED = (
+    'object-group network SERVERS\n'
+    ' network-object host 10.0.0.1\n'
+    ' network-object host 10.0.0.2\n'
+    'object network NEW\n'
+    ' host 10.0.0.10\n'
+    'access-list A extended permit tcp any object-group SERVERS eq 443\n'
+    'access-list A extended permit tcp any object-group SERVERS eq 8080\n'
+    'access-list A extended permit udp any any eq 53\n'
+    'access-list A extended deny ip any any\n'
+)
+
+
+class TestIncrementalParser(unittest.TestCase):
+    def test_update(self):
+        incremental = IncrementalParser()
+        delta = incremental.update_text(RULESET)
+        self.assertEqual(5, len(delta.added))
+        self.assertEqual(5, incremental.reparsed)
+
+        delta = incremental.update_text(CHANGED)
+        self.assertEqual(4, incremental.reparsed)
+        self.assertEqual(['NEW', 'access-list A extended permit udp any any eq 53'],
+                         [item.get('object') or item['text'] for item in delta.added])
+        self.assertEqual(['OLD'], [item['object'] for item in delta.removed])
+        self.assertEqual(
+            [('SERVERS', 'SERVERS'),
+             ('access-list A extended permit tcp any object-group SERVERS eq 80',
+              'access-list A extended permit tcp any object-group SERVERS eq 8080')],
+            [(old.get('object') or old['text'], new.get('object') or new['text'])
+             for old, new in delta.modified])
+        self.assertEqual(list(Parser.parse_ruleset(CHANGED)), incremental.parsed())
+        self.assertEqual({'SERVERS'}, set(incremental.parser.object_groups))
+
+    def test_no_change(self):
+        incremental = IncrementalParser()
+        incremental.update_text(RULESET)
+        delta = incremental.update_text(RULESET)
+        self.assertEqual(0, incremental.reparsed)
+        self.assertEqual(((), (), ()), (delta.added, delta.removed, delta.modified))
+
+    def test_reorder(self):
+        incremental = IncrementalParser()
+        incremental.update_text('access-list A extended permit tcp any any eq 80\n'
+                                'access-list A extended deny tcp any any\n')
+        delta = incremental.update_text('access-list A extended deny tcp any any\n'
+                                        'access-list A extended permit tcp any any eq 80\n')
+        self.assertEqual(0, incremental.reparsed)
+        self.assertEqual(1, len(delta.removed))
+        self.assertEqual(1, len(delta.added))
+        self.assertEqual(delta.removed[0]['text'], delta.added[0]['text'])
+        self.assertNotEqual(delta.removed[0]['line'], delta.added[0]['line'])
+        self.assertEqual((), delta.modified)
+
+        # a moved object is not a change: objects are found by name, not position
+        incremental.update_text('object network A\n host 10.0.0.1\nobject network B\n host 10.0.0.2\n')
+        delta = incremental.update_text('object network B\n host 10.0.0.2\nobject network A\n host 10.0.0.1\n')
+        self.assertEqual(((), (), ()), (delta.added, delta.removed, delta.modified))
+
+    def test_lenient(self):
+        incremental = IncrementalParser(Parser(lenient=True))
+        incremental.update_text(RULESET)
+        incremental.update_text(RULESET + 'access-list A extended permit tcp bogus any\n')
+        self.assertEqual([8], [error.line for error in incremental.parser.errors])
+        self.assertEqual(list(Parser.parse_ruleset(RULESET)), incremental.parsed())
+        # still reported while the bad line stays, and cleared once it is gone
+        incremental.update_text(RULESET + 'access-list A extended permit tcp bogus any\n')
+        self.assertEqual(1, len(incremental.parser.errors))
+        incremental.update_text(RULESET)
+        self.assertEqual([], incremental.parser.errors)
+
+        self.assertRaises(ValueError, IncrementalParser().update_text, 'access-list A extended permit tcp bogus any\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import ipaddress
+import unittest
+
+from fwrp.firewallruleparser import Parser
+from fwrp.index import PrefixIndex, RuleIndex
+from fwrp.resolver import Resolver
+__author__ = 'William.George'
+
+RULESET = (
+    'object-group network SERVERS\n'
+    ' network-object 10.1.0.0 255.255.0.0\n'
+    ' network-object host 10.2.0.5\n'
+    'access-list A extended permit tcp any object-group SERVERS eq 443\n'
+    'access-list A extended deny ip 192.0.2.0 255.255.255.0 10.1.2.0 255.255.255.0\n'
+    'access-list A extended permit ip any any\n'
+)
+
+
+class TestPrefixIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = PrefixIndex()
+        self.index.add(ipaddress.ip_network('10.0.0.0/8'), 'a')
+        self.index.add(ipaddress.ip_network('10.1.0.0/16'), 'b')
+        self.index.add(ipaddress.ip_network('10.1.2.0/24'), 'c')
+        self.index.add(ipaddress.ip_network('192.0.2.0/24'), 'd')
+        self.index.add(ipaddress.ip_network('2001:db8::/32'), 'e')
+
+    def test_lookup_address(self):
+        self.assertEqual({'a', 'b', 'c'}, self.index.lookup_address('10.1.2.3'))
+        self.assertEqual({'a'}, self.index.lookup_address('10.200.0.1'))
+        self.assertEqual(set(), self.index.lookup_address('172.16.0.1'))
+        self.assertEqual({'e'}, self.index.lookup_address('2001:db8::1'))
+
+    def test_prefix_lookups(self):
+        self.assertEqual({'a', 'b'}, self.index.covering('10.1.0.0/16'))
+        self.assertEqual({'b', 'c'}, self.index.within('10.1.0.0/16'))
+        self.assertEqual({'a', 'b', 'c'}, self.index.lookup('10.1.0.0/16'))
+        self.assertEqual(5, len(self.index))
+
+    def test_add_after_query(self):
+        self.assertEqual({'b', 'c'}, self.index.within('10.1.0.0/16'))
+        self.index.add(ipaddress.ip_network('10.1.9.0/24'), 'f')
+        self.index.add(ipaddress.ip_network('10.0.9.0/24'), 'g')
+        self.assertEqual({'b', 'c', 'f'}, self.index.within('10.1.0.0/16'))
+
+
+class TestRuleIndex(unittest.TestCase):
+    def test_query(self):
+        parser = Parser()
+        parsed = list(parser.parse_ruleset(RULESET))
+        index = RuleIndex.from_parsed(parsed, Resolver.from_parser(parser))
+        actions = [rule.ace['action'] for rule in index.query(src='192.0.2.7', dst='10.1.2.3')]
+        self.assertEqual(['permit', 'deny', 'permit'], actions)
+        self.assertEqual(2, len(index.query(dst='10.2.0.5')))
+        self.assertEqual(1, len(index.query(dst='172.16.0.1')))
+        self.assertEqual(3, len(index.query(dst='10.0.0.0/8')))
+
+
+if __name__ == '__main__':
+    unittest.main()
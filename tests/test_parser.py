@@ -1,8 +1,22 @@
+import io
+import mmap
+import os
+import tempfile
 import unittest
-from fwrp.firewallruleparser import Parser
+from fwrp.firewallruleparser import Parser, Profile
+from fwrp.ports import PortSet
+from fwrp.utils import source_line
 import ipaddress
 __author__ = 'William.George'
 
+SAMPLE_RULESET = (
+    'object network OBJ01\n'
+    ' host 1.1.1.1\n'
+    '!\n'
+    'access-list OUTSIDE_IN extended permit tcp any host 2.2.2.2 eq 443\n'
+    'access-list OUTSIDE_IN extended deny ip any any log\n'
+)
+
 
 class TestParser(unittest.TestCase):
     def test_parse_object_target(self):
@@ -198,6 +212,210 @@ class TestParser(unittest.TestCase):
             for key in e_r_val.keys():
                 self.assertEqual(e_r_val[key], r_val[key])
 
+    def test_parse_lines(self):
+        parsed = list(Parser.parse_lines(io.StringIO(SAMPLE_RULESET)))
+        self.assertEqual(parsed, list(Parser.parse_ruleset(SAMPLE_RULESET)))
+        self.assertEqual(3, len(parsed))
+        self.assertEqual('OBJ01', parsed[0]['object'])
+        self.assertEqual(ipaddress.IPv4Network('2.2.2.2/32'), parsed[1]['dst']['target'])
+        self.assertEqual('deny', parsed[2]['action'])
+
+    def test_parse_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'ruleset.cfg')
+            with open(path, 'w') as fil:
+                fil.write(SAMPLE_RULESET)
+            self.assertEqual(list(Parser.parse_ruleset(SAMPLE_RULESET)),
+                             list(Parser.parse_file(path)))
+
+    def test_parse_ruleset_workers(self):
+        ruleset = SAMPLE_RULESET * 20
+        self.assertEqual(list(Parser.parse_ruleset(ruleset)),
+                         list(Parser.parse_ruleset(ruleset, workers=2, chunk_size=7)))
+
+    def test_encode(self):
+        from fwrp.batch import json_lines
+        ruleset = SAMPLE_RULESET * 20
+        expected = json_lines(Parser.parse_ruleset(ruleset))
+        for workers in (None, 2):
+            self.assertEqual(expected, ''.join(Parser.parse_ruleset(ruleset, workers=workers, chunk_size=7,
+                                                                    encode=json_lines)))
+
+    def test_parser_interning(self):
+        parser = Parser()
+        ruleset = (
+            'access-list A extended permit tcp host 1.1.1.1 object-group DMZ eq 22\n'
+            'access-list A extended permit tcp host 1.1.1.1 object-group DMZ eq 80\n'
+        )
+        first, second = parser.parse_ruleset(ruleset)
+        self.assertIs(first['src']['target'], second['src']['target'])
+        self.assertIs(first['dst']['target'], second['dst']['target'])
+        self.assertEqual(1, parser.interner.stats()['network']['hits'])
+
+    def test_parse_ace_trailing_log(self):
+        # a failed third target must not swallow the token after the destination
+        src_val = 'access-list A extended deny ip any any log'.split()
+        r_val = Parser.parse_ace(src_val)
+        self.assertEqual('log', r_val['log'])
+        self.assertEqual({'type': 'protocol', 'target': 'ip'}, r_val['service'])
+        self.assertEqual('access-list A extended deny ip any any log'.split(), src_val)
+
+    def test_lenient(self):
+        ruleset = SAMPLE_RULESET + (
+            'access-list OUTSIDE_IN extended permit tcp host\n'
+            'object network OBJ02\n'
+            ' subnet 10.0.0.0 255.0.255.0\n'
+            'access-list OUTSIDE_IN extended permit ip any any\n'
+        )
+        with self.assertRaises(ValueError):
+            list(Parser.parse_ruleset(ruleset))
+
+        for workers in (None, 2):
+            parser = Parser(lenient=True)
+            parsed = list(parser.parse_ruleset(ruleset, workers=workers, chunk_size=3))
+            self.assertEqual(4, len(parsed))
+            self.assertEqual('access-list OUTSIDE_IN extended permit ip any any', parsed[-1]['text'])
+            self.assertEqual([6, 7], [error.line for error in parser.errors])
+            self.assertEqual('object network OBJ02\n subnet 10.0.0.0 255.0.255.0', parser.errors[1].group)
+            self.assertIn('255.0.255.0', parser.errors[1].reason)
+
+    def test_locations(self):
+        ruleset = SAMPLE_RULESET.replace('\n', '\r\n')
+        expected = [(1, 0), (4, 40), (5, 108)]
+        for workers in (None, 2):
+            parsed = list(Parser.parse_ruleset(ruleset, workers=workers, chunk_size=2))
+            self.assertEqual(expected, [(item['line'], item['offset']) for item in parsed])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'ruleset.cfg')
+            with open(path, 'w', newline='') as fil:
+                fil.write(ruleset)
+            parsed = list(Parser.parse_file(path))
+            self.assertEqual(expected, [(item['line'], item['offset']) for item in parsed])
+            with open(path, 'rb') as fil, mmap.mmap(fil.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                self.assertEqual('object network OBJ01', source_line(data, parsed[0]['offset']))
+                self.assertEqual(parsed[2]['text'], source_line(data, parsed[2]['offset']))
+
+        # without a location, parse_ace and parse_object results carry none
+        self.assertNotIn('line', Parser.parse_ace('access-list A extended deny ip any any'.split()))
+        self.assertNotIn('line', Parser.parse_object(['object network OBJ01', ' host 1.1.1.1']))
+
+    def test_parse_ace_new_types(self):
+        r_val = Parser.parse_ace('access-list ETH ethertype deny dsap 0x42'.split())
+        self.assertEqual(('ethertype', 'deny', 'dsap 0x42'), (r_val['acl_type'], r_val['action'], r_val['protocol']))
+
+        r_val = Parser.parse_ace('access-list WEB webtype permit url http://intranet/* log'.split())
+        self.assertEqual({'type': 'url', 'target': 'http://intranet/*'}, r_val['dst'])
+        self.assertEqual(('url', 'log'), (r_val['protocol'], r_val['log']))
+
+        r_val = Parser.parse_ace('access-list WEB webtype permit tcp host 10.0.0.1 eq 443'.split())
+        self.assertEqual(ipaddress.IPv4Network('10.0.0.1/32'), r_val['dst']['target'])
+        self.assertEqual({'type': 'tcp', 'target': {'op': 'eq', 'val': '443'}}, r_val['service'])
+
+        r_val = Parser.parse_ace(
+            'access-list A extended permit tcp user LOCAL\\jdoe any host 10.0.0.1 eq 80'.split())
+        self.assertEqual({'type': 'user', 'target': 'LOCAL\\jdoe'}, r_val['user'])
+        self.assertEqual({'type': 'any', 'target': 'any'}, r_val['src'])
+        self.assertEqual({'type': 'tcp', 'target': {'op': 'eq', 'val': '80'}}, r_val['service'])
+
+        r_val = Parser.parse_ace(
+            'access-list A extended permit object-group WEB user-group LOCAL\\\\ops any any'.split())
+        self.assertEqual('user-group', r_val['user']['type'])
+        self.assertEqual({'type': 'object-group', 'target': 'WEB'}, r_val['service'])
+
+        self.assertIsNone(Parser.parse_ace('access-list 123 permit tcp any any'.split()))
+
+    def test_parse_ace_standard_ipv6_options(self):
+        r_val = Parser.parse_ace('access-list 10 standard deny 10.0.0.0 255.0.0.0 log disable'.split())
+        self.assertEqual(('standard', 'deny', None, 'log disable'),
+                         (r_val['acl_type'], r_val['action'], r_val.get('src'), r_val['log']))
+        self.assertEqual(ipaddress.IPv4Network('10.0.0.0/8'), r_val['dst']['target'])
+
+        r_val = Parser.parse_ace('access-list A extended permit tcp host 2001:db8::1 2001:db8:1::/48 eq 22'.split())
+        self.assertEqual(ipaddress.IPv6Network('2001:db8::1/128'), r_val['src']['target'])
+        self.assertEqual(ipaddress.IPv6Network('2001:db8:1::/48'), r_val['dst']['target'])
+        self.assertEqual({'type': 'tcp', 'target': {'op': 'eq', 'val': '22'}}, r_val['service'])
+
+        r_val = Parser.parse_ace(
+            'access-list A extended permit ip any any log 6 interval 300 time-range WORK inactive'.split())
+        self.assertEqual(('log 6 interval 300', 'WORK', False), (r_val['log'], r_val['time_range'], r_val['active']))
+        self.assertEqual({'type': 'protocol', 'target': 'ip'}, r_val['service'])
+
+        r_val = Parser.parse_ace('access-list A extended permit icmp any any echo-reply log interval 60'.split())
+        self.assertEqual(('log interval 60', None), (r_val['log'], r_val.get('time_range')))
+        self.assertEqual({'type': 'icmp', 'target': {'op': 'eq', 'val': 'echo-reply'}}, r_val['service'])
+
+        r_val = Parser.parse_ace('access-list A extended permit icmp6 any any 1 4 inactive'.split())
+        self.assertEqual(({'type': 'icmp6', 'target': {'op': 'eq', 'val': '1 4'}}, False),
+                         (r_val['service'], r_val['active']))
+
+    def test_blank_lines(self):
+        ruleset = ('object-group network G\n'
+                   ' network-object host 10.0.0.1\n'
+                   '\n'
+                   ' network-object host 10.0.0.2\n'
+                   '!\n'
+                   ' network-object host 10.0.0.3\n')
+        parser = Parser(lenient=True)
+        r_val = list(parser.parse_ruleset(ruleset))
+        self.assertEqual([ipaddress.IPv4Network('10.0.0.1/32'), ipaddress.IPv4Network('10.0.0.2/32')],
+                         [target['target'] for target in r_val[0]['target']])
+        # the sub-line orphaned by '!' is reported, not dropped
+        self.assertEqual([6], [error.line for error in parser.errors])
+        self.assertRaises(ValueError, list, Parser.parse_ruleset(ruleset))
+
+    def test_service_ports(self):
+        parser = Parser()
+        www = parser.parse_ace('access-list A extended permit tcp any any eq www'.split())['service']['target']
+        self.assertEqual({'op': 'eq', 'val': 'www'}, www)
+        self.assertEqual(PortSet([(80, 80)]), www.ports)
+        # equal specs are shared, so each PortSet is worked out once
+        self.assertIs(www, parser.parse_ace('access-list B extended permit tcp any host 10.0.0.1 eq www'.split())
+                      ['service']['target'])
+
+        r_val = parser.parse_object(['object-group service SVCS', ' service-object tcp-udp destination range 1 3',
+                                     ' service-object icmp echo', ' port-object eq non500-isakmp'])
+        self.assertEqual([PortSet([(1, 3)]), None, PortSet([(4500, 4500)])],
+                         [target['target'].ports for target in r_val['target']])
+
+        # a port that cannot be worked out is a parse error, which a lenient parse collects
+        self.assertRaisesRegex(ValueError, 'no-such-port', parser.parse_ace,
+                               'access-list A extended permit tcp any any eq no-such-port'.split())
+        parser = Parser(lenient=True)
+        parsed = list(parser.parse_ruleset('object-group service SVCS tcp\n'
+                                           ' port-object eq no-such-port\n'
+                                           'access-list A extended permit udp any any eq diameter\n'))
+        self.assertEqual([PortSet([(3868, 3868)])], [item['service']['target'].ports for item in parsed])
+        self.assertEqual([1], [error.line for error in parser.errors])
+
+    def test_parse_object_user(self):
+        r_val = Parser.parse_object(['object-group user ADMINS', ' user LOCAL\\jdoe',
+                                     ' user-group LOCAL\\\\ops', ' group-object OTHERS'])
+        self.assertEqual([('user', 'LOCAL\\jdoe'), ('user-group', 'LOCAL\\\\ops'), ('object-group', 'OTHERS')],
+                         [(target['type'], target['target']) for target in r_val['target']])
+
+    def test_profile(self):
+        profile = Profile()
+        parser = Parser(profile=profile)
+        self.assertEqual(list(Parser.parse_ruleset(SAMPLE_RULESET)), list(parser.parse_ruleset(SAMPLE_RULESET)))
+        self.assertEqual(3, profile.calls['cli_group'])
+        self.assertEqual(2, profile.calls['parse_ace'])
+        self.assertEqual(2, profile.branches['parse_ace', 'extended'])
+        self.assertEqual(1, profile.branches['parse_object', 'object network'])
+        self.assertEqual({'any': 3, 'host': 1, 'eq': 1},
+                         {branch: count for (stage, branch), count in profile.branches.items()
+                          if stage == 'parse_target'})
+        # 1.1.1.1 and 2.2.2.2 are built once each
+        self.assertEqual(2, profile.branches['interner.network', 'miss'])
+        self.assertGreater(profile.times['parse_ace'], 0)
+        self.assertIn('parse_target', profile.report())
+        # a Parser without a profile is left uninstrumented
+        self.assertNotIn('parse_ace', vars(Parser()))
+
+        workers_profile = Profile()
+        list(Parser(profile=workers_profile).parse_ruleset(SAMPLE_RULESET * 4, workers=2, chunk_size=5))
+        self.assertEqual(8, workers_profile.calls['parse_ace'])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,86 @@
+import ipaddress
+import unittest
+
+from fwrp.firewallruleparser import Parser
+from fwrp.fwrpv2 import Service
+from fwrp.ports import PortSet
+from fwrp.resolver import Resolver
+__author__ = 'William.George'
+
+RULESET = (
+    'object network WEB01\n'
+    ' host 10.0.0.1\n'
+    'object network WEB_RANGE\n'
+    ' range 10.0.1.0 10.0.1.3\n'
+    'object-group network WEB_SERVERS\n'
+    ' network-object object WEB01\n'
+    ' network-object 10.0.2.0 255.255.255.0\n'
+    'object-group network DMZ\n'
+    ' group-object WEB_SERVERS\n'
+    ' network-object object WEB_RANGE\n'
+    'object-group service WEB_PORTS tcp\n'
+    ' port-object eq www\n'
+    ' port-object eq https\n'
+    'access-list OUTSIDE_IN extended permit tcp any object-group DMZ object-group WEB_PORTS\n'
+    'access-list OUTSIDE_IN extended permit udp host 192.0.2.1 object WEB01 eq 53\n'
+    'access-list OUTSIDE_IN remark done\n'
+)
+
+
+class TestResolver(unittest.TestCase):
+    def setUp(self):
+        self.parser = Parser()
+        self.parsed = list(self.parser.parse_ruleset(RULESET))
+        self.resolver = Resolver.from_parser(self.parser)
+
+    def test_flatten(self):
+        self.assertEqual(
+            {ipaddress.ip_network('10.0.0.1/32'),
+             ipaddress.ip_network('10.0.2.0/24'),
+             ipaddress.ip_network('10.0.1.0/30')},
+            self.resolver.flatten('DMZ'))
+        # nested groups are flattened once and shared
+        self.assertIs(self.resolver.flatten('WEB_SERVERS'), self.resolver.flattened['WEB_SERVERS'])
+
+    def test_resolve(self):
+        resolved = self.resolver.resolve(self.parsed[-3])
+        self.assertEqual(2, len(resolved.src))
+        self.assertEqual(3, len(resolved.dst))
+        # the group's ports are merged into one set per protocol
+        self.assertEqual({Service('tcp', PortSet([(80, 80), (443, 443)]))}, resolved.service)
+
+        resolved = self.resolver.resolve(self.parsed[-2])
+        self.assertEqual({ipaddress.ip_network('192.0.2.1/32')}, resolved.src)
+        self.assertEqual({ipaddress.ip_network('10.0.0.1/32')}, resolved.dst)
+        self.assertEqual({Service('udp', PortSet([(53, 53)]))}, resolved.service)
+
+        self.assertIsNone(self.resolver.resolve(self.parsed[-1]))
+
+    def test_ace_protocol(self):
+        # a tcp ACE only takes the tcp half of a tcp-udp group
+        parser = Parser()
+        parsed = list(parser.parse_ruleset(
+            'object-group service WEB tcp-udp\n'
+            ' port-object eq 80\n'
+            'access-list A extended permit tcp any any object-group WEB\n'
+            'access-list A extended permit ip any any object-group WEB\n'))
+        resolver = Resolver.from_parser(parser)
+        self.assertEqual({Service('tcp', PortSet([(80, 80)]))}, resolver.resolve(parsed[1]).service)
+        self.assertEqual({Service('tcp', PortSet([(80, 80)])), Service('udp', PortSet([(80, 80)]))},
+                         resolver.resolve(parsed[2]).service)
+
+    def test_cycle(self):
+        resolver = Resolver(Parser.parse_ruleset(
+            'object-group network A\n'
+            ' group-object B\n'
+            'object-group network B\n'
+            ' group-object A\n'))
+        with self.assertRaisesRegex(ValueError, 'A -> B -> A'):
+            resolver.flatten('A')
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, self.resolver.flatten, 'MISSING')
+
+
+if __name__ == '__main__':
+    unittest.main()
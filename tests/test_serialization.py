@@ -0,0 +1,82 @@
+import io
+import os
+import tempfile
+import unittest
+
+from fwrp import serialization
+from fwrp.firewallruleparser import Parser
+__author__ = 'William.George'
+
+RULESET = (
+    'object network OBJ01\n'
+    ' host 1.1.1.1\n'
+    'object network OBJ02\n'
+    ' subnet 2001:db8::/32\n'
+    'object-group service SVC tcp\n'
+    ' port-object range 1000 2000\n'
+    'access-list A remark ' + 'x' * 100 + '\n'
+    'access-list A extended permit tcp host 10.0.0.1 10.1.0.0 255.255.0.0 eq 443 log\n'
+    'access-list A extended deny udp host 10.0.0.1 any range 1 2 inactive\n'
+)
+
+
+class TestSerialization(unittest.TestCase):
+    def setUp(self):
+        self.parsed = list(Parser.parse_ruleset(RULESET))
+
+    def test_round_trip(self):
+        buf = io.BytesIO()
+        self.assertEqual(len(self.parsed), serialization.dump(self.parsed, buf))
+        loaded = serialization.loads(buf.getvalue())
+        self.assertEqual(self.parsed, loaded)
+        # the same host is shared between ACEs after loading
+        self.assertIs(loaded[-2]['src']['target'], loaded[-1]['src']['target'])
+
+    def test_load_mmap(self):
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'wb') as fil:
+            serialization.dump(Parser.parse_ruleset(RULESET), fil)
+        self.assertEqual(self.parsed, list(serialization.load(path)))
+
+    def test_blocks(self):
+        buf = io.BytesIO()
+        writer = serialization.Writer(buf, block_items=2)
+        for item in self.parsed:
+            writer.write(item)
+        writer.close()
+        self.assertEqual(3, len(writer.blocks))
+        reader = serialization.Reader(buf.getvalue())
+        self.assertEqual(self.parsed, list(reader))
+        # each block decodes on its own
+        self.assertEqual(self.parsed[-1], reader[-1])
+        self.assertEqual(self.parsed[2], reader[2])
+        self.assertRaises(IndexError, reader.__getitem__, len(self.parsed))
+
+    def test_mapped(self):
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'wb') as fil:
+            serialization.dump(self.parsed, fil)
+        with serialization.mapped(path) as reader:
+            self.assertEqual(len(self.parsed), len(reader))
+            self.assertEqual(self.parsed[3], reader[3])
+
+    def test_values(self):
+        values = [{'a': (1, -1, 2 ** 40), 'b': [None, True, False, 'a']}]
+        buf = io.BytesIO()
+        serialization.dump(values, buf)
+        self.assertEqual(values, serialization.loads(buf.getvalue()))
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            serialization.loads(b'JSON')
+        with self.assertRaises(ValueError):
+            serialization.dump([object()], io.BytesIO())
+        buf = io.BytesIO()
+        serialization.dump(self.parsed, buf)
+        with self.assertRaises(ValueError):
+            serialization.loads(buf.getvalue()[:4] + b'\x63' + buf.getvalue()[5:])
+        # a file cut short loses its index
+        with self.assertRaises(ValueError):
+            serialization.loads(buf.getvalue()[:-1])
@@ -0,0 +1,52 @@
+import unittest
+
+from fwrp.evaluator import compile_acls
+from fwrp.firewallruleparser import Parser
+from fwrp.resolver import Resolver
+try:
+    from fwrp.vectorized import VectorACL, flows_to_array
+except ImportError:
+    VectorACL = None
+__author__ = 'William.George'
+
+RULESET = (
+    'access-list OUTSIDE_IN extended permit tcp any host 10.0.0.1 range 80 81\n'
+    'access-list OUTSIDE_IN extended deny tcp host 192.0.2.1 any eq 22\n'
+    'access-list OUTSIDE_IN extended permit tcp any 10.0.0.0 255.255.255.0 gt 1023\n'
+    'access-list OUTSIDE_IN extended permit udp any any eq domain inactive\n'
+    'access-list OUTSIDE_IN extended permit icmp any any\n'
+    'access-list OUTSIDE_IN extended deny ip any6 any6\n'
+)
+
+FLOWS = [
+    ('tcp', '192.0.2.1', '10.0.0.1', 80),
+    ('tcp', '192.0.2.1', '10.0.0.1', 22),
+    ('tcp', '192.0.2.9', '10.0.0.1', 2000),
+    ('tcp', '192.0.2.9', '10.0.0.1', 1000),
+    ('udp', '192.0.2.9', '10.0.0.1', 53),
+    ('icmp', '192.0.2.9', '10.9.9.9', None),
+    (6, '192.0.2.9', '10.0.0.200', 5000),
+]
+
+
+@unittest.skipIf(VectorACL is None, 'numpy is not installed')
+class TestVectorACL(unittest.TestCase):
+    def test_match_batch(self):
+        parser = Parser()
+        parsed = list(parser.parse_ruleset(RULESET))
+        acl = compile_acls(parsed, Resolver.from_parser(parser))['OUTSIDE_IN']
+        vector_acl = VectorACL(acl)
+        matches = vector_acl.match_batch(flows_to_array(FLOWS))
+        expected = [acl.rules.index(next(r for r in acl.rules if r.ace is ace)) if ace is not None else -1
+                    for ace in acl.evaluate_batch(FLOWS)]
+        self.assertEqual(expected, list(matches))
+        self.assertEqual([0, 1, 2, -1, -1, 3, 2], list(matches))
+        self.assertEqual([True, False, True, False, False, True, True],
+                         list(vector_acl.permits(matches)))
+
+    def test_invalid_flow(self):
+        self.assertRaises(ValueError, flows_to_array, [('ip', '10.0.0.1', '10.0.0.2', None)])
+
+
+if __name__ == '__main__':
+    unittest.main()